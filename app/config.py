@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel
@@ -13,18 +13,27 @@ class WorkflowSettings(BaseModel):
     intent_analysis: Dict[str, Any] = {
         "max_tokens": 500,
         "confidence_threshold": 0.7,
-        "relevance_threshold": 0.6
+        "relevance_threshold": 0.6,
+        "cascade_enabled": False,
+        "cascade_model": "gpt-4.1-nano",
+        "fused_summary": False
     }
     
     content_discovery: Dict[str, Any] = {
         "max_tokens": 1000,
         "max_candidates": 5,
-        "min_relevance_score": 0.6,
-        "similarity_threshold": 0.8
+        "min_relevance_score": 0.3,
+        "similarity_threshold": 0.3,
+        "prefilter_top_k": 10,
+        "bm25_weight": 0.5,
+        "dedup_threshold": 0.8,
+        "speculative": False,
+        "speculation_min_probability": 0.5
     }
     
     reply_generation: Dict[str, Any] = {
         "max_tokens": 280,
+        "use_llm": False,
         "max_attempts": 3,
         "min_quality_score": 0.7,
         "style_guidelines": {
@@ -37,10 +46,49 @@ class WorkflowSettings(BaseModel):
 
 class Settings(BaseSettings):
     """Application settings"""
-    openai_api_key: str
-    farcaster_api_key: str
+    openai_api_key: Optional[str] = None
+    farcaster_api_key: Optional[str] = None
     environment: str = "development"
     debug: bool = False
+
+    # Similar-users index; kept in memory only when no path is set
+    user_index_path: Optional[str] = None
+    user_index_nprobe: int = 8
+    # "none", "int8" or "binary"
+    user_index_quantization: str = "none"
+    # Largest k /api/similar-users returns
+    similar_users_max_k: int = 100
+
+    # Ingested feed store; kept in memory only when no path is set
+    feed_store_path: Optional[str] = None
+    feed_store_ttl: Optional[float] = None
+
+    # Spam filter run on feeds before content discovery; the built-in rules
+    # are used when no rules file is set
+    spam_filter_enabled: bool = True
+    spam_rules_path: Optional[str] = None
+    spam_model_path: Optional[str] = None
+    spam_threshold: float = 0.9
+
+    # Local intent pre-classifier; casts scoring a reply probability below
+    # the threshold skip the intent model. Intent model decisions are logged
+    # for training when a log path is set
+    intent_model_path: Optional[str] = None
+    intent_pre_threshold: float = 0.05
+    intent_log_path: Optional[str] = None
+
+    # Casts processed at once by /api/generate-reply/batch
+    batch_concurrency: int = 8
+
+    # Queued user-summary jobs; kept in memory only when no path is set.
+    # Failed jobs are retried up to the attempt limit and finished jobs are
+    # deleted after the TTL in seconds. Running jobs hold a lease, renewed
+    # while they run, and are picked up again once it lapses
+    summary_job_path: Optional[str] = None
+    summary_job_workers: int = 4
+    summary_job_max_attempts: int = 3
+    summary_job_ttl: Optional[float] = 86400.0
+    summary_job_lease: float = 60.0
     
     # Workflow configurations
     workflows: WorkflowSettings = WorkflowSettings()
@@ -56,6 +104,7 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        extra = "ignore"
 
 @lru_cache()
 def get_settings() -> Settings:
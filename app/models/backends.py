@@ -0,0 +1,130 @@
+"""
+Pluggable backends behind the LLM helpers in app/models/llm.py
+"""
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from openai import NOT_GIVEN, AsyncOpenAI
+
+@dataclass
+class ChatResult:
+    """Text returned by a chat call and the tokens it used, if reported
+
+    cached_prompt_tokens is the part of prompt_tokens the provider served
+    from its prompt prefix cache.
+    """
+    content: str
+    total_tokens: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None
+
+@dataclass
+class EmbeddingResult:
+    """Vectors returned by an embeddings call, in input order"""
+    vectors: List[List[float]]
+    total_tokens: Optional[int] = None
+
+class LLMBackend:
+    """Interface every LLM backend implements"""
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> ChatResult:
+        """Run a chat completion"""
+        raise NotImplementedError
+
+    def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Run a chat completion, yielding text as it is generated"""
+        raise NotImplementedError
+
+    async def embed(
+        self,
+        model: str,
+        texts: List[str],
+        timeout: Optional[float] = None
+    ) -> EmbeddingResult:
+        """Embed several texts in one call"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release any resources held by the backend"""
+
+class OpenAIBackend(LLMBackend):
+    """Backend calling the OpenAI API through a shared async client"""
+
+    def __init__(self, client_factory: Callable[[], AsyncOpenAI]):
+        self.client_factory = client_factory
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> ChatResult:
+        response = await self.client_factory().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            response_format={"type": "json_object"} if json_mode else NOT_GIVEN,
+            timeout=timeout if timeout is not None else NOT_GIVEN
+        )
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        return ChatResult(
+            content=response.choices[0].message.content or "",
+            total_tokens=getattr(usage, "total_tokens", None),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            cached_prompt_tokens=getattr(details, "cached_tokens", None),
+        )
+
+    async def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        stream = await self.client_factory().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            response_format={"type": "json_object"} if json_mode else NOT_GIVEN,
+            stream=True,
+            timeout=timeout if timeout is not None else NOT_GIVEN
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def embed(
+        self,
+        model: str,
+        texts: List[str],
+        timeout: Optional[float] = None
+    ) -> EmbeddingResult:
+        response = await self.client_factory().embeddings.create(
+            model=model,
+            input=texts,
+            timeout=timeout if timeout is not None else NOT_GIVEN
+        )
+        usage = getattr(response, "usage", None)
+        return EmbeddingResult(
+            vectors=[item.embedding for item in sorted(response.data, key=lambda item: item.index)],
+            total_tokens=getattr(usage, "total_tokens", None),
+        )
@@ -0,0 +1,283 @@
+"""
+Local fake LLM backend for offline load and latency testing
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import numpy as np
+from openai import APIStatusError, RateLimitError
+
+from ..prompts import (
+    CAST_ANALYSIS_PROMPT,
+    CAST_SUMMARY_PROMPT,
+    CONTENT_DISCOVERY_PROMPT,
+    EMBEDDINGS_PROMPT,
+    INTENT_CHECK_PROMPT,
+    REPLY_GENERATION_PROMPT,
+    USER_SUMMARY_PROMPT,
+)
+from ..services.feeds import feed_field, feed_text
+from ..services.reply_template import render_reply
+from .backends import ChatResult, EmbeddingResult, LLMBackend
+
+STOPWORDS = {
+    "about", "anyone", "does", "from", "have", "just", "know", "like", "that",
+    "this", "what", "when", "where", "which", "with", "would", "your",
+}
+
+REPLY_SEEKING_WORDS = (
+    "?", "looking for", "anyone", "recommend", "help", "how do", "where can",
+    "hiring", "collab", "connect", "advice",
+)
+
+@dataclass
+class LatencyModel:
+    """Latency distribution sampled for each fake call, in seconds
+
+    distribution is one of "fixed", "uniform" or "lognormal"; for lognormal,
+    `mean` is the median latency and `sigma` the log-space spread.
+    """
+    distribution: str = "fixed"
+    mean: float = 0.0
+    low: float = 0.0
+    high: float = 0.0
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency"""
+        if self.distribution == "uniform":
+            return rng.uniform(self.low, self.high)
+        if self.distribution == "lognormal":
+            return self.mean * rng.lognormvariate(0, self.sigma) if self.mean > 0 else 0.0
+        return self.mean
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def _stable_fraction(text: str) -> float:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+def _keywords(text: str, limit: int = 8) -> List[str]:
+    seen = []
+    for word in _words(text):
+        if len(word) > 3 and word not in STOPWORDS and word not in seen:
+            seen.append(word)
+    return seen[:limit]
+
+def _parse_json(text: str) -> Dict[str, Any]:
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+def _seeded_unit_vector(text: str, dimensions: int) -> np.ndarray:
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return vector / np.linalg.norm(vector)
+
+class FakeBackend(LLMBackend):
+    """In-process stand-in for the OpenAI API
+
+    Chat calls recognise the prompts in app/prompts.py and return
+    schema-valid answers derived from the request, and embeddings are
+    deterministic bag-of-words unit vectors, so texts sharing words score a
+    higher cosine similarity. Latency is drawn from a
+    LatencyModel, and a fraction of calls can fail with a 429 or 500.
+
+    Prompt caching is simulated like the OpenAI API: once a system message
+    has been seen, later prompts of at least PROMPT_CACHE_MIN_TOKENS report
+    it as cached, in PROMPT_CACHE_INCREMENT token steps.
+    """
+
+    PROMPT_CACHE_MIN_TOKENS = 1024
+    PROMPT_CACHE_INCREMENT = 128
+
+    def __init__(
+        self,
+        latency: Optional[LatencyModel] = None,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        dimensions: int = 1536,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.dimensions = dimensions
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._cached_prefixes: set = set()
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> ChatResult:
+        await self._simulate()
+        content = self._answer(messages, json_mode)
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        return ChatResult(
+            content=content,
+            total_tokens=prompt_tokens + len(content) // 4,
+            prompt_tokens=prompt_tokens,
+            cached_prompt_tokens=self._cached_tokens(messages, prompt_tokens),
+        )
+
+    async def stream_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float = 1.0,
+        json_mode: bool = False,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        await self._simulate()
+        content = self._answer(messages, json_mode)
+        for start in range(0, len(content), 16):
+            await asyncio.sleep(0)
+            yield content[start:start + 16]
+
+    async def embed(
+        self,
+        model: str,
+        texts: List[str],
+        timeout: Optional[float] = None
+    ) -> EmbeddingResult:
+        await self._simulate()
+        return EmbeddingResult(
+            vectors=[self.embedding(text) for text in texts],
+            total_tokens=sum(len(text) for text in texts) // 4,
+        )
+
+    def embedding(self, text: str) -> List[float]:
+        """Deterministic unit vector for a text, summed from one vector per word"""
+        words = _words(text)
+        if not words:
+            return _seeded_unit_vector(text, self.dimensions).tolist()
+        vector = sum(_seeded_unit_vector(word, self.dimensions) for word in words)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def _simulate(self) -> None:
+        """Apply latency and injected failures, tracking calls in flight"""
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            delay = self.latency.sample(self._rng)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        roll = self._rng.random()
+        request = httpx.Request("POST", "http://fake-openai.local/v1")
+        if roll < self.rate_limit_rate:
+            raise RateLimitError(
+                "Rate limit reached (injected)",
+                response=httpx.Response(429, request=request),
+                body=None,
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise APIStatusError(
+                "Server error (injected)",
+                response=httpx.Response(500, request=request),
+                body=None,
+            )
+
+    def _cached_tokens(self, messages: List[Dict[str, str]], prompt_tokens: int) -> int:
+        """Tokens of the prompt's system message already seen, if the prompt is long enough"""
+        if not messages or messages[0]["role"] != "system":
+            return 0
+        prefix = messages[0]["content"]
+        if prefix not in self._cached_prefixes:
+            self._cached_prefixes.add(prefix)
+            return 0
+        if prompt_tokens < self.PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        prefix_tokens = min(len(prefix) // 4, prompt_tokens)
+        return prefix_tokens - prefix_tokens % self.PROMPT_CACHE_INCREMENT
+
+    def _answer(self, messages: List[Dict[str, str]], json_mode: bool) -> str:
+        """Build a response for whichever prompt the messages use"""
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if messages else ""
+
+        if system == USER_SUMMARY_PROMPT:
+            keywords = _keywords(user) or ["farcaster-user"]
+            return json.dumps({
+                "keywords": keywords,
+                "raw_summary": f"User interested in {', '.join(keywords[:3])}.",
+            })
+        if system == INTENT_CHECK_PROMPT:
+            return json.dumps(self._intent(user))
+        if system == CONTENT_DISCOVERY_PROMPT:
+            return json.dumps(self._discovery(_parse_json(user)))
+        if system == REPLY_GENERATION_PROMPT:
+            return json.dumps(render_reply(_parse_json(user).get("selected_content")))
+        if system == EMBEDDINGS_PROMPT:
+            return json.dumps({"vector": " ".join(_words(user))})
+        if system == CAST_SUMMARY_PROMPT:
+            return self._summary(user)
+        if system == CAST_ANALYSIS_PROMPT:
+            return json.dumps({"cast_summary": self._summary(user), **self._intent(user)})
+        if json_mode:
+            return "{}"
+        return ", ".join(_keywords(user, 10)) or "general-interest"
+
+    def _summary(self, cast_text: str) -> str:
+        return f"The user is posting about {' '.join(_keywords(cast_text, 5)) or 'their day'}."
+
+    def _intent(self, cast_text: str) -> Dict[str, Any]:
+        lowered = cast_text.lower()
+        should_reply = any(word in lowered for word in REPLY_SEEKING_WORDS)
+        return {
+            "should_reply": should_reply,
+            "identified_needs": _keywords(cast_text, 3) if should_reply else [],
+            "confidence": round(0.55 + 0.4 * _stable_fraction(cast_text), 2),
+        }
+
+    def _discovery(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        feeds = payload.get("feeds") or []
+        if not feeds:
+            return {
+                "selected_content": {
+                    "title": "", "url": "", "relevance_score": 0.0, "key_points": [],
+                    "author_username": "", "cast_hash": "", "channel_name": "",
+                },
+                "relevance_score": 0.0,
+                "key_points": [],
+            }
+
+        wanted = set(_words(payload.get("cast_text", "")))
+        best = max(
+            feeds,
+            key=lambda feed: len(wanted & set(_words(feed_text(feed)))),
+        )
+        text = feed_text(best)
+        score = round(0.6 + 0.35 * _stable_fraction(text), 2)
+        return {
+            "selected_content": {
+                "title": text[:80],
+                "url": feed_field(best, "url"),
+                "relevance_score": score,
+                "key_points": [text[:120] or "No content"],
+                "author_username": feed_field(best, "author_username", "username", "author"),
+                "cast_hash": feed_field(best, "cast_hash", "hash"),
+                "channel_name": feed_field(best, "channel_name", "channel"),
+            },
+            "relevance_score": score,
+            "key_points": [text[:120] or "No content"],
+        }
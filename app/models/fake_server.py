@@ -0,0 +1,96 @@
+"""
+OpenAI-compatible HTTP server backed by FakeBackend
+
+Run it with `uvicorn app.models.fake_server:app --port 9000` and point the
+service at it with OPENAI_BASE_URL=http://localhost:9000/v1 to exercise the
+real client and connection pool without calling OpenAI. Latency and failure
+injection use the same FAKE_LLM_* environment variables as the in-process
+backend.
+"""
+
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import APIStatusError
+
+from .llm import create_backend
+
+app = FastAPI(title="Fake OpenAI API")
+backend = create_backend("fake")
+
+def _error(e: APIStatusError) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"error": {"message": e.message, "type": "injected_error"}},
+    )
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Dict[str, Any]):
+    """Chat completions, streamed when requested"""
+    json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if request.get("stream"):
+        async def chunks() -> AsyncIterator[str]:
+            async for delta in backend.stream_chat(
+                request["model"], request["messages"], json_mode=json_mode
+            ):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    try:
+        result = await backend.chat(request["model"], request["messages"], json_mode=json_mode)
+    except APIStatusError as e:
+        return _error(e)
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request["model"],
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": result.content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.total_tokens - result.prompt_tokens,
+            "total_tokens": result.total_tokens,
+            "prompt_tokens_details": {"cached_tokens": result.cached_prompt_tokens},
+        },
+    }
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Dict[str, Any]):
+    """Embeddings for a string or a list of strings"""
+    texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+    try:
+        result = await backend.embed(request["model"], texts)
+    except APIStatusError as e:
+        return _error(e)
+
+    return {
+        "object": "list",
+        "model": request["model"],
+        "data": [
+            {"object": "embedding", "index": index, "embedding": vector}
+            for index, vector in enumerate(result.vectors)
+        ],
+        "usage": {"prompt_tokens": result.total_tokens, "total_tokens": result.total_tokens},
+    }
@@ -2,50 +2,386 @@
 Centralized LLM model configurations
 """
 
+import asyncio
+import copy
+import json
 import os
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, RateLimitError
+
+from ..services.embedding_batcher import EmbeddingBatcher
+from ..services.embedding_store import EmbeddingStore
+from ..services.metrics import metrics
+from ..services.rate_limiter import LLMScheduler, estimate_tokens
+from ..services.response_cache import DiskTier, MemoryTier, ResponseCache, make_cache_key
+from .backends import LLMBackend, OpenAIBackend
+from .fake_backend import FakeBackend, LatencyModel
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+
+# Connection pool and timeout settings for the shared async client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Embedding micro-batching (a window of 0 sends every text on its own)
+EMBEDDINGS_BATCH_WINDOW_MS = float(os.getenv("EMBEDDINGS_BATCH_WINDOW_MS", "5"))
+EMBEDDINGS_MAX_BATCH_SIZE = int(os.getenv("EMBEDDINGS_MAX_BATCH_SIZE", "64"))
+
+# Share one in-flight request between concurrent identical calls
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# Persistent embedding store (disabled unless a directory is set)
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "")
+
+# Structured response cache (the disk tier is only used when a path is set)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_DB_PATH = os.getenv("RESPONSE_CACHE_DB_PATH", "")
+RESPONSE_CACHE_DB_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DB_MAX_ENTRIES", "100000"))
+RESPONSE_CACHE_DB_TTL = float(os.getenv("RESPONSE_CACHE_DB_TTL", "86400"))
+RESPONSE_CACHE_NODES = os.getenv("RESPONSE_CACHE_NODES", "*")
+RESPONSE_CACHE_EXCLUDE_NODES = os.getenv("RESPONSE_CACHE_EXCLUDE_NODES", "")
 
 # Model names
 REASONING_MODEL = "o4-mini"
 GENERATION_MODEL = "gpt-4.1-mini"
 EMBEDDINGS_MODEL = "text-embedding-3-small"
 
+# Per-model request/token budgets and priority lanes (lower runs first);
+# both can be overridden with JSON in the environment
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "null")) or {
+    REASONING_MODEL: {"rpm": 500, "tpm": 200000},
+    GENERATION_MODEL: {"rpm": 500, "tpm": 200000},
+    EMBEDDINGS_MODEL: {"rpm": 3000, "tpm": 1000000},
+}
+LLM_PRIORITY_LANES = json.loads(os.getenv("LLM_PRIORITY_LANES", "null")) or {
+    "reply": 0,
+    "default": 1,
+    "embedding": 1,
+    "summary": 2,
+}
+# Prompt token budgets per node; lowest-priority items are trimmed to fit
+PROMPT_TOKEN_BUDGETS = json.loads(os.getenv("PROMPT_TOKEN_BUDGETS", "null")) or {
+    "process_user_data": 4000,
+    "discover_relevant_content": 6000,
+    "generate_reply": 2000,
+}
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "5"))
+
+# Backend selection: "openai" or "fake" (local stub for offline load testing)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "fixed:0")
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+
+_client: Optional[AsyncOpenAI] = None
+
+def get_client() -> AsyncOpenAI:
+    """Get the shared async OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        )
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+    return _client
+
+async def close_client() -> None:
+    """Close the shared client and release its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    await _backend.close()
+
+def parse_latency(spec: str) -> LatencyModel:
+    """Parse a latency spec: "fixed:0.5", "uniform:0.2:1.5" or "lognormal:0.8:0.4" """
+    name, *params = spec.split(":")
+    values = [float(param) for param in params]
+    if name == "uniform":
+        return LatencyModel("uniform", low=values[0], high=values[1])
+    if name == "lognormal":
+        return LatencyModel("lognormal", mean=values[0], sigma=values[1] if len(values) > 1 else 0.5)
+    return LatencyModel("fixed", mean=values[0] if values else 0.0)
+
+def create_backend(name: str) -> LLMBackend:
+    """Create the backend selected by name"""
+    if name == "fake":
+        return FakeBackend(
+            latency=parse_latency(FAKE_LLM_LATENCY),
+            error_rate=FAKE_LLM_ERROR_RATE,
+            rate_limit_rate=FAKE_LLM_RATE_LIMIT_RATE,
+        )
+    if name == "openai":
+        return OpenAIBackend(lambda: get_client())
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+_backend: LLMBackend = create_backend(LLM_BACKEND)
+
+def get_backend() -> LLMBackend:
+    """Get the backend all LLM calls go through"""
+    return _backend
+
+def set_backend(backend: LLMBackend) -> LLMBackend:
+    """Replace the backend all LLM calls go through, returning the previous one"""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+_response_cache = ResponseCache(
+    memory=MemoryTier(max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL),
+    disk=DiskTier(
+        RESPONSE_CACHE_DB_PATH,
+        max_entries=RESPONSE_CACHE_DB_MAX_ENTRIES,
+        ttl=RESPONSE_CACHE_DB_TTL,
+    ) if RESPONSE_CACHE_DB_PATH else None,
+    enabled=RESPONSE_CACHE_ENABLED,
+    nodes=[node.strip() for node in RESPONSE_CACHE_NODES.split(",") if node.strip()],
+    exclude_nodes=[
+        node.strip() for node in RESPONSE_CACHE_EXCLUDE_NODES.split(",") if node.strip()
+    ],
+)
+
+def get_response_cache() -> ResponseCache:
+    """Get the shared structured response cache"""
+    return _response_cache
+
+_scheduler = LLMScheduler(
+    limits=LLM_RATE_LIMITS,
+    lanes=LLM_PRIORITY_LANES,
+    enabled=LLM_SCHEDULER_ENABLED,
+)
+
+def get_scheduler() -> LLMScheduler:
+    """Get the shared LLM rate limiter and priority scheduler"""
+    return _scheduler
+
+async def _scheduled(model: str, tokens: int, call: Callable[[], Awaitable[Any]]) -> Any:
+    """Run an API call once the scheduler grants budget, then settle real usage"""
+    await _scheduler.acquire(model, tokens)
+    try:
+        response = await call()
+    except RateLimitError:
+        _scheduler.penalize(model, LLM_RATE_LIMIT_BACKOFF)
+        raise
+
+    if response.total_tokens is not None:
+        _scheduler.settle(model, tokens, response.total_tokens)
+    if getattr(response, "prompt_tokens", None) is not None:
+        _record_prompt_usage(model, response.prompt_tokens, response.cached_prompt_tokens or 0)
+    return response
+
+def _record_prompt_usage(model: str, prompt_tokens: int, cached_tokens: int) -> None:
+    """Count reported prompt tokens and how many were served from the prompt cache"""
+    for scope in ("llm", f"llm.{model}"):
+        metrics.increment(f"{scope}.prompt_tokens", prompt_tokens)
+        metrics.increment(f"{scope}.cached_prompt_tokens", cached_tokens)
+        metrics.define_ratio(
+            f"{scope}.prompt_cache_hit_rate", f"{scope}.cached_prompt_tokens", f"{scope}.prompt_tokens"
+        )
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one in-flight task
+
+    The shared task is shielded, so a caller giving up does not cancel the
+    request for the others still waiting on it.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func, or join the call already running for key"""
+        self.calls += 1
+        if not self.enabled:
+            return await func()
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get collapse counters"""
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._in_flight),
+        }
+
+_single_flight = SingleFlight(enabled=SINGLE_FLIGHT_ENABLED)
+
 async def get_structured_response(
     model: str,
     messages: list[Dict[str, str]],
     response_format: Dict[str, Any],
-    temperature: float = 1.0
+    temperature: float = 1.0,
+    timeout: Optional[float] = None,
+    node: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Get structured response from OpenAI API"""
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        response_format={"type": "json_object"}
-    )
-    
-    # Parse the JSON response
+    """Get structured response from OpenAI API
+
+    `node` names the calling node so the response cache can be enabled or
+    disabled per node.
+    """
+    cache_key = make_cache_key(model, messages, response_format, temperature)
+    use_cache = _response_cache.enabled_for(node)
+    if use_cache:
+        cached = await _response_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+    else:
+        _response_cache.record_bypass()
+
+    async def request() -> Dict[str, Any]:
+        response = await _scheduled(
+            model,
+            estimate_tokens(messages, LLM_COMPLETION_TOKENS_ESTIMATE),
+            lambda: _backend.chat(
+                model, messages, temperature=temperature, json_mode=True, timeout=timeout
+            )
+        )
+
+        # Parse the JSON response
+        try:
+            result = json.loads(response.content)
+        except Exception as e:
+            raise ValueError(f"Failed to parse response: {str(e)}")
+
+        if use_cache:
+            await _response_cache.set(cache_key, copy.deepcopy(result))
+        return result
+
+    # Concurrent identical calls share one result, so each caller gets a copy
+    result = await _single_flight.do(cache_key, request)
+    return copy.deepcopy(result)
+
+async def get_text_response(
+    model: str,
+    messages: list[Dict[str, str]],
+    temperature: float = 1.0,
+    timeout: Optional[float] = None
+) -> str:
+    """Get a plain text response from OpenAI API"""
+    async def request() -> str:
+        response = await _scheduled(
+            model,
+            estimate_tokens(messages, LLM_COMPLETION_TOKENS_ESTIMATE),
+            lambda: _backend.chat(model, messages, temperature=temperature, timeout=timeout)
+        )
+        return response.content
+
+    key = make_cache_key(model, messages, {"type": "text"}, temperature)
+    return await _single_flight.do(key, request)
+
+async def stream_response(
+    model: str,
+    messages: list[Dict[str, str]],
+    temperature: float = 1.0,
+    json_mode: bool = False,
+    timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """Stream response text from OpenAI API as it is generated"""
+    await _scheduler.acquire(model, estimate_tokens(messages, LLM_COMPLETION_TOKENS_ESTIMATE))
     try:
-        import json
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        raise ValueError(f"Failed to parse response: {str(e)}")
-
-async def get_embeddings(text: str) -> list[float]:
-    """Get embeddings from OpenAI API"""
-    response = client.embeddings.create(
-        model=EMBEDDINGS_MODEL,
-        input=text
+        async for delta in _backend.stream_chat(
+            model, messages, temperature=temperature, json_mode=json_mode, timeout=timeout
+        ):
+            yield delta
+    except RateLimitError:
+        _scheduler.penalize(model, LLM_RATE_LIMIT_BACKOFF)
+        raise
+
+async def get_embeddings_batch(
+    texts: List[str],
+    timeout: Optional[float] = None
+) -> List[List[float]]:
+    """Get embeddings for several texts in a single OpenAI API call"""
+    response = await _scheduled(
+        EMBEDDINGS_MODEL,
+        sum(len(text) for text in texts) // 4 + len(texts),
+        lambda: _backend.embed(EMBEDDINGS_MODEL, texts, timeout=timeout)
     )
-    return response.data[0].embedding
+    return response.vectors
+
+_embedding_batcher = EmbeddingBatcher(
+    get_embeddings_batch,
+    window_ms=EMBEDDINGS_BATCH_WINDOW_MS,
+    max_batch_size=EMBEDDINGS_MAX_BATCH_SIZE,
+)
+
+_embedding_store = (
+    EmbeddingStore(EMBEDDING_STORE_PATH, model=EMBEDDINGS_MODEL)
+    if EMBEDDING_STORE_PATH else None
+)
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get the shared embeddings batcher"""
+    return _embedding_batcher
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """Get the shared persistent embedding store, if one is configured"""
+    return _embedding_store
+
+async def get_embeddings(text: str, timeout: Optional[float] = None) -> list[float]:
+    """Get embeddings, checking the persistent store before calling OpenAI API
+
+    Concurrent misses are coalesced into batched API calls and written back
+    to the store.
+    """
+    if _embedding_store is not None:
+        stored = await asyncio.to_thread(_embedding_store.get, text)
+        if stored is not None:
+            return stored.tolist()
+
+    if EMBEDDINGS_BATCH_WINDOW_MS <= 0:
+        embedding = (await get_embeddings_batch([text], timeout=timeout))[0]
+    elif timeout is None:
+        embedding = await _embedding_batcher.embed(text)
+    else:
+        embedding = await asyncio.wait_for(_embedding_batcher.embed(text), timeout)
+
+    if _embedding_store is not None:
+        await asyncio.to_thread(_embedding_store.put, text, embedding)
+    return embedding
+
+def get_llm_stats() -> Dict[str, Any]:
+    """Get counters from the shared LLM services"""
+    return {
+        "embedding_batcher": _embedding_batcher.stats(),
+        "response_cache": _response_cache.stats(),
+        "single_flight": _single_flight.stats(),
+        "scheduler": _scheduler.stats(),
+        "embedding_store": _embedding_store.stats() if _embedding_store else None,
+    }
 
 # Factory functions to ensure consistent model creation
 def get_reasoning_model() -> str:
@@ -1,11 +1,15 @@
+"""
+Request and response schemas for the reply pipeline
+"""
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Dict, List, Optional
 
 class CastInput(BaseModel):
     cast_text: str
     user_id: str
     cast_id: str
     context: Optional[dict] = None
+    available_feeds: List[Dict[str, Any]] = []
 
 class ReplyCandidate(BaseModel):
     text: str
@@ -13,14 +17,19 @@ class ReplyCandidate(BaseModel):
     cast_id: str
     relevance_score: float
     confidence: float
+    url: str = ""
+    channel_name: str = ""
 
 class IntentAnalysis(BaseModel):
     should_reply: bool
     confidence: float
-    reasoning: str
+    reasoning: str = ""
+    identified_needs: List[str] = []
 
 class PipelineResponse(BaseModel):
     intent_analysis: IntentAnalysis
     recommended_replies: Optional[List[ReplyCandidate]] = None
     selected_reply: Optional[ReplyCandidate] = None
+    duplicates_dropped: int = 0
+    spam_dropped: int = 0
     processing_time: float 
\ No newline at end of file
@@ -2,33 +2,78 @@
 Node definitions for LangGraph workflows
 """
 
+import asyncio
 import json
-from typing import Any, Dict
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from .models.llm import (
+    PROMPT_TOKEN_BUDGETS,
     get_embeddings,
     get_generation_model,
     get_reasoning_model,
     get_structured_response,
+    stream_response,
 )
-from .prompts import (
-    CONTENT_DISCOVERY_PROMPT,
-    EMBEDDINGS_PROMPT,
-    INTENT_CHECK_PROMPT,
-    REPLY_GENERATION_PROMPT,
-    USER_SUMMARY_PROMPT,
-)
+from .prompts import PROMPTS
+from .services.dedup import collapse_near_duplicates
+from .services.feed_set import SharedFeedSet
+from .services.feeds import feed_text, top_k_similar
+from .services.intent_classifier import IntentPreClassifier
+from .services.metrics import metrics
+from .services.prompt_builder import build_messages, compact_json
+from .services.reply_template import render_reply
+from .services.spam_filter import SpamFilter
+from .services.vector_index import VectorIndex
+
+logger = logging.getLogger("nodes")
+
+def _build_prompt(
+    state: Dict[str, Any],
+    node: str,
+    prompt: str,
+    payload: Dict[str, Any],
+    model: str,
+    trim: Sequence[str] = ()
+) -> List[Dict[str, str]]:
+    """Build a node's prompt from PROMPTS within its token budget, recording its size in state"""
+    messages, tokens = build_messages(
+        PROMPTS[prompt], payload, model, budget=PROMPT_TOKEN_BUDGETS.get(node), trim=trim, node=node
+    )
+    state.setdefault("prompt_tokens", {})[node] = tokens
+    return messages
+
+def _newest_casts_first(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Order recent_casts newest first, so the oldest are trimmed first
+
+    Casts with a timestamp are sorted by it; otherwise they are assumed to
+    be newest first already, as the Farcaster APIs return them.
+    """
+    casts = user_data.get("recent_casts")
+    if isinstance(casts, list) and casts and all(
+        isinstance(cast, dict) and cast.get("timestamp") for cast in casts
+    ):
+        casts = sorted(casts, key=lambda cast: str(cast["timestamp"]), reverse=True)
+        return {**user_data, "recent_casts": casts}
+    return user_data
 
 # User Summary Nodes
 async def process_user_data(state: Dict[str, Any]) -> Dict[str, Any]:
     """Process raw user data and extract summary"""
-    messages = [
-        {"role": "system", "content": USER_SUMMARY_PROMPT},
-        {"role": "user", "content": json.dumps(state["user_data"], indent=2)},
-    ]
+    model = get_reasoning_model()
+    messages = _build_prompt(
+        state,
+        "process_user_data",
+        "user_summary",
+        _newest_casts_first(state["user_data"]),
+        model,
+        trim=["recent_casts"],
+    )
 
     response = await get_structured_response(
-        model=get_reasoning_model(),
+        model=model,
         messages=messages,
         response_format={
             "type": "object",
@@ -37,7 +82,8 @@ async def process_user_data(state: Dict[str, Any]) -> Dict[str, Any]:
                 "raw_summary": {"type": "string"}
             },
             "required": ["keywords", "raw_summary"]
-        }
+        },
+        node="process_user_data"
     )
 
     state["user_summary"] = {
@@ -54,26 +100,133 @@ async def generate_user_embedding(state: Dict[str, Any]) -> Dict[str, Any]:
     state["user_embedding"] = {"vector": embedding, "dimensions": len(embedding)}
     return state
 
+async def index_user_embedding(
+    state: Dict[str, Any],
+    index: Optional[VectorIndex] = None
+) -> Dict[str, Any]:
+    """Add the user embedding to the similar-users index"""
+    user_data = state["user_data"]
+    user_id = user_data.get("fid") or user_data.get("user_id") or user_data.get("username")
+    if index is not None and user_id:
+        await asyncio.to_thread(index.add, str(user_id), state["user_embedding"]["vector"])
+    return state
+
 # Reply Generation Nodes
-async def check_reply_intent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Check if the cast warrants a reply"""
-    messages = [
-        {"role": "system", "content": INTENT_CHECK_PROMPT},
-        {"role": "user", "content": state["cast_text"]},
-    ]
+INTENT_RESPONSE_FORMAT = {
+    "type": "object",
+    "properties": {
+        "should_reply": {"type": "boolean"},
+        "identified_needs": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+    },
+    "required": ["should_reply", "identified_needs", "confidence"]
+}
 
-    response = await get_structured_response(
-        model=get_reasoning_model(),
-        messages=messages,
-        response_format={
-            "type": "object",
-            "properties": {
-                "should_reply": {"type": "boolean"},
-                "identified_needs": {"type": "array", "items": {"type": "string"}},
-                "confidence": {"type": "number", "minimum": 0, "maximum": 1}
-            },
-            "required": ["should_reply", "identified_needs", "confidence"]
-        }
+metrics.define_ratio(
+    "intent_cascade.escalation_rate", "intent_cascade.escalations", "intent_cascade.calls"
+)
+
+CAST_ANALYSIS_RESPONSE_FORMAT = {
+    "type": "object",
+    "properties": {
+        "cast_summary": {"type": "string"},
+        **INTENT_RESPONSE_FORMAT["properties"]
+    },
+    "required": ["cast_summary", *INTENT_RESPONSE_FORMAT["required"]]
+}
+
+def _is_complete(response: Any, response_format: Dict[str, Any]) -> bool:
+    """Check a structured response has every required field and a numeric confidence"""
+    if not isinstance(response, dict) or any(key not in response for key in response_format["required"]):
+        return False
+    confidence = response["confidence"]
+    return isinstance(confidence, (int, float)) and not isinstance(confidence, bool)
+
+async def _classify_cast(
+    messages: List[Dict[str, str]],
+    response_format: Dict[str, Any],
+    node: str,
+    cascade_model: Optional[str],
+    confidence_threshold: float
+) -> Dict[str, Any]:
+    """Get a should_reply decision, escalating uncertain cascade answers
+
+    A fast tier answer that fails, cannot be parsed or is missing a required
+    field is escalated like an uncertain one, and also counted under
+    intent_cascade.fast_tier_errors.
+    """
+    response = None
+    if cascade_model:
+        metrics.increment("intent_cascade.calls")
+        try:
+            with metrics.timer("intent_cascade.fast_tier"):
+                response = await get_structured_response(
+                    model=cascade_model,
+                    messages=messages,
+                    response_format=response_format,
+                    node=f"{node}_fast"
+                )
+            if not _is_complete(response, response_format):
+                raise ValueError(f"Incomplete response: {response!r}")
+        except Exception as e:
+            logger.warning(f"Escalating {node}; the fast tier failed: {str(e)}")
+            metrics.increment("intent_cascade.fast_tier_errors")
+            response = None
+        if response is None or response["confidence"] < confidence_threshold:
+            metrics.increment("intent_cascade.escalations")
+            response = None
+
+    if response is None:
+        with metrics.timer("intent_cascade.reasoning_tier"):
+            response = await get_structured_response(
+                model=get_reasoning_model(),
+                messages=messages,
+                response_format=response_format,
+                node=node
+            )
+    return response
+
+def reply_probability(state: Dict[str, Any], pre_classifier: Optional[IntentPreClassifier]) -> Optional[float]:
+    """The pre_classifier's reply probability for the cast, scored once and kept in state"""
+    if pre_classifier is None:
+        return None
+    if state.get("reply_probability") is None:
+        state["reply_probability"] = pre_classifier.probability(state["cast_text"])
+    return state["reply_probability"]
+
+def _pre_classify(state: Dict[str, Any], pre_classifier: Optional[IntentPreClassifier]) -> bool:
+    """Set a local negative intent_analysis for a clear negative cast"""
+    intent = (
+        pre_classifier.classify(state["cast_text"], reply_probability(state, pre_classifier))
+        if pre_classifier else None
+    )
+    if intent is None:
+        return False
+    metrics.increment("intent_pre_classifier.skipped")
+    state["intent_analysis"] = intent
+    return True
+
+async def check_reply_intent(
+    state: Dict[str, Any],
+    cascade_model: Optional[str] = None,
+    confidence_threshold: float = 0.7,
+    pre_classifier: Optional[IntentPreClassifier] = None
+) -> Dict[str, Any]:
+    """Check if the cast warrants a reply
+
+    When a cascade_model is given, the cast is classified by that cheaper model
+    first and only escalated to the reasoning model if its confidence is below
+    confidence_threshold. Casts a pre_classifier finds clearly need no reply
+    are not sent to a model at all.
+    """
+    if _pre_classify(state, pre_classifier):
+        return state
+    response = await _classify_cast(
+        PROMPTS["intent_check"].render(cast_text=state["cast_text"]),
+        INTENT_RESPONSE_FORMAT,
+        "check_reply_intent",
+        cascade_model,
+        confidence_threshold,
     )
 
     state["intent_analysis"] = {
@@ -81,31 +234,174 @@ async def check_reply_intent(state: Dict[str, Any]) -> Dict[str, Any]:
         "identified_needs": response["identified_needs"],
         "confidence": response["confidence"],
     }
+    if pre_classifier:
+        await pre_classifier.record(state["cast_text"], state["intent_analysis"])
     return state
 
-async def discover_relevant_content(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Find relevant content from feeds"""
+async def analyze_cast(
+    state: Dict[str, Any],
+    cascade_model: Optional[str] = None,
+    confidence_threshold: float = 0.7,
+    pre_classifier: Optional[IntentPreClassifier] = None
+) -> Dict[str, Any]:
+    """Summarize the cast and check if it warrants a reply in one call
+
+    Sets the same intent_analysis as check_reply_intent, plus cast_summary,
+    saving the separate summary call. The cascade and pre_classifier work as
+    they do there; casts the pre_classifier answers get no summary.
+    """
+    if _pre_classify(state, pre_classifier):
+        state["cast_summary"] = None
+        return state
+    response = await _classify_cast(
+        PROMPTS["cast_analysis"].render(cast_text=state["cast_text"]),
+        CAST_ANALYSIS_RESPONSE_FORMAT,
+        "analyze_cast",
+        cascade_model,
+        confidence_threshold,
+    )
+
+    state["cast_summary"] = response["cast_summary"]
+    state["intent_analysis"] = {
+        "should_reply": response["should_reply"],
+        "identified_needs": response["identified_needs"],
+        "confidence": response["confidence"],
+    }
+    if pre_classifier:
+        await pre_classifier.record(state["cast_text"], state["intent_analysis"])
+    return state
+
+FeedVectorLookup = Callable[[Dict[str, Any]], Optional[np.ndarray]]
+
+async def embed_feeds(
+    feeds: List[Dict[str, Any]],
+    feed_vectors: Optional[FeedVectorLookup] = None
+) -> List[Any]:
+    """Get an embedding for each feed's text, reusing precomputed vectors
+
+    Missing embeddings are requested concurrently so the batcher sends them
+    in as few calls as possible.
+    """
+    known = [feed_vectors(feed) if feed_vectors else None for feed in feeds]
+    metrics.increment("feed_embeddings.precomputed", sum(vector is not None for vector in known))
+
+    async def embed(feed: Dict[str, Any], vector: Optional[np.ndarray]):
+        return vector if vector is not None else await get_embeddings(feed_text(feed))
+
+    return await asyncio.gather(*[embed(feed, vector) for feed, vector in zip(feeds, known)])
+
+async def _prefilter_feeds(
+    cast_text: str,
+    feeds: List[Dict[str, Any]],
+    top_k: int,
+    similarity_threshold: float,
+    feed_vectors: Optional[FeedVectorLookup] = None,
+    dedup_threshold: float = 0.0
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Keep the top_k feeds most similar to the cast, best first
+
+    Feeds scoring below similarity_threshold, or without text, are dropped,
+    as are near duplicates of a better-scoring feed. Returns the kept feeds
+    and how many near duplicates were dropped.
+    """
+    texted = [feed for feed in feeds if feed_text(feed)]
+    with metrics.timer("feed_prefilter"):
+        cast_vector, vectors = await asyncio.gather(
+            get_embeddings(cast_text), embed_feeds(texted, feed_vectors)
+        )
+    # Rank every feed when deduplicating, so duplicates do not take up top_k
+    ranked = [
+        texted[index]
+        for index, _ in top_k_similar(
+            cast_vector, vectors, len(texted) if dedup_threshold > 0 else top_k, similarity_threshold
+        )
+    ]
+    ranked, duplicates = collapse_near_duplicates(ranked, dedup_threshold, key=feed_text)
+    selected = ranked[:top_k]
+
+    metrics.increment("feed_prefilter.feeds_in", len(feeds))
+    metrics.increment("feed_prefilter.feeds_out", len(selected))
+    return selected, duplicates
+
+async def discover_relevant_content(
+    state: Dict[str, Any],
+    prefilter_top_k: int = 0,
+    similarity_threshold: float = 0.0,
+    feed_vectors: Optional[FeedVectorLookup] = None,
+    dedup_threshold: float = 0.0,
+    spam_filter: Optional[SpamFilter] = None
+) -> Dict[str, Any]:
+    """Find relevant content from feeds
+
+    When there are more than prefilter_top_k feeds, only the prefilter_top_k
+    most similar to the cast that clear similarity_threshold are sent to the
+    model. If none clear it, no content is discovered and the model is not
+    called. feed_vectors looks up precomputed feed embeddings.
+
+    Feeds whose text is a near duplicate (estimated Jaccard similarity of at
+    least dedup_threshold) of a better-ranked feed are collapsed into it;
+    the number dropped is stored in state["duplicates_dropped"]. Feeds
+    spam_filter flags are dropped first and counted in state["spam_dropped"].
+
+    A SharedFeedSet in state["feed_set"] replaces available_feeds. Its feeds
+    are already spam-filtered, and its embeddings are used before feed_vectors.
+    """
+    state["duplicates_dropped"] = 0
+    state["spam_dropped"] = 0
     if not state["intent_analysis"]["should_reply"]:
         state["discovered_content"] = None
         return state
 
-    messages = [
-        {"role": "system", "content": CONTENT_DISCOVERY_PROMPT},
+    feed_set: Optional[SharedFeedSet] = state.get("feed_set")
+    if feed_set is not None:
+        feeds = feed_set.feeds
+        state["spam_dropped"] = feed_set.spam_dropped
+        stored_vectors = feed_vectors
+
+        def shared_vectors(feed: Dict[str, Any]) -> Optional[np.ndarray]:
+            vector = feed_set.vector_for(feed)
+            if vector is None and stored_vectors is not None:
+                vector = stored_vectors(feed)
+            return vector
+
+        feed_vectors = shared_vectors
+    else:
+        feeds = state["available_feeds"]
+        if spam_filter is not None:
+            feeds, state["spam_dropped"] = spam_filter.filter(feeds)
+    if prefilter_top_k and len(feeds) > prefilter_top_k:
+        feeds, duplicates = await _prefilter_feeds(
+            state["cast_text"],
+            feeds,
+            prefilter_top_k,
+            similarity_threshold,
+            feed_vectors,
+            dedup_threshold,
+        )
+        if not feeds:
+            state["discovered_content"] = None
+            return state
+    else:
+        feeds, duplicates = collapse_near_duplicates(feeds, dedup_threshold, key=feed_text)
+    state["duplicates_dropped"] = duplicates
+    metrics.increment("feed_dedup.dropped", duplicates)
+
+    model = get_reasoning_model()
+    messages = _build_prompt(
+        state,
+        "discover_relevant_content",
+        "content_discovery",
         {
-            "role": "user",
-            "content": json.dumps(
-                {
-                    "cast_text": state["cast_text"],
-                    "identified_needs": state["intent_analysis"]["identified_needs"],
-                    "feeds": state["available_feeds"],
-                },
-                indent=2,
-            ),
+            "cast_text": state["cast_text"],
+            "identified_needs": state["intent_analysis"]["identified_needs"],
+            "feeds": feeds,
         },
-    ]
+        model,
+        trim=["feeds"],
+    )
 
     response = await get_structured_response(
-        model=get_reasoning_model(),
+        model=model,
         messages=messages,
         response_format={
             "type": "object",
@@ -124,7 +420,8 @@ async def discover_relevant_content(state: Dict[str, Any]) -> Dict[str, Any]:
                 "key_points": {"type": "array", "items": {"type": "string"}}
             },
             "required": ["selected_content", "relevance_score", "key_points"]
-        }
+        },
+        node="discover_relevant_content"
     )
 
     state["discovered_content"] = {
@@ -134,29 +431,38 @@ async def discover_relevant_content(state: Dict[str, Any]) -> Dict[str, Any]:
     }
     return state
 
-async def generate_reply(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate the final reply"""
+def _build_reply_messages(state: Dict[str, Any], model: str) -> List[Dict[str, str]]:
+    """Build the reply generation prompt from the discovered content"""
+    return _build_prompt(
+        state,
+        "generate_reply",
+        "reply_generation",
+        {
+            "cast_text": state["cast_text"],
+            "selected_content": state["discovered_content"]["selected_content"],
+        },
+        model,
+    )
+
+async def generate_reply(state: Dict[str, Any], use_llm: bool = False) -> Dict[str, Any]:
+    """Generate the final reply
+
+    The reply is rendered locally from the selected content, in the format
+    REPLY_GENERATION_PROMPT specifies, unless use_llm asks the generation
+    model to write it.
+    """
     if not state.get("discovered_content"):
         state["reply"] = {"reply_text": "No response needed for this cast.", "link": ""}
         return state
+    if not use_llm:
+        metrics.increment("reply_template.rendered")
+        state["reply"] = render_reply(state["discovered_content"]["selected_content"])
+        return state
 
-    messages = [
-        {"role": "system", "content": REPLY_GENERATION_PROMPT},
-        {
-            "role": "user",
-            "content": json.dumps(
-                {
-                    "cast_text": state["cast_text"],
-                    "selected_content": state["discovered_content"]["selected_content"],
-                },
-                indent=2,
-            ),
-        },
-    ]
-
+    model = get_generation_model()
     response = await get_structured_response(
-        model=get_generation_model(),
-        messages=messages,
+        model=model,
+        messages=_build_reply_messages(state, model),
         response_format={
             "type": "object",
             "properties": {
@@ -164,19 +470,44 @@ async def generate_reply(state: Dict[str, Any]) -> Dict[str, Any]:
                 "link": {"type": "string"}
             },
             "required": ["reply_text", "link"]
-        }
+        },
+        node="generate_reply"
     )
 
     state["reply"] = {"reply_text": response["reply_text"], "link": response["link"]}
     return state
 
+async def stream_reply(state: Dict[str, Any], use_llm: bool = False) -> AsyncIterator[str]:
+    """Generate the final reply, yielding the raw response text as it streams
+
+    The parsed reply is stored in state["reply"] once the stream finishes. A
+    locally rendered reply is stored without yielding anything.
+    """
+    if not state.get("discovered_content") or not use_llm:
+        await generate_reply(state)
+        return
+
+    chunks = []
+    model = get_generation_model()
+    async for delta in stream_response(
+        model=model,
+        messages=_build_reply_messages(state, model),
+        json_mode=True,
+    ):
+        chunks.append(delta)
+        yield delta
+
+    try:
+        response = json.loads("".join(chunks))
+    except Exception as e:
+        raise ValueError(f"Failed to parse response: {str(e)}")
+
+    state["reply"] = {"reply_text": response["reply_text"], "link": response["link"]}
+
 # Embeddings Generation Nodes
 async def prepare_embedding_text(state: Dict[str, Any]) -> Dict[str, Any]:
     """Prepare text for embedding generation"""
-    messages = [
-        {"role": "system", "content": EMBEDDINGS_PROMPT},
-        {"role": "user", "content": json.dumps(state["input_data"])},
-    ]
+    messages = PROMPTS["embeddings"].render(input_data=compact_json(state["input_data"]))
 
     response = await get_structured_response(
         model=get_reasoning_model(),
@@ -187,7 +518,8 @@ async def prepare_embedding_text(state: Dict[str, Any]) -> Dict[str, Any]:
                 "vector": {"type": "string"}
             },
             "required": ["vector"]
-        }
+        },
+        node="prepare_embedding_text"
     )
 
     state["prepared_text"] = response["vector"]
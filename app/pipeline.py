@@ -1,14 +1,23 @@
 import time
 from typing import Dict, Any, Optional
 
-from langgraph.graph import Graph, StateGraph
+from langgraph.graph import END, Graph
 from pydantic import BaseModel
 
-from .workflows.intent_analysis import IntentAnalysisWorkflow, IntentAnalysisConfig
-from .workflows.content_discovery import ContentDiscoveryWorkflow, ContentDiscoveryConfig
+from .workflows.intent_analysis import IntentAnalysisConfig
+from .workflows.content_discovery import (
+    ContentDiscoveryWorkflow,
+    ContentDiscoveryConfig,
+    candidate_to_content,
+)
 from .workflows.reply_generation import ReplyGenerationWorkflow, ReplyGenerationConfig
-from .models import CastInput, PipelineResponse
+from .models import CastInput, PipelineResponse, ReplyCandidate
+from .nodes import reply_probability
+from .services.feed_store import FeedStore
+from .services.intent_classifier import IntentPreClassifier
 from .services.logging_service import WorkflowLogger
+from .services.spam_filter import SpamFilter
+from .services.speculation import speculate
 
 class PipelineConfig(BaseModel):
     """Configuration for the entire pipeline"""
@@ -17,15 +26,35 @@ class PipelineConfig(BaseModel):
     reply_generation: ReplyGenerationConfig = ReplyGenerationConfig()
 
 class ReplyPipeline:
-    """Main pipeline for processing casts and generating replies"""
+    """Main pipeline for processing casts and generating replies
+
+    Content is discovered by the local ranking engine, so the only model
+    calls are the intent check and the reply itself.
+    """
     
-    def __init__(self, config: Optional[PipelineConfig] = None):
+    def __init__(
+        self,
+        config: Optional[PipelineConfig] = None,
+        feed_store: Optional[FeedStore] = None,
+        spam_filter: Optional[SpamFilter] = None,
+        pre_classifier: Optional[IntentPreClassifier] = None
+    ):
         self.config = config or PipelineConfig()
         
         # Initialize workflows
-        self.intent_workflow = IntentAnalysisWorkflow(self.config.intent_analysis)
-        self.discovery_workflow = ContentDiscoveryWorkflow(self.config.content_discovery)
-        self.reply_workflow = ReplyGenerationWorkflow(self.config.reply_generation)
+        self.discovery_workflow = ContentDiscoveryWorkflow(
+            self.config.content_discovery,
+            feed_vectors=feed_store.vector_for if feed_store is not None else None,
+            spam_filter=spam_filter,
+        )
+        self.reply_workflow = ReplyGenerationWorkflow(
+            self.config.reply_generation,
+            intent_config=self.config.intent_analysis,
+            discovery_config=self.config.content_discovery,
+            feed_store=feed_store,
+            spam_filter=spam_filter,
+            pre_classifier=pre_classifier,
+        )
         
         # Initialize logger
         self.logger = WorkflowLogger("ReplyPipeline")
@@ -35,7 +64,7 @@ class ReplyPipeline:
     
     def _create_workflow(self) -> Graph:
         """Create the LangGraph workflow"""
-        workflow = StateGraph(Dict)
+        workflow = Graph()
         
         # Add nodes for each step
         workflow.add_node("analyze_intent", self._wrap_node_with_logging(self._analyze_intent, "analyze_intent"))
@@ -48,15 +77,16 @@ class ReplyPipeline:
             self._should_continue_pipeline,
             {
                 True: "discover_content",
-                False: None  # End workflow if no reply needed
+                False: END  # End workflow if no reply needed
             }
         )
         
         # Add remaining edges
         workflow.add_edge("discover_content", "generate_reply")
         
-        # Set entry point
+        # Set entry and end points
         workflow.set_entry_point("analyze_intent")
+        workflow.set_finish_point("generate_reply")
         
         return workflow.compile()
     
@@ -74,9 +104,27 @@ class ReplyPipeline:
         return wrapped_node
     
     async def _analyze_intent(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Analyze if the cast needs a reply"""
-        result = await self.intent_workflow.process(state["input"])
-        state["intent_analysis"] = result
+        """Analyze if the cast needs a reply
+
+        In speculative mode content is discovered at the same time, and kept
+        only if a reply is needed.
+        """
+        cast_text = state["input"]["cast_text"]
+        intent_state = {"cast_text": cast_text}
+        probability = reply_probability(intent_state, self.reply_workflow.pre_classifier)
+        intent = self.reply_workflow.check_intent(intent_state)
+        if self.reply_workflow.should_speculate(cast_text, probability):
+            result, discovered = await speculate(
+                "discover_content",
+                intent,
+                lambda: self.discovery_workflow.process(state["input"]),
+                lambda result: result["intent_analysis"]["should_reply"],
+            )
+            if discovered is not None:
+                state["content_discovery"] = discovered
+        else:
+            result = await intent
+        state["intent_analysis"] = result["intent_analysis"]
         return state
     
     def _should_continue_pipeline(self, state: Dict[str, Any]) -> bool:
@@ -84,22 +132,24 @@ class ReplyPipeline:
         return state["intent_analysis"]["should_reply"]
     
     async def _discover_content(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Discover relevant content for the reply"""
+        """Discover relevant content for the reply, unless it was already discovered speculatively"""
+        if "content_discovery" in state:
+            return state
         result = await self.discovery_workflow.process(state["input"])
         state["content_discovery"] = result
         return state
     
     async def _generate_reply(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate the final reply"""
-        input_data = {
-            **state["input"],
-            "reference_content": state["content_discovery"]["candidates"][0]["text"]
-            if state["content_discovery"]["candidates"]
-            else ""
+        """Generate the final reply from the best candidate"""
+        candidates = state["content_discovery"]["candidates"]
+        result = await self.reply_workflow.generate_reply({
+            "cast_text": state["input"]["cast_text"],
+            "discovered_content": candidate_to_content(candidates[0]) if candidates else None,
+        })
+        state["reply_generation"] = {
+            **result["reply"],
+            "candidate": candidates[0] if candidates else None,
         }
-        
-        result = await self.reply_workflow.process(input_data)
-        state["reply_generation"] = result
         return state
     
     async def process(self, cast_input: CastInput) -> PipelineResponse:
@@ -129,8 +179,14 @@ class ReplyPipeline:
                     candidate for candidate in 
                     final_state.get("content_discovery", {}).get("candidates", [])
                 ] if "content_discovery" in final_state else None,
-                selected_reply=final_state.get("reply_generation", {}).get("reply_text")
-                if "reply_generation" in final_state else None,
+                selected_reply=ReplyCandidate(
+                    **{
+                        **final_state["reply_generation"]["candidate"],
+                        "text": final_state["reply_generation"]["reply_text"],
+                    }
+                ) if final_state.get("reply_generation", {}).get("candidate") else None,
+                duplicates_dropped=final_state.get("content_discovery", {}).get("duplicates_dropped", 0),
+                spam_dropped=final_state.get("content_discovery", {}).get("spam_dropped", 0),
                 processing_time=time.time() - final_state["start_time"]
             )
             
@@ -1,21 +1,24 @@
 """
 Centralized prompt management for the AI service
+
+Every prompt is a static system message, with all per-request content in
+the user message after it. Requests to a model then share the system
+message as a stable prefix, which the API can serve from its prompt cache.
 """
+import string
+from typing import Any, Dict, List, Tuple
 
 # User Summary Workflow
 USER_SUMMARY_PROMPT = """
-Analyze the following user data and extract key information about their interests, expertise, and engagement patterns.
+Analyze the user data in the user message, given as JSON, and extract key information about their interests, expertise, and engagement patterns.
 Focus on identifying topics they frequently engage with and their level of expertise in different areas.
 Please analyze the provided user data and return a JSON response with:
 - keywords: A list of key terms that represent the user's interests and activities
 - raw_summary: A brief summary of the user's profile and behavior
-
-User Data:
-{user_data}
 """
 
 # Reply Generation Workflow
-INTENT_CHECK_PROMPT = """
+INTENT_DECISION_CRITERIA = """
 <decision_criteria>
 First, determine if the user's cast warrants a response based on these guidelines:
 
@@ -37,28 +40,26 @@ First, determine if the user's cast warrants a response based on these guideline
    - Vague or ambiguous posts with insufficient context
 
 </decision_criteria>
+"""
 
+INTENT_CHECK_PROMPT = INTENT_DECISION_CRITERIA + """
 Please analyze the cast and return a JSON response with:
 - should_reply: boolean indicating if a reply is warranted
 - identified_needs: list of specific needs or questions that should be addressed
-- confidence: float between 0 and 1 indicating confidence in the analysis
+- confidence: float between 0 and 1 indicating how certain you are of the should_reply decision (high for clear-cut casts either way, low for borderline ones)
 
 If you determine NO RESPONSE is needed, output:
 {
     "should_reply": false,
     "identified_needs": [],
-    "confidence": 0.0,
+    "confidence": 0.95,
     "reply": {
         "reply_text": "No response needed for this cast.",
         "link": ""
     }
 }
 
-Cast Text:
-{cast_text}
-
-Cast Summary:
-{cast_summary}
+The user message is the text of the cast.
 """
 
 CONTENT_DISCOVERY_PROMPT = """
@@ -69,17 +70,7 @@ Consider:
 - Authority and credibility
 - Potential impact and value-add
 
-Cast Text:
-{cast_text}
-
-Cast Summary:
-{cast_summary}
-
-Identified Needs:
-{identified_needs}
-
-Available Feeds:
-{available_feeds}
+The user message is a JSON object with the cast_text, the identified_needs of its author and the available feeds.
 
 Please analyze the cast and available feeds to return a JSON response with the following EXACT structure:
 {
@@ -109,20 +100,13 @@ IMPORTANT:
 """
 
 REPLY_GENERATION_PROMPT = """
+You are a helpful AI assistant that generates replies to Farcaster casts.
 Generate a reply to the cast using ONLY the exact content from the selected feed.
 The reply MUST follow this EXACT format:
 "You should connect with [author_username], who said: '[content]'"
 
-Cast Text:
-{cast_text}
-
-Cast Summary:
-{cast_summary}
+The user message is a JSON object with the cast_text and the selected_content.
 
-Selected Content:
-{selected_content}
-
-You are a helpful AI assistant that generates replies to Farcaster casts.
 Please generate a reply and return a JSON response with:
 {
     "reply_text": "string - MUST be in format: 'You should connect with [author_username], who said: '[content]''. If selected_content is empty, return 'No relevant content found in the available feeds.'",
@@ -140,26 +124,20 @@ IMPORTANT:
 
 # Embeddings Workflow
 EMBEDDINGS_PROMPT = """
-Prepare the following input data for embedding generation.
+Prepare the input data in the user message, given as JSON, for embedding generation.
 Extract and combine the most semantically meaningful elements while preserving the core meaning.
 Clean and normalize the text, removing any noise or irrelevant information.
 You are a helpful AI assistant that prepares text for embedding generation.
 Please analyze the input data and return a JSON response with:
 - vector: A list of floats representing the embedding vector
 - dimensions: The number of dimensions in the vector
-
-Input Data:
-{input_data}
 """
 
 # Cast Summary Generation
 CAST_SUMMARY_PROMPT = """
-Analyze the following cast and provide a brief summary of its intent and content.
+Analyze the cast in the user message and provide a brief summary of its intent and content.
 Focus on understanding what the user is seeking or expressing.
 
-Cast Text:
-{cast_text}
-
 Please provide a concise summary in 1-2 sentences that captures:
 1. The main topic or subject
 2. The user's intent (seeking help, sharing information, asking questions, etc.)
@@ -167,3 +145,108 @@ Please provide a concise summary in 1-2 sentences that captures:
 
 The summary should be clear and focused on what would be most relevant for finding helpful content to respond with.
 """
+
+# Cast summary and intent check in a single call
+CAST_ANALYSIS_PROMPT = INTENT_DECISION_CRITERIA + """
+The user message is the text of the cast.
+
+Please analyze the cast and return a JSON response with:
+- cast_summary: a concise summary in 1-2 sentences of the cast's main topic, the user's intent (seeking help, sharing information, asking questions, etc.) and any specific needs or requests mentioned
+- should_reply: boolean indicating if a reply is warranted
+- identified_needs: list of specific needs or questions that should be addressed, empty if no reply is warranted
+- confidence: float between 0 and 1 indicating how certain you are of the should_reply decision (high for clear-cut casts either way, low for borderline ones)
+"""
+
+# Keyword extraction for cohort clustering
+KEYWORD_ANALYST_ROLE = "You are an expert analyst generating psychological and content interest summaries."
+
+INTENT_KEYWORDS_PROMPT = KEYWORD_ANALYST_ROLE + """
+
+<instruction>
+Analyze the Farcaster cast given in <cast_text> and extract a flat, structured list of cohort-relevant keywords.
+These keywords will be used for user clustering, so focus on identifying meaningful interests, behaviors, communities, and intent expressed in the cast.
+</instruction>
+
+<output_requirements>
+1. Return a flat list of lowercase, hyphenated keywords (no sentences or explanations).
+2. Each keyword should reflect a cohort-relevant dimension such as:
+   - Specific interest/topic (e.g. 'onchain-fitness', 'ai-art-tools')
+   - Behavioral pattern or intent (e.g. 'open-collab-invite', 'builder-outreach')
+   - Community or context (e.g. 'farcaster-networking', 'zora-poster')
+   - Product or content domain (e.g. 'fitness-dapp-creator', 'frame-developer')
+   - Personality or engagement style (e.g. 'thoughtful-replier', 'public-builder')
+3. Avoid vague terms like 'web3', 'tech', or generic verbs.
+4. Keep it concise — no more than 10 keywords per cast.
+5. Output must be a single comma-separated line of keywords only.
+</output_requirements>
+
+<examples>
+Input: "building something around onchain-fitness — let's connect?"
+Output: onchain-fitness, builder-outreach, farcaster-networking, fitness-dapp-creator, open-collab-invite, community-collaborator, health-and-wellness
+
+Input: "launched a new frame using Zora — supports music NFTs"
+Output: zora-frame-builder, music-nft-creator, frame-launcher, zora-user, creative-tools-user, public-release-announcement
+</examples>
+"""
+
+USER_CONTEXT_PROMPT = KEYWORD_ANALYST_ROLE + """
+
+<instruction>
+From the user's Farcaster data given in <user_data>, extract a structured keyword profile representing their interests, behaviors, communities, and preferences.
+This profile will be used to generate embeddings and cluster users into highly relevant cohorts.
+</instruction>
+
+<output_requirements>
+1. Return a flat list of lowercase, hyphenated keywords (no sentences).
+2. Each keyword should reflect a meaningful trait, behavior, tool, or interest (e.g. 'zora-user', 'frame-builder', 'philosophy-discussions', 'onchain-gaming').
+3. Focus on cohort-defining dimensions: content topics, communities, actions, personality style, and engagement type.
+4. Avoid vague terms like "web3" or "crypto" unless combined with specificity (e.g. 'web3-design', 'crypto-security-research').
+5. No filler words, no explanation — only the keyword list, comma-separated.
+</output_requirements>
+
+<examples>
+Good output:
+"frame-builder, farcaster-poweruser, zora-poster, thoughtful-replier, ai-curious, defi-scalability, ethcc-attendee, builder-in-public, photography-enthusiast, governance-participant"
+
+Bad output:
+"This user enjoys Web3 and tech. They are very active online and like to post." (Too vague, narrative style)
+</examples>
+"""
+
+class PromptTemplate:
+    """A static system message followed by a user message template
+
+    The user template is parsed once, when the template is created, and
+    rendering only joins its pieces. The system message is never formatted,
+    so it can contain literal braces such as JSON examples.
+    """
+
+    def __init__(self, system: str, user: str):
+        self.system = system
+        self._parts: List[Tuple[str, str]] = [
+            (literal, field or "") for literal, field, _, _ in string.Formatter().parse(user)
+        ]
+        self.variables = tuple(field for _, field in self._parts if field)
+
+    def render(self, **values: Any) -> List[Dict[str, str]]:
+        """Build the chat messages for one request"""
+        missing = set(self.variables) - set(values)
+        if missing:
+            raise KeyError(f"Missing prompt variables: {', '.join(sorted(missing))}")
+        user = "".join(
+            literal + (str(values[field]) if field else "") for literal, field in self._parts
+        )
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": user}]
+
+# Every prompt, compiled once at import
+PROMPTS: Dict[str, PromptTemplate] = {
+    "user_summary": PromptTemplate(USER_SUMMARY_PROMPT, "{payload}"),
+    "intent_check": PromptTemplate(INTENT_CHECK_PROMPT, "{cast_text}"),
+    "content_discovery": PromptTemplate(CONTENT_DISCOVERY_PROMPT, "{payload}"),
+    "reply_generation": PromptTemplate(REPLY_GENERATION_PROMPT, "{payload}"),
+    "embeddings": PromptTemplate(EMBEDDINGS_PROMPT, "{input_data}"),
+    "cast_summary": PromptTemplate(CAST_SUMMARY_PROMPT, "{cast_text}"),
+    "cast_analysis": PromptTemplate(CAST_ANALYSIS_PROMPT, "{cast_text}"),
+    "intent_keywords": PromptTemplate(INTENT_KEYWORDS_PROMPT, "<cast_text>\n{cast_text}\n</cast_text>"),
+    "user_context": PromptTemplate(USER_CONTEXT_PROMPT, "<user_data>\n{user_data}\n</user_data>"),
+}
@@ -0,0 +1,229 @@
+"""
+Resumable processing of JSONL request files
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger("services.batch_runner")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+@dataclass
+class BatchStats:
+    """Counters for one batch run"""
+    processed: int = 0
+    errors: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+    errors_by_type: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "throughput": self.throughput}
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+class Checkpoint:
+    """Progress of a run, saved atomically next to its output
+
+    `watermark` is the last input line before which every line is done,
+    `done` the finished lines after it, and `offset` the output file size
+    when the checkpoint was saved.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self.offset = 0
+
+    def load(self) -> bool:
+        """Read a saved checkpoint, returning whether there was one"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        self.watermark = int(data["watermark"])
+        self.done = set(data["done"])
+        self.offset = int(data["offset"])
+        return True
+
+    def mark(self, line: int) -> None:
+        """Record a finished line, advancing the watermark past finished runs"""
+        self.done.add(line)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.remove(self.watermark)
+
+    def is_done(self, line: int) -> bool:
+        return line <= self.watermark or line in self.done
+
+    def save(self, offset: int) -> None:
+        """Write the checkpoint through a temporary file and rename it into place"""
+        self.offset = offset
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"watermark": self.watermark, "done": sorted(self.done), "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+class BatchRunner:
+    """Runs each line of a JSONL file through the handler for its type
+
+    Every input line is a JSON object whose `type` names a handler; its
+    result, or the error it raised, is appended to the output as soon as it
+    finishes, as {"line", "id", "type", "result" or "error"}. At most
+    `concurrency` lines are in flight, and the input is read as they finish.
+
+    Progress is checkpointed every `checkpoint_every` lines. Rerunning with
+    the same output resumes the run: lines recorded in the checkpoint, or in
+    output written after it, are skipped, and a partly written last output
+    line is dropped.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Handler],
+        concurrency: int = 8,
+        checkpoint_every: int = 100,
+        progress_interval: float = 10.0,
+        on_progress: Optional[Callable[[BatchStats], None]] = None
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+
+    async def run(
+        self,
+        input_path: str,
+        output_path: str,
+        checkpoint_path: Optional[str] = None
+    ) -> BatchStats:
+        """Process every line of input_path not yet done, returning the run's counters"""
+        checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+        checkpoint.load()
+        self._recover(checkpoint, output_path)
+
+        stats = BatchStats()
+        start = time.perf_counter()
+        last_progress = start
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: Set[asyncio.Task] = set()
+        since_checkpoint = 0
+
+        with open(output_path, "a") as output:
+            def finish(line: int, record: Dict[str, Any]) -> None:
+                nonlocal since_checkpoint, last_progress
+                output.write(json.dumps(record, default=_json_default) + "\n")
+                output.flush()
+                checkpoint.mark(line)
+                stats.processed += 1
+                if "error" in record:
+                    stats.errors += 1
+                    kind = str(record.get("type"))
+                    stats.errors_by_type[kind] = stats.errors_by_type.get(kind, 0) + 1
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    checkpoint.save(output.tell())
+                    since_checkpoint = 0
+                now = time.perf_counter()
+                if self.on_progress and now - last_progress >= self.progress_interval:
+                    stats.elapsed = now - start
+                    self.on_progress(stats)
+                    last_progress = now
+
+            async def process(line: int, raw: str) -> None:
+                try:
+                    record = await self._handle(line, raw)
+                    finish(line, record)
+                finally:
+                    semaphore.release()
+
+            with open(input_path) as lines:
+                for line, raw in enumerate(lines, 1):
+                    if checkpoint.is_done(line):
+                        stats.skipped += 1
+                        continue
+                    if not raw.strip():
+                        checkpoint.mark(line)
+                        continue
+                    await semaphore.acquire()
+                    task = asyncio.create_task(process(line, raw))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+            checkpoint.save(output.tell())
+
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    async def _handle(self, line: int, raw: str) -> Dict[str, Any]:
+        """Run one input line, capturing any error in the record"""
+        record: Dict[str, Any] = {"line": line}
+        try:
+            request = json.loads(raw)
+            record["id"] = request.get("id")
+            record["type"] = request.get("type")
+            handler = self.handlers.get(request.get("type"))
+            if handler is None:
+                raise ValueError(f"Unknown request type {request.get('type')!r}")
+            record["result"] = await handler(request)
+        except Exception as e:
+            record["error"] = str(e) or type(e).__name__
+        return record
+
+    def _recover(self, checkpoint: Checkpoint, output_path: str) -> None:
+        """Mark lines written after the checkpoint done, dropping a partial last line
+
+        A checkpoint is only trusted up to its offset in the output. When the
+        output is missing or shorter than that, the checkpoint is discarded
+        and progress is rebuilt from the lines the output really holds.
+        """
+        try:
+            size = os.path.getsize(output_path)
+        except FileNotFoundError:
+            size = None
+        if size is None or checkpoint.offset > size:
+            if checkpoint.offset:
+                logger.warning(f"{output_path} is missing or shorter than its checkpoint; rebuilding progress from it")
+            checkpoint.offset = 0
+        if checkpoint.offset == 0:
+            checkpoint.watermark, checkpoint.done = 0, set()
+        if size is None:
+            return
+        offset = checkpoint.offset
+
+        with open(output_path, "rb+") as f:
+            f.seek(offset)
+            tail = f.read()
+            complete = tail[:tail.rfind(b"\n") + 1]
+            if len(complete) < len(tail):
+                logger.warning(f"Dropping a partly written line at the end of {output_path}")
+                f.truncate(offset + len(complete))
+
+        recovered = 0
+        for raw in complete.splitlines():
+            try:
+                checkpoint.mark(int(json.loads(raw)["line"]))
+                recovered += 1
+            except (ValueError, KeyError, TypeError):
+                continue
+        if recovered:
+            logger.info(f"Recovered {recovered} finished lines from {output_path}")
@@ -0,0 +1,87 @@
+"""
+Near-duplicate detection for feed text
+"""
+import re
+import zlib
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+_URL = re.compile(r"https?://\S+|www\.\S+")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+def shingles(text: str, size: int = 4) -> List[str]:
+    """Character shingles of text with case, links and punctuation removed"""
+    normalized = _NON_WORD.sub(" ", _URL.sub(" ", text.lower())).strip()
+    if len(normalized) <= size:
+        return [normalized] if normalized else []
+    return [normalized[i:i + size] for i in range(len(normalized) - size + 1)]
+
+class MinHasher:
+    """MinHash signatures estimating the Jaccard similarity of shingle sets"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 4, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd multipliers, arithmetic wraps mod 2**64
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def signature(self, text: str) -> np.ndarray:
+        """Minimum hash of the text's shingles under each permutation"""
+        hashes = np.fromiter(
+            {zlib.crc32(shingle.encode()) for shingle in shingles(text, self.shingle_size)},
+            dtype=np.uint64,
+        )
+        if not hashes.size:
+            return np.full(self._a.shape, np.iinfo(np.uint64).max, dtype=np.uint64)
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+        return permuted.min(axis=1)
+
+class NearDuplicateFilter:
+    """Remembers texts seen so far and flags ones too similar to any of them
+
+    Texts should be checked best first, so the best of each group of near
+    duplicates is the one kept.
+    """
+
+    def __init__(self, threshold: float, hasher: Optional[MinHasher] = None):
+        self.threshold = threshold
+        self.hasher = hasher or _default_hasher
+        self._signatures = np.empty((16, self.hasher.num_perm), dtype=np.uint64)
+        self._size = 0
+
+    def is_duplicate(self, text: str) -> bool:
+        """Check a text, remembering it unless it is a near duplicate"""
+        signature = self.hasher.signature(text)
+        if self._size:
+            similarity = (self._signatures[:self._size] == signature).mean(axis=1)
+            if similarity.max() >= self.threshold:
+                return True
+        if self._size == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[self._size] = signature
+        self._size += 1
+        return False
+
+def collapse_near_duplicates(
+    items: Sequence[T],
+    threshold: float,
+    key: Callable[[T], str]
+) -> Tuple[List[T], int]:
+    """Drop items whose text is a near duplicate of an earlier item's
+
+    Estimated Jaccard similarity of at least threshold counts as a
+    duplicate; a threshold of 0 or less keeps everything. Returns the kept
+    items, in order, and how many were dropped.
+    """
+    if threshold <= 0:
+        return list(items), 0
+    seen = NearDuplicateFilter(threshold)
+    kept = [item for item in items if not seen.is_duplicate(key(item))]
+    return kept, len(items) - len(kept)
+
+_default_hasher = MinHasher()
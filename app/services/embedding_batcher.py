@@ -0,0 +1,97 @@
+"""
+Micro-batching service for embedding requests
+"""
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("services.embedding_batcher")
+
+EmbedBatchFunc = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+@dataclass
+class BatcherStats:
+    """Counters describing how well requests are being coalesced"""
+    requests: int = 0
+    batches: int = 0
+    texts_sent: int = 0
+    largest_batch: int = 0
+    failed_batches: int = 0
+
+class EmbeddingBatcher:
+    """Collects concurrent embedding requests and sends them as one API call
+
+    The first request of a batch opens a collection window; every request
+    that arrives before the window closes (or until max_batch_size is reached)
+    is sent together and each caller receives its own vector.
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatchFunc,
+        window_ms: float = 5.0,
+        max_batch_size: int = 64
+    ):
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self._stats = BatcherStats()
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a text for the next batch and wait for its vector"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self._stats.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+
+        return await future
+
+    def stats(self) -> Dict[str, int]:
+        """Get batching counters"""
+        return asdict(self._stats)
+
+    def _dispatch(self) -> None:
+        """Send everything collected so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Embed a batch and fan the vectors back out to the waiting callers"""
+        # Identical texts in the same window share one input slot
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self._stats.batches += 1
+        self._stats.texts_sent += len(texts)
+        self._stats.largest_batch = max(self._stats.largest_batch, len(batch))
+
+        try:
+            vectors = await self.embed_batch(texts)
+        except Exception as e:
+            self._stats.failed_batches += 1
+            logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        results = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(results[text])
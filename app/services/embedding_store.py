@@ -0,0 +1,154 @@
+"""
+Persistent embedding store backed by a memory-mapped vector file
+"""
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+def text_key(model: str, text: str) -> str:
+    """Hash a (model, text) pair into a store key"""
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+@dataclass
+class StoreStats:
+    """Lookup counters for the embedding store"""
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+
+class EmbeddingStore:
+    """Stores float32 vectors in an append-only file indexed by text hash
+
+    Vectors live in `vectors.f32` as fixed-width rows and are read through a
+    read-only memory map, so lookups return views without copying. The
+    hash -> row index lives in `index.sqlite`. Appends take an exclusive file
+    lock, which lets several worker processes share one directory.
+    """
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        open(self.vectors_path, "ab").close()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), check_same_thread=False, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._rows: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._dimensions: Optional[int] = None
+        self._stats = StoreStats()
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        """Vector width, fixed by the first vector written to the store"""
+        if self._dimensions is None:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE name = 'dimensions'"
+            ).fetchone()
+            if row is not None:
+                self._dimensions = int(row[0])
+        return self._dimensions
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Get a read-only view of the stored vector for a text"""
+        key = text_key(self.model, text)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                found = self._conn.execute(
+                    "SELECT row FROM vectors WHERE key = ?", (key,)
+                ).fetchone()
+                if found is None:
+                    self._stats.misses += 1
+                    return None
+                row = self._rows[key] = found[0]
+
+            vectors = self._vectors(min_rows=row + 1)
+            self._stats.hits += 1
+            return vectors[row]
+
+    def put(self, text: str, vector: Sequence[float]) -> None:
+        """Append a vector for a text unless it is already stored"""
+        key = text_key(self.model, text)
+        data = np.asarray(vector, dtype=np.float32)
+
+        with self._lock, open(self.vectors_path, "ab") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                if self._conn.execute(
+                    "SELECT 1 FROM vectors WHERE key = ?", (key,)
+                ).fetchone():
+                    return
+
+                dimensions = self.dimensions
+                if dimensions is None:
+                    dimensions = self._dimensions = len(data)
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO meta (name, value) VALUES ('dimensions', ?)",
+                        (str(dimensions),),
+                    )
+                if len(data) != dimensions:
+                    raise ValueError(
+                        f"Expected {dimensions}-dimensional vector, got {len(data)}"
+                    )
+
+                # Drop a partial row left by a writer that crashed mid-append,
+                # so this row lands at the offset its index entry points to
+                size = os.fstat(handle.fileno()).st_size
+                row = size // (dimensions * 4)
+                if size != row * dimensions * 4:
+                    handle.truncate(row * dimensions * 4)
+                handle.write(data.tobytes())
+                handle.flush()
+
+                self._conn.execute(
+                    "INSERT INTO vectors (key, row) VALUES (?, ?)", (key, row)
+                )
+                self._conn.commit()
+                self._rows[key] = row
+                self._stats.writes += 1
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, int]:
+        """Get lookup counters and the number of stored vectors"""
+        stats = asdict(self._stats)
+        dimensions = self.dimensions
+        stats["vectors"] = (
+            os.path.getsize(self.vectors_path) // (dimensions * 4) if dimensions else 0
+        )
+        return stats
+
+    def close(self) -> None:
+        """Release the memory map and index connection"""
+        with self._lock:
+            self._mmap = None
+            self._conn.close()
+
+    def _vectors(self, min_rows: int) -> np.ndarray:
+        """Get the memory-mapped matrix, remapping if another writer grew the file"""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            dimensions = self.dimensions
+            rows = os.path.getsize(self.vectors_path) // (dimensions * 4)
+            self._mmap = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dimensions)
+            )
+        return self._mmap
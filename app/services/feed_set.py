@@ -0,0 +1,63 @@
+"""
+A feed set prepared once and shared by many casts
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .feeds import feed_text, normalize_feed
+from .spam_filter import SpamFilter
+
+class SharedFeedSet:
+    """Feeds normalized, spam-filtered and embedded once for a batch of casts
+
+    Feeds are reduced to the fields discovery uses, those without text and
+    exact repeats of an earlier feed's text are dropped, and spam is removed
+    when a spam_filter is given. Casts then only rank the remaining feeds.
+    """
+
+    def __init__(self, feeds: List[Dict[str, Any]], spam_dropped: int = 0):
+        self.feeds = feeds
+        self.spam_dropped = spam_dropped
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def prepare(
+        cls,
+        feeds: Sequence[Dict[str, Any]],
+        spam_filter: Optional[SpamFilter] = None
+    ) -> "SharedFeedSet":
+        """Normalize and filter a feed payload"""
+        seen = set()
+        normalized = []
+        for feed in feeds:
+            feed = normalize_feed(feed)
+            text = feed.get("text")
+            if text and text not in seen:
+                seen.add(text)
+                normalized.append(feed)
+        spam_dropped = 0
+        if spam_filter is not None:
+            normalized, spam_dropped = spam_filter.filter(normalized)
+        return cls(normalized, spam_dropped)
+
+    async def embed(self, embed: Callable[[str], Awaitable[List[float]]]) -> int:
+        """Embed every feed not embedded yet, concurrently, returning how many were"""
+        texts = [feed["text"] for feed in self.feeds if feed["text"] not in self._vectors]
+        vectors = await asyncio.gather(*[embed(text) for text in texts])
+        for text, vector in zip(texts, vectors):
+            self._vectors[text] = np.asarray(vector, dtype=np.float32)
+        return len(texts)
+
+    def vector_for(self, feed: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Get the embedding of a feed's text, if it was embedded"""
+        return self._vectors.get(feed_text(feed))
+
+    def stats(self) -> Dict[str, int]:
+        """Get feed set counts"""
+        return {
+            "feeds": len(self.feeds),
+            "embedded": len(self._vectors),
+            "spam_dropped": self.spam_dropped,
+        }
@@ -0,0 +1,260 @@
+"""
+Store of ingested feed items with precomputed embeddings
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .feeds import feed_text, normalize_feed
+
+logger = logging.getLogger("services.feed_store")
+
+@dataclass
+class FeedStoreStats:
+    """Counters for the feed store"""
+    ingested: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    embedded: int = 0
+    embedding_errors: int = 0
+    expired: int = 0
+    lookups: int = 0
+    lookup_misses: int = 0
+
+class FeedStore:
+    """Feed items keyed by cast hash, normalised and embedded once
+
+    Items are normalised on ingestion and embedded later by `embed_pending`,
+    which re-embeds only items whose text changed. Everything is held in
+    memory and, when a path is given, written through to SQLite so a restart
+    does not re-embed. Items not re-ingested within `ttl` seconds are
+    dropped on the next ingestion.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        embed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+        ttl: Optional[float] = None,
+        embed_concurrency: int = 64
+    ):
+        self.path = path
+        self.embed = embed
+        self.ttl = ttl
+        self.embed_concurrency = embed_concurrency
+        self._lock = threading.Lock()
+        # Created on first use, since before Python 3.10 a lock binds to the
+        # event loop current when it is made
+        self._embedding_lock: Optional[asyncio.Lock] = None
+        self._stats = FeedStoreStats()
+
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._updated: Dict[str, float] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS feeds "
+                "(cast_hash TEXT PRIMARY KEY, item TEXT NOT NULL, vector BLOB, updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, cast_hash: str) -> bool:
+        return cast_hash in self._items
+
+    def upsert(self, feeds: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+        """Ingest feed items, keeping embeddings of items whose text is unchanged
+
+        Returns how many items were accepted and rejected (those without a
+        cast hash or text), and how many are waiting to be embedded.
+        """
+        now = time.time()
+        counts = {"accepted": 0, "rejected": 0}
+        rows = []
+        with self._lock:
+            for feed in feeds:
+                item = normalize_feed(feed)
+                cast_hash = item.get("cast_hash")
+                if not cast_hash or not item.get("text"):
+                    counts["rejected"] += 1
+                    continue
+
+                existing = self._items.get(cast_hash)
+                if existing is not None and feed_text(existing) == item["text"]:
+                    self._stats.unchanged += 1
+                else:
+                    self._vectors.pop(cast_hash, None)
+                self._items[cast_hash] = item
+                self._updated[cast_hash] = now
+                counts["accepted"] += 1
+                vector = self._vectors.get(cast_hash)
+                rows.append((
+                    cast_hash,
+                    json.dumps(item),
+                    vector.tobytes() if vector is not None else None,
+                    now,
+                ))
+
+            self._stats.ingested += counts["accepted"]
+            self._stats.rejected += counts["rejected"]
+            expired = self._expire(now)
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO feeds (cast_hash, item, vector, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.executemany(
+                    "DELETE FROM feeds WHERE cast_hash = ?", [(key,) for key in expired]
+                )
+                self._conn.commit()
+            counts["pending"] = len(self._pending())
+        return counts
+
+    def delete(self, cast_hashes: Sequence[str]) -> int:
+        """Remove items, returning how many were present"""
+        with self._lock:
+            removed = [key for key in cast_hashes if self._drop(key)]
+            if self._conn is not None:
+                self._conn.executemany(
+                    "DELETE FROM feeds WHERE cast_hash = ?", [(key,) for key in removed]
+                )
+                self._conn.commit()
+        return len(removed)
+
+    def get_many(self, cast_hashes: Sequence[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Get stored items in the order asked for, and the ids that are unknown"""
+        found, missing = [], []
+        with self._lock:
+            for key in cast_hashes:
+                item = self._items.get(key)
+                if item is None:
+                    missing.append(key)
+                else:
+                    found.append(dict(item))
+            self._stats.lookups += len(cast_hashes)
+            self._stats.lookup_misses += len(missing)
+        return found, missing
+
+    def vector_for(self, feed: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Get the stored embedding for a feed, if its cast hash and text match"""
+        cast_hash = feed.get("cast_hash") or feed.get("hash")
+        item = self._items.get(cast_hash) if cast_hash else None
+        if item is None or feed_text(item) != feed_text(feed):
+            return None
+        return self._vectors.get(cast_hash)
+
+    def pending(self) -> List[str]:
+        """Cast hashes of items still waiting to be embedded"""
+        with self._lock:
+            return self._pending()
+
+    async def embed_pending(self) -> int:
+        """Embed every pending item, returning how many were embedded
+
+        Passes run one at a time, so an item is never embedded twice
+        concurrently. Items that fail to embed stay pending and are retried
+        on the next pass.
+        """
+        if self.embed is None:
+            return 0
+        if self._embedding_lock is None:
+            self._embedding_lock = asyncio.Lock()
+        async with self._embedding_lock:
+            embedded = 0
+            pending = self.pending()
+            for start in range(0, len(pending), self.embed_concurrency):
+                items = [
+                    (key, self._items.get(key))
+                    for key in pending[start:start + self.embed_concurrency]
+                ]
+                chunk = [(key, feed_text(item)) for key, item in items if item is not None]
+                vectors = await asyncio.gather(
+                    *[self.embed(text) for _, text in chunk], return_exceptions=True
+                )
+                stored = await asyncio.to_thread(self._store_vectors, chunk, vectors)
+                embedded += stored
+            return embedded
+
+    def stats(self) -> Dict[str, int]:
+        """Get store counters"""
+        with self._lock:
+            return {
+                **asdict(self._stats),
+                "items": len(self._items),
+                "pending": len(self._pending()),
+            }
+
+    def close(self) -> None:
+        """Close the backing database"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _store_vectors(self, chunk: List[Tuple[str, str]], vectors: List[Any]) -> int:
+        """Keep the embeddings of items whose text has not changed meanwhile"""
+        rows = []
+        with self._lock:
+            for (key, text), vector in zip(chunk, vectors):
+                if isinstance(vector, BaseException):
+                    self._stats.embedding_errors += 1
+                    logger.error(f"Failed to embed feed {key}: {vector}")
+                    continue
+                item = self._items.get(key)
+                if item is None or feed_text(item) != text:
+                    continue
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                self._vectors[key] = vector / norm if norm > 0 else vector
+                rows.append((self._vectors[key].tobytes(), key))
+
+            self._stats.embedded += len(rows)
+            if self._conn is not None and rows:
+                self._conn.executemany("UPDATE feeds SET vector = ? WHERE cast_hash = ?", rows)
+                self._conn.commit()
+        return len(rows)
+
+    def _pending(self) -> List[str]:
+        """Pending cast hashes; the caller holds the lock"""
+        return [key for key in self._items if key not in self._vectors]
+
+    def _drop(self, cast_hash: str) -> bool:
+        self._updated.pop(cast_hash, None)
+        self._vectors.pop(cast_hash, None)
+        return self._items.pop(cast_hash, None) is not None
+
+    def _expire(self, now: float) -> List[str]:
+        if self.ttl is None:
+            return []
+        expired = [key for key, updated in self._updated.items() if now - updated > self.ttl]
+        for key in expired:
+            self._drop(key)
+        self._stats.expired += len(expired)
+        return expired
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT cast_hash, item, vector, updated_at FROM feeds"
+        ).fetchall()
+        for cast_hash, item, vector, updated_at in rows:
+            self._items[cast_hash] = json.loads(item)
+            self._updated[cast_hash] = updated_at
+            if vector is not None:
+                self._vectors[cast_hash] = np.frombuffer(vector, dtype=np.float32)
+        logger.info(f"Loaded {len(rows)} feed items from {self.path}")
@@ -0,0 +1,58 @@
+"""
+Helpers for the feeds passed to reply generation
+"""
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+def feed_field(feed: Dict[str, Any], *names: str) -> str:
+    """Get the first non-empty field of a feed, flattening author objects"""
+    for name in names:
+        value = feed.get(name)
+        if isinstance(value, dict):
+            value = value.get("username") or value.get("name")
+        if value:
+            return str(value)
+    return ""
+
+def feed_text(feed: Dict[str, Any]) -> str:
+    """Get the text of a feed"""
+    return feed_field(feed, "text", "content")
+
+def normalize_feed(feed: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a feed item to the fields discovery and replies use"""
+    normalized = {
+        "text": feed_text(feed).strip(),
+        "author_username": feed_field(feed, "author_username", "username", "author"),
+        "cast_hash": feed_field(feed, "cast_hash", "hash"),
+        "channel_name": feed_field(feed, "channel_name", "channel"),
+        "url": feed_field(feed, "url"),
+        "timestamp": feed_field(feed, "timestamp"),
+    }
+    return {name: value for name, value in normalized.items() if value}
+
+def cosine_scores(query: Sequence[float], vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Cosine similarity of a query against each row of a matrix"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return np.zeros(0, dtype=np.float32)
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return (matrix @ query) / np.where(norms == 0, 1.0, norms)
+
+def top_k_similar(
+    query: Sequence[float],
+    vectors: Sequence[Sequence[float]],
+    top_k: int,
+    threshold: float = -1.0
+) -> List[Tuple[int, float]]:
+    """Get (index, score) of the top_k rows scoring at least threshold, best first"""
+    scores = cosine_scores(query, vectors)
+    if top_k <= 0 or scores.size == 0:
+        return []
+    if top_k < scores.size:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.size)
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(index), float(scores[index])) for index in ranked if scores[index] >= threshold]
@@ -0,0 +1,129 @@
+"""
+Local pre-classifier for casts that clearly need no reply
+"""
+import asyncio
+import json
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .text_features import LinearModel
+
+logger = logging.getLogger("services.intent_classifier")
+
+@dataclass
+class IntentPreClassifierStats:
+    """Counters for the intent pre-classifier"""
+    checked: int = 0
+    skipped: int = 0
+    forwarded: int = 0
+    logged: int = 0
+
+class IntentPreClassifier:
+    """Answers should_reply: false locally for casts a reply is unlikely for
+
+    A LinearModel saved with text_features, trained on should_reply, scores
+    each cast. Casts whose reply probability is below `threshold` are clear
+    negatives and never reach the intent model; all others are forwarded.
+    Without a model every cast is forwarded.
+
+    When `log_path` is set, the intent model's decisions are appended to it
+    as JSON lines of cast_text, should_reply and confidence, which is the
+    training data train_intent_classifier.py reads.
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        threshold: float = 0.05,
+        log_path: Optional[str] = None,
+        model: Optional[LinearModel] = None
+    ):
+        self.model_path = model_path
+        self.threshold = threshold
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._stats = IntentPreClassifierStats()
+        self._model = model
+        if model is None and model_path:
+            self.reload()
+
+    def reload(self) -> None:
+        """Re-read the model file, keeping the current model if it fails to load"""
+        try:
+            self._model = LinearModel.load(self.model_path)
+            logger.info(f"Loaded intent pre-classifier {self.model_path}")
+        except Exception as e:
+            logger.error(f"Failed to load intent pre-classifier {self.model_path}: {e}")
+
+    def probability(self, cast_text: str) -> Optional[float]:
+        """Probability that a cast warrants a reply, or None without a model"""
+        return self._model.probability(cast_text) if self._model is not None else None
+
+    def is_clear_negative(self, cast_text: str, probability: Optional[float] = None) -> bool:
+        """Whether the cast can be answered locally, without counting it
+
+        A probability the cast was already scored with is used instead of
+        scoring it again.
+        """
+        if probability is None:
+            probability = self.probability(cast_text)
+        return probability is not None and probability < self.threshold
+
+    def classify(self, cast_text: str, probability: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Get a negative intent_analysis for a clear negative, or None to forward the cast
+
+        Takes an already computed probability like is_clear_negative.
+        """
+        if probability is None:
+            probability = self.probability(cast_text)
+        skip = probability is not None and probability < self.threshold
+        with self._lock:
+            self._stats.checked += 1
+            if skip:
+                self._stats.skipped += 1
+            else:
+                self._stats.forwarded += 1
+        if not skip:
+            return None
+        return {"should_reply": False, "identified_needs": [], "confidence": round(1 - probability, 4)}
+
+    async def record(self, cast_text: str, intent: Dict[str, Any]) -> None:
+        """Log an intent model decision as training data, writing off the event loop"""
+        if not self.log_path:
+            return
+        line = json.dumps({
+            "cast_text": cast_text,
+            "should_reply": bool(intent["should_reply"]),
+            "confidence": intent.get("confidence"),
+        })
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        with self._lock:
+            try:
+                with open(self.log_path, "a") as f:
+                    f.write(line + "\n")
+                self._stats.logged += 1
+            except OSError as e:
+                logger.warning(f"Failed to log intent result to {self.log_path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pre-classifier counters"""
+        with self._lock:
+            return {
+                **asdict(self._stats),
+                "model": self._model is not None,
+                "threshold": self.threshold,
+            }
+
+def read_intent_log(path: str) -> Iterator[Tuple[str, bool]]:
+    """Read (cast_text, should_reply) pairs from an intent log, skipping bad lines"""
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                yield str(entry["cast_text"]), bool(entry["should_reply"])
+            except (ValueError, KeyError, TypeError):
+                continue
@@ -0,0 +1,336 @@
+"""
+SQLite-backed queue of jobs run by a pool of async workers
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("services.job_queue")
+
+STATUSES = ("queued", "running", "done", "failed")
+
+@dataclass
+class JobQueueStats:
+    """Counters for the job queue"""
+    submitted: int = 0
+    completed: int = 0
+    retried: int = 0
+    failed: int = 0
+    expired: int = 0
+    recovered: int = 0
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+class JobQueue:
+    """Jobs submitted now and run later by `concurrency` workers
+
+    Each job's payload is passed to `run` and its result stored under the
+    job id for clients to poll. A job that raises is retried after
+    `retry_delay` seconds, doubling each time, until it has run
+    `max_attempts` times, and is then marked failed. Finished jobs are
+    deleted `ttl` seconds after they finish.
+
+    Jobs live in SQLite, in memory when no path is given, and several
+    processes may share one file. A worker claims a job with a lease of
+    `lease` seconds that it renews while the job runs; a running job whose
+    lease lapsed, because its process died, is claimed again. Claims and
+    results are conditional on the row still being held, so a job is never
+    run by two live workers at once.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Dict[str, Any]], Awaitable[Any]],
+        path: Optional[str] = None,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+        ttl: Optional[float] = 86400.0,
+        poll_interval: float = 1.0,
+        lease: float = 60.0
+    ):
+        self.run = run
+        self.path = path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._stats = JobQueueStats()
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Lease ids of the jobs this queue's workers are running
+        self._held: Dict[str, str] = {}
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, available_at REAL NOT NULL, "
+            "lease_id TEXT, leased_until REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+        self._conn.commit()
+
+    def submit(self, payloads: Sequence[Dict[str, Any]]) -> List[str]:
+        """Queue a job per payload, returning their ids"""
+        now = time.time()
+        ids = [uuid.uuid4().hex for _ in payloads]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO jobs (id, payload, status, created_at, updated_at, available_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                [(job_id, json.dumps(payload), now, now, now) for job_id, payload in zip(ids, payloads)],
+            )
+            self._conn.commit()
+            self._stats.submitted += len(ids)
+        if self._loop is not None:
+            # Safe from worker threads as well as the event loop
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return ids
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status and, once finished, its result or error"""
+        found, _ = self.get_many([job_id])
+        return found[0] if found else None
+
+    def get_many(self, job_ids: Sequence[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Get jobs in the order asked for, and the ids that are unknown or expired"""
+        rows = {}
+        with self._lock:
+            # Chunked to stay under SQLite's limit on query parameters
+            for start in range(0, len(job_ids), 500):
+                chunk = list(job_ids[start:start + 500])
+                for row in self._conn.execute(
+                    "SELECT id, status, attempts, result, error, created_at, updated_at FROM jobs "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    rows[row[0]] = row
+        found, missing = [], []
+        for job_id in job_ids:
+            row = rows.get(job_id)
+            if row is None:
+                missing.append(job_id)
+                continue
+            found.append({
+                "id": row[0],
+                "status": row[1],
+                "attempts": row[2],
+                "result": json.loads(row[3]) if row[3] is not None else None,
+                "error": row[4],
+                "created_at": row[5],
+                "updated_at": row[6],
+            })
+        return found, missing
+
+    def start(self) -> None:
+        """Start the workers; call from the event loop"""
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Stop the workers, queueing the jobs they were running again"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'queued', lease_id = NULL, leased_until = NULL, available_at = ? "
+                "WHERE id = ? AND lease_id = ?",
+                [(time.time(), job_id, lease_id) for job_id, lease_id in self._held.items()],
+            )
+            self._conn.commit()
+            self._held.clear()
+
+    def expire(self) -> int:
+        """Delete jobs that finished more than ttl seconds ago, returning how many"""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.ttl,),
+            ).rowcount
+            self._conn.commit()
+            self._stats.expired += expired
+        return expired
+
+    def stats(self) -> Dict[str, int]:
+        """Get queue counters and the number of jobs in each status"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {
+            **asdict(self._stats),
+            **{status: counts.get(status, 0) for status in STATUSES},
+            "workers": len(self._workers),
+        }
+
+    def close(self) -> None:
+        """Close the backing database"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _work(self) -> None:
+        """Run queued jobs one at a time, waiting for new ones when none are due
+
+        A database error is logged and the worker carries on after
+        poll_interval; a job whose result could not be stored keeps its
+        lease until it lapses and is then claimed again.
+        """
+        while True:
+            try:
+                await self._work_once()
+            except Exception:
+                logger.exception("Job queue worker failed; retrying")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _work_once(self) -> None:
+        self._wakeup.clear()
+        job = await asyncio.to_thread(self._claim)
+        if job is None:
+            await asyncio.to_thread(self.expire)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        job_id, lease_id, payload, attempts = job
+        renewal = asyncio.create_task(self._renew(job_id, lease_id))
+        try:
+            result = await self.run(payload)
+        except Exception as e:
+            await asyncio.to_thread(self._fail, job_id, lease_id, attempts, str(e) or type(e).__name__)
+        else:
+            await asyncio.to_thread(self._finish, job_id, lease_id, result)
+        finally:
+            renewal.cancel()
+
+    async def _renew(self, job_id: str, lease_id: str) -> None:
+        """Extend a running job's lease until cancelled, logging failed renewals"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self._extend, job_id, lease_id)
+            except Exception:
+                logger.exception(f"Failed to renew the lease on job {job_id}")
+
+    def _extend(self, job_id: str, lease_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET leased_until = ? WHERE id = ? AND lease_id = ?",
+                (time.time() + self.lease, job_id, lease_id),
+            )
+            self._conn.commit()
+
+    def _claim(self) -> Optional[Tuple[str, str, Dict[str, Any], int]]:
+        """Lease the oldest due job, returning its id, lease id, payload and attempt number
+
+        Due jobs are queued ones past their retry delay and running ones
+        whose lease lapsed. The update only applies while the row is still
+        in the state it was read in, so when another process claims the same
+        job first this one moves on to the next. A lapsed job that already
+        used its max_attempts is marked failed instead of run again.
+        """
+        with self._lock:
+            while True:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts, status, lease_id FROM jobs "
+                    "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND leased_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, payload, attempts, status, previous_lease = row
+                if status == "running" and attempts >= self.max_attempts:
+                    abandoned = self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, lease_id = NULL, leased_until = NULL, "
+                        "updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ? AND lease_id IS ?",
+                        (f"Lease lapsed on attempt {attempts}", now, job_id, attempts, previous_lease),
+                    ).rowcount
+                    self._conn.commit()
+                    self._stats.failed += abandoned
+                    if abandoned:
+                        logger.error(f"Job {job_id} failed after its lease lapsed on attempt {attempts}")
+                    continue
+                lease_id = uuid.uuid4().hex
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, "
+                    "lease_id = ?, leased_until = ? "
+                    "WHERE id = ? AND status = ? AND attempts = ? AND lease_id IS ?",
+                    (now, lease_id, now + self.lease, job_id, status, attempts, previous_lease),
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    break
+            self._held[job_id] = lease_id
+            if status == "running":
+                self._stats.recovered += 1
+        if status == "running":
+            logger.info(f"Reclaimed job {job_id} after its lease lapsed")
+        return job_id, lease_id, json.loads(payload), attempts + 1
+
+    def _finish(self, job_id: str, lease_id: str, result: Any) -> None:
+        with self._lock:
+            self._held.pop(job_id, None)
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_id = NULL, "
+                "leased_until = NULL, updated_at = ? WHERE id = ? AND lease_id = ?",
+                (json.dumps(result, default=_json_default), time.time(), job_id, lease_id),
+            ).rowcount
+            self._conn.commit()
+            if updated:
+                self._stats.completed += 1
+            else:
+                logger.warning(f"Dropped the result of job {job_id}; its lease was taken over")
+
+    def _fail(self, job_id: str, lease_id: str, attempts: int, error: str) -> None:
+        """Schedule a retry with backoff, or mark the job failed after max_attempts"""
+        now = time.time()
+        with self._lock:
+            self._held.pop(job_id, None)
+            if attempts < self.max_attempts:
+                updated = self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, lease_id = NULL, leased_until = NULL, "
+                    "updated_at = ?, available_at = ? WHERE id = ? AND lease_id = ?",
+                    (error, now, now + self.retry_delay * 2 ** (attempts - 1), job_id, lease_id),
+                ).rowcount
+                self._stats.retried += updated
+            else:
+                updated = self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_id = NULL, leased_until = NULL, "
+                    "updated_at = ? WHERE id = ? AND lease_id = ?",
+                    (error, now, job_id, lease_id),
+                ).rowcount
+                self._stats.failed += updated
+                if updated:
+                    logger.error(f"Job {job_id} failed after {attempts} attempts: {error}")
+            self._conn.commit()
@@ -0,0 +1,80 @@
+"""
+In-process metrics for pipeline stages
+"""
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Tuple
+
+class MetricsRegistry:
+    """Counters, latency samples and derived ratios
+
+    Latency summaries are computed over the most recent `window` samples,
+    while counts are kept for the lifetime of the process.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._sample_counts: Dict[str, int] = defaultdict(int)
+        self._ratios: Dict[str, Tuple[str, str]] = {}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Add to a counter"""
+        self._counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample, e.g. a latency in seconds"""
+        self._samples[name].append(value)
+        self._sample_counts[name] += 1
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Record how long the wrapped block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def define_ratio(self, name: str, numerator: str, denominator: str) -> None:
+        """Report numerator / denominator counters as a named ratio"""
+        self._ratios[name] = (numerator, denominator)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get every counter, sample summary and ratio"""
+        return {
+            "counters": dict(self._counters),
+            "latencies": {
+                name: self._summarize(name, samples)
+                for name, samples in self._samples.items()
+            },
+            "ratios": {
+                name: (
+                    self._counters[numerator] / self._counters[denominator]
+                    if self._counters[denominator] else 0.0
+                )
+                for name, (numerator, denominator) in self._ratios.items()
+            },
+        }
+
+    def reset(self) -> None:
+        """Clear all recorded values (ratio definitions are kept)"""
+        self._counters.clear()
+        self._samples.clear()
+        self._sample_counts.clear()
+
+    def _summarize(self, name: str, samples: Deque[float]) -> Dict[str, float]:
+        ordered = sorted(samples)
+        if not ordered:
+            return {"count": self._sample_counts[name]}
+        return {
+            "count": self._sample_counts[name],
+            "mean": sum(ordered) / len(ordered),
+            "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max": ordered[-1],
+        }
+
+metrics = MetricsRegistry()
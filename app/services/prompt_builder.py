@@ -0,0 +1,171 @@
+"""
+Compact, token-budgeted prompt construction
+"""
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from ..prompts import PromptTemplate
+from .metrics import metrics
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("services.prompt_builder")
+
+# Tokens the chat format adds per message, and once to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+
+# Seconds before an encoding that failed to load is tried again
+ENCODING_RETRY_INTERVAL = 300.0
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+def compact_json(data: Any) -> str:
+    """Serialize without the whitespace that indent adds"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+_encodings: Dict[str, Any] = {}
+_failed_at: Dict[str, float] = {}
+_loading: Set[str] = set()
+_encodings_lock = threading.Lock()
+
+def load_encodings(models: Iterable[str]) -> None:
+    """Load the tiktoken encodings of models
+
+    tiktoken downloads an encoding the first time it is used, so call this
+    off the event loop, as the server does at startup. A failed load is
+    retried ENCODING_RETRY_INTERVAL seconds later.
+    """
+    if tiktoken is None:
+        return
+    for model in models:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"No tokenizer available for {model}, estimating token counts: {e}")
+            with _encodings_lock:
+                _failed_at[model] = time.monotonic()
+                _loading.discard(model)
+            continue
+        with _encodings_lock:
+            _encodings[model] = encoding
+            _failed_at.pop(model, None)
+            _loading.discard(model)
+
+def _encoding(model: str):
+    """Get a loaded encoding, loading it in a background thread if it is not
+
+    Never loads on the caller's thread, so counting tokens on the event loop
+    does not wait on a download; counts are estimated until it is loaded.
+    """
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        encoding = _encodings.get(model)
+        if encoding is not None or model in _loading:
+            return encoding
+        if time.monotonic() - _failed_at.get(model, float("-inf")) < ENCODING_RETRY_INTERVAL:
+            return None
+        _loading.add(model)
+    threading.Thread(target=load_encodings, args=([model],), daemon=True).start()
+    return None
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens of text for a model
+
+    Uses tiktoken when it is installed and has the model's encoding, and
+    otherwise estimates a token per word or symbol, plus one for every
+    further 8 characters of a long word.
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum(1 + len(word) // 8 for word in _WORDS.findall(text))
+
+def count_message_tokens(messages: Sequence[Dict[str, str]], model: str) -> int:
+    """Count the prompt tokens of a chat call"""
+    return REPLY_PRIMING_TOKENS + sum(
+        MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "", model)
+        for message in messages
+    )
+
+def build_messages(
+    prompt: Union[PromptTemplate, str],
+    payload: Dict[str, Any],
+    model: str,
+    budget: Optional[int] = None,
+    trim: Sequence[str] = (),
+    node: Optional[str] = None
+) -> Tuple[List[Dict[str, str]], int]:
+    """Build a prompt's messages with a compact JSON payload within a token budget
+
+    `prompt` is a registered PromptTemplate whose user message is the
+    `payload` variable, or a bare system message.
+
+    `trim` names list fields of the payload, each ordered most important
+    first. While the prompt is over `budget`, items are dropped from the end
+    of the first of those lists, then the next, keeping as many as fit.
+    If dropping every trimmable item is not enough, the prompt is sent over
+    budget and counted under prompt.over_budget.
+
+    Returns the messages and their token count. Counts are also added up
+    per node, and reported as prompt_tokens_per_call.<node> ratios.
+    """
+    payload = dict(payload)
+    if isinstance(prompt, str):
+        prompt = PromptTemplate(prompt, "{payload}")
+
+    def messages_for(data: Dict[str, Any]) -> List[Dict[str, str]]:
+        return prompt.render(payload=compact_json(data))
+
+    messages = messages_for(payload)
+    tokens = count_message_tokens(messages, model)
+    dropped = 0
+    for field in trim if budget else ():
+        if tokens <= budget:
+            break
+        items = payload.get(field)
+        if not isinstance(items, list) or not items:
+            continue
+
+        # Largest prefix of the list that fits, by binary search
+        low, high = 0, len(items) - 1
+        fitted = None
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = messages_for({**payload, field: items[:middle]})
+            candidate_tokens = count_message_tokens(candidate, model)
+            if candidate_tokens <= budget:
+                fitted = (middle, candidate, candidate_tokens)
+                low = middle + 1
+            else:
+                high = middle - 1
+        keep = fitted[0] if fitted else 0
+        payload[field] = items[:keep]
+        dropped += len(items) - keep
+        if fitted:
+            messages, tokens = fitted[1], fitted[2]
+        else:
+            messages = messages_for(payload)
+            tokens = count_message_tokens(messages, model)
+
+    name = node or "unnamed"
+    metrics.increment(f"prompt_tokens.{name}", tokens)
+    metrics.increment(f"prompt_calls.{name}")
+    metrics.define_ratio(f"prompt_tokens_per_call.{name}", f"prompt_tokens.{name}", f"prompt_calls.{name}")
+    if dropped:
+        metrics.increment(f"prompt_trimmed_items.{name}", dropped)
+    if budget and tokens > budget:
+        metrics.increment("prompt.over_budget")
+        logger.warning(f"{name} prompt is {tokens} tokens, over its budget of {budget}")
+    return messages, tokens
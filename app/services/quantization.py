@@ -0,0 +1,161 @@
+"""
+Compact in-memory vector representations
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+_SCORE_CHUNK = 2048
+
+# Number of set bits in every 16-bit value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(1 << 16)], dtype=np.uint8)
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Scale each row to [-127, 127], returning int8 codes and per-row scales"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Approximate float32 rows from int8 codes"""
+    return codes.astype(np.float32) * scales[:, None]
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Pack the sign of each component into bits"""
+    return np.packbits(np.atleast_2d(vectors) > 0, axis=1)
+
+def hamming_distances(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Hamming distance between packed binary rows and one packed query"""
+    if codes.shape[1] % 2 == 0:
+        # Look up two bytes at a time, halving the number of lookups
+        codes = np.ascontiguousarray(codes).view(np.uint16)
+        query = np.ascontiguousarray(query).view(np.uint16)
+    return _POPCOUNT[np.bitwise_xor(codes, query)].sum(axis=1, dtype=np.int32)
+
+class VectorBlock:
+    """Growable matrix of vectors kept as float32, int8 or binary codes
+
+    "int8" stores one byte per component plus a scale per row, a quarter of
+    float32. "binary" adds sign bits, used to shortlist
+    `rescore_factor` times as many rows as asked for by Hamming distance
+    before rescoring the shortlist with the int8 codes. It keeps the codes
+    for that rescoring, so it takes an eighth more memory than "int8"
+    (about 3.5 times less than float32); it buys faster searches, not a
+    smaller index.
+    """
+
+    def __init__(self, dimensions: int, mode: str = "none", capacity: int = 16, rescore_factor: int = 10):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode {mode}, expected one of {QUANTIZATION_MODES}")
+        self.dimensions = dimensions
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+        self.size = 0
+        self._floats: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._bits: Optional[np.ndarray] = None
+        self._allocate(capacity)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the stored rows"""
+        per_row = sum(
+            array.itemsize * (array.shape[1] if array.ndim > 1 else 1)
+            for array in (self._floats, self._codes, self._scales, self._bits)
+            if array is not None
+        )
+        return per_row * self.size
+
+    def extend(self, vectors: np.ndarray) -> None:
+        """Append rows"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        needed = self.size + len(vectors)
+        if needed > self._capacity:
+            self._allocate(max(needed, self._capacity * 2))
+        self._write(slice(self.size, needed), vectors)
+        self.size = needed
+
+    def append(self, vector: np.ndarray) -> int:
+        """Append one row, returning its position"""
+        self.extend(vector)
+        return self.size - 1
+
+    def remove(self, position: int) -> None:
+        """Swap-remove a row, moving the last row into its position"""
+        last = self.size - 1
+        if position != last:
+            for array in self._arrays():
+                array[position] = array[last]
+        self.size = last
+
+    def vectors(self, rows=None) -> np.ndarray:
+        """Get (approximate) float32 rows"""
+        rows = slice(0, self.size) if rows is None else rows
+        if self._floats is not None:
+            return self._floats[rows].copy()
+        return dequantize_int8(self._codes[rows], self._scales[rows])
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Dot product of every row with a query"""
+        if self._floats is not None:
+            return self._floats[:self.size] @ query
+        # Widen the codes a chunk at a time, which stays in cache
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, _SCORE_CHUNK):
+            end = min(start + _SCORE_CHUNK, self.size)
+            scores[start:end] = self._codes[start:end].astype(np.float32) @ query
+        return scores * self._scales[:self.size]
+
+    def search(self, query: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the positions and dot products of the top `limit` rows, unordered"""
+        limit = min(limit, self.size)
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self._bits is not None and limit * self.rescore_factor < self.size:
+            distances = hamming_distances(self._bits[:self.size], binarize(query)[0])
+            shortlist = np.argpartition(distances, limit * self.rescore_factor - 1)[
+                :limit * self.rescore_factor
+            ]
+            scores = (self._codes[shortlist] @ query) * self._scales[shortlist]
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            return shortlist[best], scores[best]
+
+        scores = self.scores(query)
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        return best, scores[best]
+
+    def _arrays(self):
+        return [array for array in (self._floats, self._codes, self._scales, self._bits) if array is not None]
+
+    def _allocate(self, capacity: int) -> None:
+        def grow(array: Optional[np.ndarray], shape, dtype) -> np.ndarray:
+            grown = np.empty(shape, dtype=dtype)
+            if array is not None:
+                grown[:self.size] = array[:self.size]
+            return grown
+
+        if self.mode == "none":
+            self._floats = grow(self._floats, (capacity, self.dimensions), np.float32)
+        else:
+            self._codes = grow(self._codes, (capacity, self.dimensions), np.int8)
+            self._scales = grow(self._scales, (capacity,), np.float32)
+        if self.mode == "binary":
+            self._bits = grow(self._bits, (capacity, (self.dimensions + 7) // 8), np.uint8)
+        self._capacity = capacity
+
+    def _write(self, rows: slice, vectors: np.ndarray) -> None:
+        if self._floats is not None:
+            self._floats[rows] = vectors
+        else:
+            self._codes[rows], self._scales[rows] = quantize_int8(vectors)
+        if self._bits is not None:
+            self._bits[rows] = binarize(vectors)
@@ -0,0 +1,129 @@
+"""
+Local lexical and semantic ranking of feed text
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .feeds import cosine_scores
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could do does
+for from get got had has have how i if in into is it its just like me my no not
+of on or our so some than that the their them then there these they this to too
+up us was we were what when where which who why will with would you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [
+        token for token in re.findall(r"[a-z0-9][a-z0-9_'-]*", text.lower())
+        if token not in STOPWORDS
+    ]
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents, using an inverted index
+
+    Postings are kept as NumPy arrays per term, so scoring a query touches
+    only the documents that contain one of its terms.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        postings: Dict[str, List[tuple]] = defaultdict(list)
+        for index, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths[index] = sum(counts.values())
+            for term, count in counts.items():
+                postings[term].append((index, count))
+
+        average = float(lengths.mean()) if self.size and lengths.sum() else 1.0
+        self._norms = k1 * (1 - b + b * lengths / average)
+        self._postings = {
+            term: (
+                np.array([index for index, _ in entries], dtype=np.int64),
+                np.array([count for _, count in entries], dtype=np.float32),
+            )
+            for term, entries in postings.items()
+        }
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency, also defined for unseen terms"""
+        postings = self._postings.get(term)
+        frequency = len(postings[0]) if postings is not None else 0
+        return math.log(1 + (self.size - frequency + 0.5) / (frequency + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Raw BM25 score of every document for a query"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            documents, counts = postings
+            scores[documents] += self.idf(term) * counts * (self.k1 + 1) / (
+                counts + self._norms[documents]
+            )
+        return scores
+
+    def normalized_scores(self, query: str) -> np.ndarray:
+        """BM25 scores in [0, 1]
+
+        Scores are divided by that of an average-length document containing
+        each query term once, so they measure how much of the query's
+        weight a document covers.
+        """
+        ceiling = sum(self.idf(term) for term in set(tokenize(query)))
+        if not ceiling:
+            return np.zeros(self.size, dtype=np.float32)
+        return np.minimum(self.scores(query) / ceiling, 1.0)
+
+@dataclass
+class RankedDocument:
+    """A document's position in a hybrid ranking"""
+    index: int
+    score: float
+    lexical: float
+    semantic: Optional[float] = None
+
+def hybrid_rank(
+    query: str,
+    documents: Sequence[str],
+    query_vector: Optional[Sequence[float]] = None,
+    document_vectors: Optional[Sequence[Sequence[float]]] = None,
+    bm25_weight: float = 0.5,
+    k1: float = 1.2,
+    b: float = 0.75
+) -> List[RankedDocument]:
+    """Rank documents by a weighted sum of normalised BM25 and cosine similarity
+
+    Without vectors the ranking is lexical only. Cosine similarities are
+    clipped at zero before weighting.
+    """
+    if not documents:
+        return []
+    lexical = BM25Index(documents, k1=k1, b=b).normalized_scores(query)
+    if query_vector is None or document_vectors is None:
+        semantic = None
+        combined = lexical
+    else:
+        semantic = cosine_scores(query_vector, document_vectors)
+        combined = bm25_weight * lexical + (1 - bm25_weight) * np.clip(semantic, 0.0, 1.0)
+
+    order = np.argsort(-combined, kind="stable")
+    return [
+        RankedDocument(
+            index=int(index),
+            score=float(combined[index]),
+            lexical=float(lexical[index]),
+            semantic=float(semantic[index]) if semantic is not None else None,
+        )
+        for index in order
+    ]
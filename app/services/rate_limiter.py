@@ -0,0 +1,204 @@
+"""
+Rate limiting and priority scheduling for LLM calls
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("services.rate_limiter")
+
+# Lane of the request currently being served; endpoints set this so every
+# LLM call made on their behalf is queued in the right priority lane.
+priority_lane: ContextVar[str] = ContextVar("priority_lane", default="default")
+
+def set_priority_lane(lane: str) -> None:
+    """Queue LLM calls made by the current request in the given lane"""
+    priority_lane.set(lane)
+
+class TokenBucket:
+    """Bucket holding up to one minute's budget, refilled continuously"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)"""
+        self._refill()
+        needed = min(amount, self.capacity)
+        return max(0.0, (needed - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Take from the bucket; the balance may go negative to record debt"""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """Return unused budget (or charge more when amount is negative)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    tokens: int = field(compare=False)
+    lane: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+@dataclass
+class _ModelQueue:
+    requests: TokenBucket
+    tokens: TokenBucket
+    waiters: List[_Waiter] = field(default_factory=list)
+    depth: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    dispatcher: Optional[asyncio.Task] = None
+    paused_until: float = 0.0
+    granted: int = 0
+    queued: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    rate_limited: int = 0
+
+    def wait_time(self, tokens: int) -> float:
+        pause = max(0.0, self.paused_until - time.monotonic())
+        return max(pause, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def take(self, tokens: int) -> None:
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self.granted += 1
+
+class LLMScheduler:
+    """Holds LLM calls until their model has request and token budget left
+
+    Each model gets a requests-per-minute and a tokens-per-minute bucket.
+    Calls that cannot run immediately wait in a priority queue ordered by
+    lane (lower number first) and then arrival, so latency-sensitive lanes
+    are served before background work. Models without configured limits
+    are never queued.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Dict[str, int]],
+        lanes: Dict[str, int],
+        enabled: bool = True
+    ):
+        self.limits = limits
+        self.lanes = lanes
+        self.enabled = enabled
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._sequence = itertools.count()
+
+    async def acquire(self, model: str, tokens: int, lane: Optional[str] = None) -> None:
+        """Wait until the model has budget for one request of `tokens` tokens"""
+        queue = self._queue(model)
+        if not self.enabled or queue is None:
+            return
+
+        lane = lane or priority_lane.get()
+        if not queue.waiters and queue.wait_time(tokens) == 0:
+            queue.take(tokens)
+            return
+
+        waiter = _Waiter(
+            priority=self.lanes.get(lane, self.lanes.get("default", 0)),
+            sequence=next(self._sequence),
+            tokens=tokens,
+            lane=lane,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=time.monotonic(),
+        )
+        heapq.heappush(queue.waiters, waiter)
+        queue.depth[lane] += 1
+        queue.queued += 1
+
+        if queue.dispatcher is None or queue.dispatcher.done():
+            queue.dispatcher = asyncio.ensure_future(self._dispatch(queue))
+
+        await waiter.future
+
+    def settle(self, model: str, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real usage of a call is known"""
+        queue = self._queue(model)
+        if queue is not None:
+            queue.tokens.refund(estimated - actual)
+
+    def penalize(self, model: str, seconds: float) -> None:
+        """Stop dispatching calls to a model that has just been rate limited"""
+        queue = self._queue(model)
+        if queue is not None:
+            queue.rate_limited += 1
+            queue.paused_until = max(queue.paused_until, time.monotonic() + seconds)
+            logger.warning(f"Rate limited on {model}, pausing for {seconds}s")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth per lane and wait statistics per model"""
+        return {
+            model: {
+                "queue_depth": sum(queue.depth.values()),
+                "queue_depth_by_lane": {lane: depth for lane, depth in queue.depth.items() if depth},
+                "granted": queue.granted,
+                "queued": queue.queued,
+                "avg_queue_wait": queue.total_wait / queue.queued if queue.queued else 0.0,
+                "max_queue_wait": queue.max_wait,
+                "rate_limited": queue.rate_limited,
+                "requests_available": int(queue.requests.tokens),
+                "tokens_available": int(queue.tokens.tokens),
+            }
+            for model, queue in self._queues.items()
+        }
+
+    def _queue(self, model: str) -> Optional[_ModelQueue]:
+        if model not in self._queues:
+            limits = self.limits.get(model)
+            if not limits:
+                return None
+            self._queues[model] = _ModelQueue(
+                requests=TokenBucket(limits["rpm"]),
+                tokens=TokenBucket(limits["tpm"]),
+            )
+        return self._queues[model]
+
+    async def _dispatch(self, queue: _ModelQueue) -> None:
+        """Release queued calls in priority order as budget refills"""
+        while queue.waiters:
+            waiter = queue.waiters[0]
+            if waiter.future.done():
+                # The caller gave up while queued
+                heapq.heappop(queue.waiters)
+                queue.depth[waiter.lane] -= 1
+                continue
+
+            delay = queue.wait_time(waiter.tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            heapq.heappop(queue.waiters)
+            queue.depth[waiter.lane] -= 1
+            queue.take(waiter.tokens)
+            waited = time.monotonic() - waiter.enqueued_at
+            queue.total_wait += waited
+            queue.max_wait = max(queue.max_wait, waited)
+            waiter.future.set_result(None)
+
+def estimate_tokens(messages: List[Dict[str, str]], completion_tokens: int = 0) -> int:
+    """Roughly estimate the tokens a chat call will use (about 4 characters per token)"""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + 4 * len(messages) + completion_tokens
@@ -0,0 +1,26 @@
+"""
+Deterministic reply rendering from discovered content
+"""
+from typing import Any, Dict, Optional
+
+NO_CONTENT_REPLY = "No relevant content found in the available feeds."
+REPLY_LINK_BASE = "https://farcaster.xyz"
+
+def render_reply(selected_content: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Build the reply_text and link REPLY_GENERATION_PROMPT asks the model for
+
+    The content quoted is the first key point of the selected content, or
+    its title when there are none.
+    """
+    selected = selected_content or {}
+    author = selected.get("author_username") or ""
+    content = (selected.get("key_points") or [selected.get("title") or ""])[0]
+    if not author or not content:
+        return {"reply_text": NO_CONTENT_REPLY, "link": ""}
+
+    reply_text = f"You should connect with {author}, who said: '{content}'"
+    if selected.get("channel_name"):
+        reply_text += f" Join the conversation in the /{selected['channel_name']} channel."
+    cast_hash = selected.get("cast_hash") or ""
+    link = f"{REPLY_LINK_BASE}/{author}/{cast_hash}" if cast_hash else ""
+    return {"reply_text": reply_text, "link": link}
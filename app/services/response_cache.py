@@ -0,0 +1,246 @@
+"""
+Tiered cache for structured LLM responses
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("services.response_cache")
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    response_format: Dict[str, Any],
+    temperature: float
+) -> str:
+    """Build a content-addressed key for an LLM request"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "response_format": response_format,
+            "temperature": temperature,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for the response cache"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    memory_evictions: int = 0
+    bypassed: int = 0
+
+class MemoryTier:
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get an entry, dropping it if it has expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        created_at, value = entry
+        if time.time() - created_at > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], created_at: Optional[float] = None) -> int:
+        """Store an entry and return how many entries were evicted"""
+        self._entries[key] = (created_at or time.time(), value)
+        self._entries.move_to_end(key)
+
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class DiskTier:
+    """SQLite-backed cache shared by every worker pointing at the same file"""
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Get an entry and its creation time, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return created_at, json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store an entry, evicting expired and least recently used rows"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+class ResponseCache:
+    """Two-tier response cache: in-process LRU in front of an optional SQLite file
+
+    Nodes opt in or out by name: a node is cached when it is listed in
+    `nodes` (or `nodes` contains "*") and it is not listed in `exclude_nodes`.
+    """
+
+    def __init__(
+        self,
+        memory: MemoryTier,
+        disk: Optional[DiskTier] = None,
+        enabled: bool = True,
+        nodes: Iterable[str] = ("*",),
+        exclude_nodes: Iterable[str] = ()
+    ):
+        self.memory = memory
+        self.disk = disk
+        self.enabled = enabled
+        self.nodes = set(nodes)
+        self.exclude_nodes = set(exclude_nodes)
+        self._stats = CacheStats()
+
+    def enabled_for(self, node: Optional[str]) -> bool:
+        """Check whether responses for a node should be cached"""
+        if not self.enabled or node in self.exclude_nodes:
+            return False
+        return "*" in self.nodes or node in self.nodes
+
+    def record_bypass(self) -> None:
+        """Count a request that skipped the cache"""
+        self._stats.bypassed += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look a key up in memory first, then on disk"""
+        value = self.memory.get(key)
+        if value is not None:
+            self._stats.memory_hits += 1
+            return value
+
+        if self.disk is not None:
+            try:
+                entry = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache read failed: {e}")
+                entry = None
+
+            if entry is not None:
+                created_at, value = entry
+                self._stats.disk_hits += 1
+                self._stats.memory_evictions += self.memory.set(key, value, created_at)
+                return value
+
+        self._stats.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a value in both tiers"""
+        self._stats.writes += 1
+        self._stats.memory_evictions += self.memory.set(key, value)
+
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache write failed: {e}")
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers"""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes"""
+        stats = asdict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        stats["memory_entries"] = len(self.memory)
+        stats["disk_enabled"] = self.disk is not None
+        return stats
@@ -0,0 +1,171 @@
+"""
+Local airdrop and giveaway spam filter for feeds
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .feeds import feed_text
+from .text_features import LinearModel
+
+logger = logging.getLogger("services.spam_filter")
+
+CLASSIFIER_RULE = "classifier"
+
+# A ticker, coin or wallet word or an address, which the rules below need
+# nearby so ordinary "send me..." or "claim the rewards" casts are kept
+_CRYPTO = r"(\$[a-z]+\b|\b(eth|btc|sol|usdc|usdt|crypto|coins?|tokens?|wallets?)\b|\b0x[0-9a-f]{6,})"
+_GIVEAWAY_CONTEXT = rf"({_CRYPTO}|\b(air\s*drops?|nfts?|mint|whitelist)\b)"
+
+DEFAULT_RULES = {
+    "airdrop": r"\bair\s*drop(s|ped|ping)?\b",
+    "giveaway": (
+        rf"\bgive\s*aways?\b.{{0,60}}{_GIVEAWAY_CONTEXT}"
+        rf"|{_GIVEAWAY_CONTEXT}.{{0,60}}\bgive\s*aways?\b"
+    ),
+    "claim_rewards": (
+        r"\bclaim\b.{0,40}(\b(tokens?|nfts?|allocation|airdrop)\b"
+        rf"|\brewards?\b.{{0,40}}{_CRYPTO}|{_CRYPTO}.{{0,40}}\brewards?\b)"
+    ),
+    "free_tokens": r"\bfree\s+(mints?|nfts?|tokens?|crypto|\$[a-z]+)\b",
+    "wallet_bait": r"\b(connect|verify|sync)\s+(your\s+)?wallets?\b",
+    "send_to_receive": rf"\bsend\b.{{0,40}}{_CRYPTO}.{{0,40}}\b(receive|get back|double)\b",
+}
+
+@dataclass
+class SpamFilterStats:
+    """Counters for the spam filter"""
+    checked: int = 0
+    dropped: int = 0
+    reloads: int = 0
+    reload_errors: int = 0
+
+class _RuleSet:
+    """Named rules compiled into a single case-insensitive regex"""
+
+    def __init__(self, rules: Dict[str, str]):
+        self.names = list(rules)
+        self._pattern = re.compile(
+            "|".join(f"(?P<r{i}>{pattern})" for i, pattern in enumerate(rules.values())),
+            re.IGNORECASE,
+        ) if rules else None
+
+    def match(self, text: str) -> Optional[str]:
+        if self._pattern is None:
+            return None
+        found = self._pattern.search(text)
+        return self.names[int(found.lastgroup[1:])] if found else None
+
+class SpamFilter:
+    """Drops spam feeds with regex rules and an optional linear classifier
+
+    Rules map a name to a regex and come from DEFAULT_RULES, or from a JSON
+    object of the same shape at `rules_path`. When `model_path` points to a
+    LinearModel saved with text_features, texts no rule matches are also
+    dropped if their spam probability reaches `threshold`.
+
+    Both files are re-read when they change, checked at most every
+    `reload_interval` seconds, so rules can be edited without a restart. A
+    file that fails to load leaves the previous rules or model in place.
+    """
+
+    def __init__(
+        self,
+        rules_path: Optional[str] = None,
+        model_path: Optional[str] = None,
+        threshold: float = 0.9,
+        reload_interval: float = 5.0,
+        rules: Optional[Dict[str, str]] = None
+    ):
+        self.rules_path = rules_path
+        self.model_path = model_path
+        self.threshold = threshold
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._stats = SpamFilterStats()
+        self._hits: Counter = Counter()
+
+        self._rules = _RuleSet(DEFAULT_RULES if rules is None else rules)
+        self._model: Optional[LinearModel] = None
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._next_check = 0.0
+        self.reload()
+
+    def match(self, text: str) -> Optional[str]:
+        """Get the name of the rule a text is spam by, or None"""
+        self._maybe_reload()
+        rule = self._rules.match(text)
+        if rule is None and self._model is not None and self._model.probability(text) >= self.threshold:
+            rule = CLASSIFIER_RULE
+        with self._lock:
+            self._stats.checked += 1
+            if rule is not None:
+                self._stats.dropped += 1
+                self._hits[rule] += 1
+        return rule
+
+    def filter(
+        self,
+        feeds: List[Dict[str, Any]],
+        key: Callable[[Dict[str, Any]], str] = feed_text
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Drop spam feeds, returning the rest in order and how many were dropped"""
+        kept = [feed for feed in feeds if self.match(key(feed)) is None]
+        return kept, len(feeds) - len(kept)
+
+    def reload(self, force: bool = False) -> None:
+        """Re-read the rules and model files if they changed"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            if self.rules_path and self._changed(self.rules_path, force):
+                self._load(self.rules_path, self._load_rules)
+            if self.model_path and self._changed(self.model_path, force):
+                self._load(self.model_path, self._load_model)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get filter counters and hits per rule"""
+        with self._lock:
+            return {
+                **asdict(self._stats),
+                "rules": len(self._rules.names),
+                "classifier": self._model is not None,
+                "hits": dict(self._hits),
+            }
+
+    def _maybe_reload(self) -> None:
+        if time.monotonic() >= self._next_check:
+            self.reload()
+
+    def _changed(self, path: str, force: bool) -> bool:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        changed = force or mtime != self._mtimes.get(path, -1)
+        self._mtimes[path] = mtime
+        return changed
+
+    def _load(self, path: str, loader: Callable[[str], None]) -> None:
+        try:
+            loader(path)
+            self._stats.reloads += 1
+            logger.info(f"Loaded spam filter {path}")
+        except Exception as e:
+            self._stats.reload_errors += 1
+            logger.error(f"Failed to load spam filter {path}, keeping the previous version: {e}")
+
+    def _load_rules(self, path: str) -> None:
+        with open(path) as f:
+            rules = json.load(f)
+        if not isinstance(rules, dict) or not all(isinstance(p, str) for p in rules.values()):
+            raise ValueError("rules must be a JSON object of name to pattern")
+        self._rules = _RuleSet(rules)
+
+    def _load_model(self, path: str) -> None:
+        self._model = LinearModel.load(path)
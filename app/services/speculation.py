@@ -0,0 +1,51 @@
+"""
+Speculative execution of a step alongside the step that decides if it is needed
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from .metrics import metrics
+
+logger = logging.getLogger("services.speculation")
+
+def _discard(task: asyncio.Task) -> None:
+    """Retrieve a discarded task's error, so it is not reported as unhandled"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Discarded speculative task failed: {task.exception()}")
+
+async def speculate(
+    name: str,
+    decision: Awaitable[Any],
+    speculative: Callable[[], Awaitable[Any]],
+    accept: Callable[[Any], bool]
+) -> Tuple[Any, Optional[Any]]:
+    """Run speculative() while awaiting decision, keeping it only if accepted
+
+    Returns the decision's result and the speculative result, which is None
+    when accept rejects the decision. A rejected speculative task is
+    cancelled if it is still running and its result is thrown away.
+
+    Counted under speculation.<name>: launched, hits, wasted (rejected) and
+    cancelled (rejected before finishing), with a hit_rate ratio.
+    """
+    metrics.increment(f"speculation.{name}.launched")
+    metrics.define_ratio(f"speculation.{name}.hit_rate", f"speculation.{name}.hits", f"speculation.{name}.launched")
+    task = asyncio.ensure_future(speculative())
+    try:
+        result = await decision
+    except BaseException:
+        task.cancel()
+        task.add_done_callback(_discard)
+        raise
+
+    if accept(result):
+        metrics.increment(f"speculation.{name}.hits")
+        return result, await task
+
+    metrics.increment(f"speculation.{name}.wasted")
+    if not task.done():
+        metrics.increment(f"speculation.{name}.cancelled")
+        task.cancel()
+    task.add_done_callback(_discard)
+    return result, None
@@ -0,0 +1,90 @@
+"""
+Hashed n-gram features and linear models over them
+"""
+import re
+import zlib
+from typing import List, Sequence
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 1 << 18
+
+def ngrams(text: str, n: int = 2) -> List[str]:
+    """Lowercase word n-grams of text, for every size up to n
+
+    Question marks count as words, since they mark casts asking for something.
+    """
+    words = re.findall(r"[a-z0-9$]+|\?", text.lower())
+    return [
+        " ".join(words[i:i + size])
+        for size in range(1, n + 1)
+        for i in range(len(words) - size + 1)
+    ]
+
+def hashed_ngrams(text: str, dimensions: int = DEFAULT_DIMENSIONS, n: int = 2) -> np.ndarray:
+    """Sorted, distinct feature indices of a text's hashed n-grams"""
+    return np.unique(np.fromiter(
+        (zlib.crc32(gram.encode()) % dimensions for gram in ngrams(text, n)), dtype=np.int64
+    ))
+
+class LinearModel:
+    """Logistic regression over hashed binary n-gram features"""
+
+    def __init__(self, weights: np.ndarray, bias: float = 0.0, n: int = 2):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.n = n
+
+    @property
+    def dimensions(self) -> int:
+        return self.weights.shape[0]
+
+    def features(self, text: str) -> np.ndarray:
+        return hashed_ngrams(text, self.dimensions, self.n)
+
+    def probability(self, text: str) -> float:
+        """Probability that a text belongs to the positive class"""
+        logit = self.bias + float(self.weights[self.features(text)].sum())
+        return float(1 / (1 + np.exp(-logit)))
+
+    def save(self, path: str) -> None:
+        """Write the model to an .npz file"""
+        with open(path, "wb") as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, n=self.n)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearModel":
+        """Read a model written by save"""
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), int(data["n"]))
+
+def train_linear_model(
+    texts: Sequence[str],
+    labels: Sequence[bool],
+    dimensions: int = DEFAULT_DIMENSIONS,
+    n: int = 2,
+    epochs: int = 10,
+    learning_rate: float = 0.5,
+    l2: float = 1e-5,
+    seed: int = 0
+) -> LinearModel:
+    """Fit a LinearModel by stochastic gradient descent on the log loss
+
+    Examples are shuffled every epoch, and the L2 penalty is applied lazily
+    to the weights of the features each example touches.
+    """
+    features = [hashed_ngrams(text, dimensions, n) for text in texts]
+    targets = np.asarray(labels, dtype=np.float64)
+    weights = np.zeros(dimensions, dtype=np.float64)
+    bias = float(np.log((targets.sum() + 1) / (len(targets) - targets.sum() + 1)))
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        rate = learning_rate / (1 + epoch)
+        for index in rng.permutation(len(features)):
+            active = features[index]
+            logit = bias + weights[active].sum()
+            error = 1 / (1 + np.exp(-logit)) - targets[index]
+            weights[active] -= rate * (error + l2 * weights[active])
+            bias -= rate * error
+    return LinearModel(weights, bias, n)
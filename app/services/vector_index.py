@@ -0,0 +1,428 @@
+"""
+Approximate nearest-neighbour index over embeddings
+"""
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .quantization import QUANTIZATION_MODES, VectorBlock
+
+logger = logging.getLogger("services.vector_index")
+
+@dataclass
+class IndexStats:
+    """Counters for the vector index"""
+    adds: int = 0
+    deletes: int = 0
+    searches: int = 0
+    trainings: int = 0
+
+class _InvertedList:
+    """Vectors assigned to one centroid, stored contiguously for fast scans"""
+
+    def __init__(self, dimensions: int, quantization: str = "none", rescore_factor: int = 10):
+        self.block = VectorBlock(dimensions, quantization, rescore_factor=rescore_factor)
+        self.ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, key: str, vector: np.ndarray) -> int:
+        self.ids.append(key)
+        return self.block.append(vector)
+
+    def extend(self, keys: List[str], vectors: np.ndarray) -> None:
+        self.block.extend(vectors)
+        self.ids.extend(keys)
+
+    def remove(self, position: int) -> Optional[str]:
+        """Swap-remove a vector, returning the id moved into its position"""
+        last = len(self.ids) - 1
+        moved = None
+        self.block.remove(position)
+        if position != last:
+            self.ids[position] = self.ids[last]
+            moved = self.ids[position]
+        self.ids.pop()
+        return moved
+
+class VectorIndex:
+    """IVF index with cosine similarity, persisted to SQLite
+
+    Vectors are normalised and bucketed by their nearest k-means centroid;
+    a search only scans the `nprobe` buckets whose centroids are closest to
+    the query. Until `min_train_size` vectors have been added the index is a
+    single bucket searched exactly. It is retrained, on a background thread
+    unless `background_training` is off, once it has grown to
+    `retrain_factor` times the size it was last trained at, which keeps
+    buckets around sqrt(n) vectors.
+
+    Each add and delete is written through to `path` with the vector's
+    bucket, so reopening the index does not need to reassign vectors.
+
+    With `quantization` set to "int8" or "binary" vectors are held in memory
+    as compact codes (see VectorBlock) and scores are approximate; the
+    database keeps the float32 vectors, so the mode can be changed between
+    runs.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        nprobe: int = 8,
+        min_train_size: int = 10000,
+        retrain_factor: float = 4.0,
+        train_iterations: int = 10,
+        train_sample_per_bucket: int = 64,
+        background_training: bool = True,
+        quantization: str = "none",
+        rescore_factor: int = 10,
+        seed: int = 0
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode {quantization}, expected one of {QUANTIZATION_MODES}")
+        self.path = path
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.train_iterations = train_iterations
+        self.train_sample_per_bucket = train_sample_per_bucket
+        self.background_training = background_training
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._training_lock = threading.Lock()
+        self._training = False
+        self._stats = IndexStats()
+
+        self.dimensions: Optional[int] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._lists: List[_InvertedList] = []
+        self._positions: Dict[str, Tuple[int, int]] = {}
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors "
+                "(id TEXT PRIMARY KEY, bucket INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+            self._conn.commit()
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def add(self, key: str, vector: Sequence[float]) -> None:
+        """Insert or replace the vector for an id"""
+        vector = self._normalize(vector)
+        with self._lock:
+            if self.dimensions is None:
+                self._set_dimensions(vector.shape[0])
+            elif vector.shape[0] != self.dimensions:
+                raise ValueError(
+                    f"Expected a {self.dimensions}-dimensional vector, got {vector.shape[0]}"
+                )
+
+            if key in self._positions:
+                self._remove(key)
+            bucket = self._nearest_bucket(vector)
+            position = self._lists[bucket].append(key, vector)
+            self._positions[key] = (bucket, position)
+            self._stats.adds += 1
+
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO vectors (id, bucket, vector) VALUES (?, ?, ?)",
+                    (key, bucket, vector.tobytes()),
+                )
+                self._conn.commit()
+
+            start_training = not self._training and self._needs_training()
+            if start_training:
+                self._training = True
+
+        if start_training:
+            if self.background_training:
+                threading.Thread(target=self._train_in_background, daemon=True).start()
+            else:
+                self._train_in_background()
+
+    def delete(self, key: str) -> bool:
+        """Remove an id, returning whether it was present"""
+        with self._lock:
+            if key not in self._positions:
+                return False
+            self._remove(key)
+            self._stats.deletes += 1
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM vectors WHERE id = ?", (key,))
+                self._conn.commit()
+            return True
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Get a copy of the normalised vector stored for an id"""
+        with self._lock:
+            location = self._positions.get(key)
+            if location is None:
+                return None
+            bucket, position = location
+            return self._lists[bucket].block.vectors([position])[0]
+
+    def search(
+        self,
+        vector: Sequence[float],
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Get up to k (id, cosine similarity) pairs nearest a vector, best first"""
+        query = self._normalize(vector)
+        top = k + (exclude is not None)
+        with self._lock:
+            self._stats.searches += 1
+            if not self._positions or k <= 0:
+                return []
+            if query.shape[0] != self.dimensions:
+                raise ValueError(
+                    f"Expected a {self.dimensions}-dimensional vector, got {query.shape[0]}"
+                )
+
+            buckets = range(len(self._lists))
+            if self._centroids is not None:
+                probes = min(nprobe or self.nprobe, len(self._lists))
+                centroid_scores = self._centroids @ query
+                buckets = np.argpartition(-centroid_scores, probes - 1)[:probes]
+
+            ids: List[str] = []
+            scores = []
+            for bucket in buckets:
+                inverted = self._lists[bucket]
+                if len(inverted):
+                    positions, bucket_scores = inverted.block.search(query, top)
+                    ids.extend(inverted.ids[position] for position in positions)
+                    scores.append(bucket_scores)
+
+        if not scores:
+            return []
+        scores = np.concatenate(scores)
+        top = min(top, scores.size)
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in best if ids[i] != exclude][:k]
+
+    def train(self, nlist: Optional[int] = None) -> None:
+        """Recluster every vector into nlist buckets (sqrt(n) by default)
+
+        Clustering runs on a sample without holding the lock, and vectors
+        are then reassigned one bucket at a time, so adds and searches keep
+        being served while the index trains.
+        """
+        with self._training_lock:
+            with self._lock:
+                size = len(self._positions)
+                if not size:
+                    return
+                nlist = max(1, min(nlist or int(np.sqrt(size)), size))
+                sample = self._sample(min(size, nlist * self.train_sample_per_bucket))
+                bucket_count = len(self._lists)
+            logger.info(f"Training vector index on {size} vectors into {nlist} buckets")
+
+            centroids = self._kmeans(sample, nlist)
+            assignments: Dict[str, int] = {}
+            for bucket in range(bucket_count):
+                with self._lock:
+                    if bucket >= len(self._lists):
+                        break
+                    inverted = self._lists[bucket]
+                    ids = list(inverted.ids)
+                    vectors = inverted.block.vectors()
+                assignments.update(zip(ids, self._assign(vectors, centroids).tolist()))
+
+            with self._lock:
+                self._install(centroids, assignments)
+
+    def stats(self) -> Dict[str, object]:
+        """Get index counters and shape"""
+        return {
+            **asdict(self._stats),
+            "size": len(self._positions),
+            "buckets": len(self._lists),
+            "trained": self._centroids is not None,
+            "nprobe": self.nprobe,
+            "quantization": self.quantization,
+            "memory_bytes": sum(inverted.block.nbytes for inverted in self._lists),
+        }
+
+    def close(self) -> None:
+        """Close the backing database"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _normalize(self, vector: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _set_dimensions(self, dimensions: int) -> None:
+        self.dimensions = dimensions
+        self._lists = [self._new_list()]
+        if self._conn is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('dimensions', ?)",
+                (str(dimensions),),
+            )
+
+    def _new_list(self) -> _InvertedList:
+        return _InvertedList(self.dimensions, self.quantization, self.rescore_factor)
+
+    def _nearest_bucket(self, vector: np.ndarray) -> int:
+        if self._centroids is None:
+            return 0
+        return int(np.argmax(self._centroids @ vector))
+
+    def _remove(self, key: str) -> None:
+        bucket, position = self._positions.pop(key)
+        moved = self._lists[bucket].remove(position)
+        if moved is not None:
+            self._positions[moved] = (bucket, position)
+
+    def _needs_training(self) -> bool:
+        size = len(self._positions)
+        if self._centroids is None:
+            return size >= self.min_train_size
+        return size >= self._trained_size * self.retrain_factor
+
+    def _train_in_background(self) -> None:
+        try:
+            self.train()
+        except Exception as e:
+            logger.error(f"Vector index training failed: {e}")
+        finally:
+            self._training = False
+
+    def _sample(self, count: int) -> np.ndarray:
+        keys = list(self._positions)
+        chosen = self._rng.choice(len(keys), count, replace=False)
+        rows: Dict[int, List[int]] = {}
+        for i in chosen:
+            bucket, position = self._positions[keys[i]]
+            rows.setdefault(bucket, []).append(position)
+        return np.concatenate([
+            self._lists[bucket].block.vectors(positions) for bucket, positions in rows.items()
+        ])
+
+    def _install(self, centroids: np.ndarray, assignments: Dict[str, int]) -> None:
+        """Swap in new centroids, moving every vector to its new bucket"""
+        old_lists = self._lists
+        self._centroids = centroids
+        self._trained_size = len(self._positions)
+        self._lists = [self._new_list() for _ in range(len(centroids))]
+        self._positions = {}
+        updates = []
+        while old_lists:
+            inverted = old_lists.pop()
+            ids = inverted.ids
+            vectors = inverted.block.vectors()
+            buckets = np.array([assignments.get(key, -1) for key in ids], dtype=np.int64)
+            missing = buckets < 0
+            if missing.any():
+                buckets[missing] = self._assign(vectors[missing], centroids)
+            self._extend(ids, vectors, buckets)
+            updates.extend(zip(buckets.tolist(), ids))
+        self._stats.trainings += 1
+
+        if self._conn is not None:
+            self._conn.executemany("UPDATE vectors SET bucket = ? WHERE id = ?", updates)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('centroids', ?)",
+                (centroids.tobytes(),),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('trained_size', ?)",
+                (str(self._trained_size),),
+            )
+            self._conn.commit()
+
+    def _extend(self, ids: List[str], vectors: np.ndarray, buckets: np.ndarray) -> None:
+        """Append a chunk of vectors to the buckets they are assigned to"""
+        order = np.argsort(buckets, kind="stable")
+        present, starts = np.unique(buckets[order], return_index=True)
+        ends = list(starts[1:]) + [len(order)]
+        for bucket, start, end in zip(present.tolist(), starts, ends):
+            rows = order[start:end]
+            inverted = self._lists[bucket]
+            offset = len(inverted)
+            inverted.extend([ids[row] for row in rows], vectors[rows])
+            for position, row in enumerate(rows, offset):
+                self._positions[ids[row]] = (bucket, position)
+
+    def _kmeans(self, sample: np.ndarray, nlist: int) -> np.ndarray:
+        """Spherical k-means over a sample of the vectors"""
+        centroids = sample[self._rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assignments = self._assign(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            present, starts = np.unique(assignments[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = np.ones(nlist, dtype=bool)
+            empty[present] = False
+            if empty.any():
+                sums[empty] = sample[self._rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        return centroids
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        if not len(vectors):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk)
+        ])
+
+    def _load(self, chunk: int = 10000) -> None:
+        meta = dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+        if "dimensions" not in meta:
+            return
+        self.dimensions = int(meta["dimensions"])
+        self._lists = [self._new_list()]
+        if "centroids" in meta:
+            self._centroids = np.frombuffer(meta["centroids"], dtype=np.float32).reshape(
+                -1, self.dimensions
+            ).copy()
+            self._trained_size = int(meta["trained_size"])
+            self._lists = [self._new_list() for _ in range(len(self._centroids))]
+
+        cursor = self._conn.execute("SELECT id, bucket, vector FROM vectors")
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            vectors = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float32)
+            self._extend(
+                [row[0] for row in rows],
+                vectors.reshape(len(rows), self.dimensions),
+                np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+            )
+        logger.info(
+            f"Loaded {len(self._positions)} vectors into {len(self._lists)} buckets from {self.path}"
+        )
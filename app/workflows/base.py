@@ -1,13 +1,21 @@
 """
 Base workflow implementation
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from langgraph.graph import Graph
+from pydantic import BaseModel, ConfigDict
 
-class WorkflowConfig:
+from ..models.llm import REASONING_MODEL
+
+class WorkflowConfig(BaseModel):
     """Base configuration for workflows"""
-    pass
+    model_config = ConfigDict(extra="allow", protected_namespaces=())
+
+    model_name: str = REASONING_MODEL
+    max_tokens: int = 1000
+    temperature: float = 1.0
+    timeout: Optional[float] = None
 
 class BaseWorkflow:
     """Base class for all workflows"""
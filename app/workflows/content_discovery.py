@@ -1,82 +1,144 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional
 
-from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 
+from ..models.llm import get_embeddings
+from ..models.schemas import ReplyCandidate
+from ..nodes import FeedVectorLookup, embed_feeds
+from ..services.dedup import NearDuplicateFilter
+from ..services.feeds import feed_field, feed_text
+from ..services.metrics import metrics
+from ..services.ranking import hybrid_rank
+from ..services.spam_filter import SpamFilter
 from .base import BaseWorkflow, WorkflowConfig
 
 
+def candidate_to_content(candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a ranked candidate like the discovered_content of the LLM node"""
+    selected = {
+        "title": candidate["text"][:80],
+        "url": candidate.get("url", ""),
+        "relevance_score": candidate["relevance_score"],
+        "key_points": [candidate["text"]],
+        "author_username": candidate["user_id"],
+        "cast_hash": candidate["cast_id"],
+        "channel_name": candidate.get("channel_name", ""),
+    }
+    return {
+        "selected_content": selected,
+        "relevance_score": candidate["relevance_score"],
+        "key_points": selected["key_points"],
+    }
+
+
 class ContentDiscoveryConfig(BaseModel):
     """Configuration for content discovery workflow"""
 
     model: WorkflowConfig = WorkflowConfig(max_tokens=1000)
 
     max_candidates: int = 5
-    min_relevance_score: float = 0.6
-    similarity_threshold: float = 0.8
+    min_relevance_score: float = 0.3
+    similarity_threshold: float = 0.3
+    prefilter_top_k: int = 10
+
+    # Hybrid ranking: weight of BM25 against embedding cosine similarity;
+    # at 1.0 ranking is lexical only and nothing is embedded
+    bm25_weight: float = 0.5
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+
+    # Feeds whose estimated Jaccard similarity to a better-ranked feed
+    # reaches this are dropped as near duplicates; 0 keeps them all
+    dedup_threshold: float = 0.8
+
+    # Discover content while the intent check runs, discarding it if no
+    # reply is needed; with an intent pre-classifier, only for casts whose
+    # reply probability reaches speculation_min_probability. In
+    # ReplyGenerationWorkflow the discovery prompt is built before the
+    # intent check returns, so it omits identified_needs and the model picks
+    # content from the cast text alone; the result is kept whenever a reply
+    # is needed. ReplyPipeline's local ranking never uses the needs, so there
+    # speculative and sequential results are the same
+    speculative: bool = False
+    speculation_min_probability: float = 0.5
 
 
 class ContentDiscoveryWorkflow(BaseWorkflow):
-    """Workflow for discovering relevant content and replies"""
+    """Workflow for discovering relevant content and replies
+
+    Feeds are ranked locally by a weighted sum of BM25 over their text and
+    the cosine similarity of their embeddings to the cast's. Candidates are
+    kept if their similarity reaches similarity_threshold and their combined
+    score reaches min_relevance_score, up to max_candidates. Near duplicates
+    of a better-ranked candidate are dropped and counted, as are feeds
+    spam_filter flags before ranking.
+    """
 
-    def __init__(self, config: ContentDiscoveryConfig = ContentDiscoveryConfig()):
+    def __init__(
+        self,
+        config: ContentDiscoveryConfig = ContentDiscoveryConfig(),
+        feed_vectors: Optional[FeedVectorLookup] = None,
+        spam_filter: Optional[SpamFilter] = None
+    ):
         self.config = config
-        self.model = config.model.create_model()
-        self.prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    """
-            Find relevant replies and content for this Farcaster cast. Consider:
-            1. Similar discussions and their outcomes
-            2. User engagement patterns
-            3. Content relevance and quality
-            4. Context and timing
-            
-            For each candidate reply, provide:
-            - Reply text
-            - Source (user/cast ID)
-            - Relevance score (0-1)
-            - Reasoning for selection
-            """,
-                ),
-                (
-                    "user",
-                    """
-            Cast: {cast_text}
-            Context: {context}
-            """,
-                ),
-            ]
-        )
+        self.feed_vectors = feed_vectors
+        self.spam_filter = spam_filter
 
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Discover relevant content and potential replies"""
-        response = await self.model.ainvoke(
-            self.prompt.format_messages(
-                cast_text=input_data["cast_text"],
-                context=input_data.get("context", "No additional context provided"),
+        cast_text = input_data["cast_text"]
+        feeds = [feed for feed in input_data.get("available_feeds") or [] if feed_text(feed)]
+        spam = 0
+        if self.spam_filter is not None:
+            feeds, spam = self.spam_filter.filter(feeds)
+
+        with metrics.timer("content_discovery.rank"):
+            query_vector = document_vectors = None
+            if feeds and self.config.bm25_weight < 1.0:
+                query_vector, document_vectors = await asyncio.gather(
+                    get_embeddings(cast_text), embed_feeds(feeds, self.feed_vectors)
+                )
+
+            ranked = hybrid_rank(
+                cast_text,
+                [feed_text(feed) for feed in feeds],
+                query_vector,
+                document_vectors,
+                bm25_weight=self.config.bm25_weight,
+                k1=self.config.bm25_k1,
+                b=self.config.bm25_b,
+            )
+
+        candidates: List[Dict[str, Any]] = []
+        seen = NearDuplicateFilter(self.config.dedup_threshold)
+        duplicates = 0
+        for result in ranked:
+            if result.score < self.config.min_relevance_score:
+                break
+            if result.semantic is not None and result.semantic < self.config.similarity_threshold:
+                continue
+            feed = feeds[result.index]
+            if self.config.dedup_threshold > 0 and seen.is_duplicate(feed_text(feed)):
+                duplicates += 1
+                continue
+            candidates.append(
+                ReplyCandidate(
+                    text=feed_text(feed),
+                    user_id=feed_field(feed, "author_username", "username", "author"),
+                    cast_id=feed_field(feed, "cast_hash", "hash"),
+                    relevance_score=result.score,
+                    confidence=result.semantic if result.semantic is not None else result.lexical,
+                    url=feed_field(feed, "url"),
+                    channel_name=feed_field(feed, "channel_name", "channel"),
+                ).model_dump()
             )
-        )
-
-        # In a real implementation, you would:
-        # 1. Query your Farcaster data store
-        # 2. Use embeddings for similarity search
-        # 3. Filter by relevance and engagement metrics
-        # This is a simplified example
-
-        candidates = [
-            {
-                "text": response.content,
-                "source": {"user_id": "ai_generated", "cast_id": "generated"},
-                "relevance_score": 0.8,
-                "reasoning": "AI-generated response based on content analysis",
-            }
-        ]
 
         return {
             "candidates": candidates[: self.config.max_candidates],
             "total_candidates_found": len(candidates),
+            "duplicates_dropped": duplicates,
+            "spam_dropped": spam,
             "filtering_criteria": {
                 "min_relevance": self.config.min_relevance_score,
                 "similarity_threshold": self.config.similarity_threshold,
@@ -85,4 +147,3 @@ class ContentDiscoveryWorkflow(BaseWorkflow):
 
     def get_config(self) -> Dict[str, Any]:
         return self.config.model_dump()
-
@@ -5,8 +5,7 @@ from typing import Dict, Any
 
 from langgraph.graph import Graph
 
-from ..models.llm import get_embeddings
-from ..nodes import prepare_embedding_text
+from ..nodes import generate_embedding, prepare_embedding_text
 
 class EmbeddingsWorkflow:
     """Workflow for generating embeddings"""
@@ -19,7 +18,7 @@ class EmbeddingsWorkflow:
         # Create nodes
         nodes = {
             "prepare_text": prepare_embedding_text,
-            "generate_embedding": get_embeddings
+            "generate_embedding": generate_embedding
         }
         
         # Create graph
@@ -41,4 +40,8 @@ class EmbeddingsWorkflow:
     
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """Run the workflow"""
-        return await self.graph.ainvoke(inputs) 
\ No newline at end of file
+        return await self.graph.ainvoke(inputs)
+
+    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Process the input data"""
+        return await self.run(input_data)
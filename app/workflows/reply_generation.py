@@ -1,23 +1,128 @@
 """
 Reply Generation Workflow
 """
-from typing import Dict, Any
+from functools import partial
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
 
 from langgraph.graph import Graph
 
-from ..nodes import check_reply_intent, discover_relevant_content, generate_reply
+from ..nodes import (
+    analyze_cast,
+    check_reply_intent,
+    discover_relevant_content,
+    generate_reply,
+    reply_probability,
+    stream_reply,
+)
+from ..services.feed_store import FeedStore
+from ..services.intent_classifier import IntentPreClassifier
+from ..services.spam_filter import SpamFilter
+from ..services.speculation import speculate
 from .base import BaseWorkflow, WorkflowConfig
+from .content_discovery import ContentDiscoveryConfig
+from .intent_analysis import IntentAnalysisConfig
 
 class ReplyGenerationConfig(WorkflowConfig):
     """Configuration for reply generation workflow"""
-    pass
+
+    # Have the generation model write the reply, instead of rendering the
+    # fixed reply format locally from the selected content
+    use_llm: bool = False
 
 class ReplyGenerationWorkflow(BaseWorkflow):
-    """Workflow for generating contextual replies"""
+    """Workflow for generating contextual replies
+
+    With intent_config.fused_summary, the intent check also summarizes the
+    cast, and the result carries a cast_summary.
+
+    With discovery_config.speculative, content discovery starts alongside
+    the intent check, assuming a reply with no identified needs, and its
+    result is discarded if no reply is needed.
+    """
     
-    def __init__(self, config: ReplyGenerationConfig = ReplyGenerationConfig()):
+    def __init__(
+        self,
+        config: ReplyGenerationConfig = ReplyGenerationConfig(),
+        intent_config: Optional[IntentAnalysisConfig] = None,
+        discovery_config: Optional[ContentDiscoveryConfig] = None,
+        feed_store: Optional[FeedStore] = None,
+        spam_filter: Optional[SpamFilter] = None,
+        pre_classifier: Optional[IntentPreClassifier] = None
+    ):
         super().__init__(config)
+        self.intent_config = intent_config or IntentAnalysisConfig()
+        self.discovery_config = discovery_config or ContentDiscoveryConfig()
+        self.fused_summary = self.intent_config.fused_summary
+        self.check_intent = partial(
+            analyze_cast if self.fused_summary else check_reply_intent,
+            cascade_model=(
+                self.intent_config.cascade_model if self.intent_config.cascade_enabled else None
+            ),
+            confidence_threshold=self.intent_config.confidence_threshold,
+            pre_classifier=pre_classifier,
+        )
+        self.discover_content = partial(
+            discover_relevant_content,
+            prefilter_top_k=self.discovery_config.prefilter_top_k,
+            similarity_threshold=self.discovery_config.similarity_threshold,
+            feed_vectors=feed_store.vector_for if feed_store is not None else None,
+            dedup_threshold=self.discovery_config.dedup_threshold,
+            spam_filter=spam_filter,
+        )
+        self.generate_reply = partial(generate_reply, use_llm=self.config.use_llm)
+        self.pre_classifier = pre_classifier
+        self.speculative = self.discovery_config.speculative
+        self._intent_step = (
+            self._check_intent_speculatively if self.speculative else self.check_intent
+        )
+        self._discovery_step = (
+            self._discover_unless_speculated if self.speculative else self.discover_content
+        )
         self.graph = self._build_graph()
+
+    def should_speculate(self, cast_text: str, probability: Optional[float] = None) -> bool:
+        """Whether to discover content for a cast before its intent is known
+
+        A pre-classifier probability the cast was already scored with is
+        used instead of scoring it again.
+        """
+        if not self.speculative:
+            return False
+        if probability is None and self.pre_classifier:
+            probability = self.pre_classifier.probability(cast_text)
+        return probability is None or probability >= self.discovery_config.speculation_min_probability
+
+    async def _check_intent_speculatively(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Check intent while discovering content on a copy of the state"""
+        if not self.should_speculate(state["cast_text"], reply_probability(state, self.pre_classifier)):
+            return await self.check_intent(state)
+
+        # The needs are not known yet, so discovery runs without them; see
+        # ContentDiscoveryConfig.speculative
+        assumed = {
+            **state,
+            "intent_analysis": {"should_reply": True, "identified_needs": [], "confidence": 0.0},
+            "prompt_tokens": {},
+        }
+        state, discovered = await speculate(
+            "discover_content",
+            self.check_intent(state),
+            lambda: self.discover_content(assumed),
+            lambda result: result["intent_analysis"]["should_reply"],
+        )
+        if discovered is not None:
+            state["speculative_discovery"] = discovered
+        return state
+
+    async def _discover_unless_speculated(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Use the speculative discovery result if there is one"""
+        discovered = state.pop("speculative_discovery", None)
+        if discovered is None:
+            return await self.discover_content(state)
+        for key in ("discovered_content", "duplicates_dropped", "spam_dropped"):
+            state[key] = discovered[key]
+        state.setdefault("prompt_tokens", {}).update(discovered["prompt_tokens"])
+        return state
     
     def _get_workflow_steps(self) -> list[str]:
         """Get the list of steps in the workflow"""
@@ -31,9 +136,9 @@ class ReplyGenerationWorkflow(BaseWorkflow):
         """Build the workflow graph"""
         # Create nodes
         nodes = {
-            "check_intent": check_reply_intent,
-            "discover_content": discover_relevant_content,
-            "generate_reply": generate_reply
+            "check_intent": self._intent_step,
+            "discover_content": self._discovery_step,
+            "generate_reply": self.generate_reply
         }
         
         # Create graph
@@ -56,18 +161,52 @@ class ReplyGenerationWorkflow(BaseWorkflow):
         return graph.compile()
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Run the workflow"""
+        """Run the workflow
+
+        A SharedFeedSet given as feed_set is used instead of available_feeds.
+        A reply_probability the caller already scored the cast with is passed
+        on to the pre-classifier.
+        """
         # Prepare the initial state
         initial_state = {
             "cast_text": input_data["cast_text"],
-            "available_feeds": input_data.get("available_feeds", [])
+            "available_feeds": input_data.get("available_feeds", []),
+            "reply_probability": input_data.get("reply_probability"),
         }
+        if input_data.get("feed_set") is not None:
+            initial_state["feed_set"] = input_data["feed_set"]
         
         # Execute the workflow
         result = await self.graph.ainvoke(initial_state)
+        result.pop("feed_set", None)
+        result.pop("reply_probability", None)
         
         # Return the raw result
         return result
+
+    async def stream(self, input_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """Run the workflow step by step, yielding (event, data) as each step completes
+
+        Reply text is yielded as "reply_delta" events while the generation
+        model streams, followed by the parsed "reply".
+        """
+        state = {
+            "cast_text": input_data["cast_text"],
+            "available_feeds": input_data.get("available_feeds", []),
+            "reply_probability": input_data.get("reply_probability"),
+        }
+
+        state = await self._intent_step(state)
+        if self.fused_summary:
+            yield "cast_summary", {"cast_summary": state["cast_summary"]}
+        yield "intent_analysis", state["intent_analysis"]
+
+        state = await self._discovery_step(state)
+        yield "discovered_content", state["discovered_content"]
+
+        async for delta in stream_reply(state, use_llm=self.config.use_llm):
+            yield "reply_delta", {"text": delta}
+        yield "reply", state["reply"]
     
     def get_config(self) -> Dict[str, Any]:
         """Get the workflow configuration"""
@@ -1,16 +1,23 @@
 """
 User Summary Workflow
 """
-from typing import Dict, Any
+from functools import partial
+from typing import Dict, Any, Optional
 
 from langgraph.graph import Graph
 
-from ..nodes import process_user_data, generate_user_embedding
+from ..nodes import process_user_data, generate_user_embedding, index_user_embedding
+from ..services.vector_index import VectorIndex
 
 class UserSummaryWorkflow:
-    """Workflow for generating user summaries and embeddings"""
+    """Workflow for generating user summaries and embeddings
+
+    When an index is given, each user's embedding is added to it under their
+    fid, user_id or username.
+    """
     
-    def __init__(self):
+    def __init__(self, index: Optional[VectorIndex] = None):
+        self.index = index
         self.graph = self._build_graph()
         
     def _build_graph(self) -> Graph:
@@ -30,14 +37,24 @@ class UserSummaryWorkflow:
         
         # Add edges
         graph.add_edge("process_data", "generate_embedding")
+        finish = "generate_embedding"
+
+        if self.index is not None:
+            graph.add_node("index_user", partial(index_user_embedding, index=self.index))
+            graph.add_edge("generate_embedding", "index_user")
+            finish = "index_user"
         
         # Set entry and end points
         graph.set_entry_point("process_data")
-        graph.set_finish_point("generate_embedding")
+        graph.set_finish_point(finish)
         
         # Compile
         return graph.compile()
     
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """Run the workflow"""
-        return await self.graph.ainvoke(inputs) 
\ No newline at end of file
+        return await self.graph.ainvoke(inputs)
+
+    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Process the input data"""
+        return await self.run(input_data)
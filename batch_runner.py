@@ -0,0 +1,85 @@
+"""
+Resumable offline batch runner for JSONL files of reply, user summary and embedding requests
+
+Each input line is a JSON object with a `type` of reply, user_summary or
+embedding plus the body the matching API endpoint takes, and optionally an
+`id` copied to the output. Results are appended to the output file as they
+finish; rerunning the same command after a crash resumes where it stopped.
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict
+
+import main as service
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_llm_stats, set_backend
+from app.services.batch_runner import BatchRunner, BatchStats
+from app.services.rate_limiter import set_priority_lane
+
+async def reply(request: Dict[str, Any]) -> Dict:
+    """Handle a line shaped like a /api/generate-reply body"""
+    set_priority_lane("reply")
+    result = await service.reply_for_cast(request["cast"]["text"], service.collect_available_feeds(request))
+    result.pop("available_feeds", None)
+    return result
+
+async def user_summary(request: Dict[str, Any]) -> Dict:
+    """Handle a line shaped like a /api/user-summary body"""
+    set_priority_lane("summary")
+    return await service.user_summary_workflow.run({"user_data": request["user_data"]})
+
+async def embedding(request: Dict[str, Any]) -> Dict:
+    """Handle a line shaped like a /api/generate-embedding body"""
+    set_priority_lane("embedding")
+    return await service.embeddings_workflow.run({"input_data": request["input_data"]})
+
+HANDLERS = {"reply": reply, "user_summary": user_summary, "embedding": embedding}
+
+def report(stats: BatchStats) -> None:
+    """Print running totals"""
+    print(
+        f"processed {stats.processed} ({stats.errors} errors, {stats.skipped} resumed)"
+        f" in {stats.elapsed:.0f}s, {stats.throughput:.1f} req/s",
+        flush=True,
+    )
+
+async def run(args: argparse.Namespace) -> None:
+    """Process the input file and print throughput and error stats"""
+    if args.fake_backend:
+        set_backend(FakeBackend(seed=0))
+    runner = BatchRunner(
+        HANDLERS,
+        concurrency=args.concurrency,
+        checkpoint_every=args.checkpoint_every,
+        progress_interval=args.progress_interval,
+        on_progress=report,
+    )
+    try:
+        stats = await runner.run(args.input, args.output, args.checkpoint)
+    finally:
+        # The same cleanup as the server's shutdown: the OpenAI client, the
+        # user index, the feed store and the summary job database
+        await service.shutdown()
+
+    print(f"processed:   {stats.processed} ({stats.errors} errors)")
+    print(f"resumed:     {stats.skipped} already done")
+    print(f"errors:      {stats.errors_by_type or 'none'}")
+    print(f"elapsed:     {stats.elapsed:.1f} s")
+    print(f"throughput:  {stats.throughput:.1f} req/s")
+    print(f"llm stats:   {get_llm_stats()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", help="JSONL file of requests")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Lines between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=30.0, help="Seconds between progress lines")
+    parser.add_argument("--fake-backend", action="store_true", help="Use the fake LLM backend for a dry run")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Offline load test for the workflows against the fake LLM backend
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_llm_stats, parse_latency, set_backend
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+from app.workflows.user_summary import UserSummaryWorkflow
+
+CASTS = [
+    "Looking for a solidity auditor for our new lending protocol, any recommendations?",
+    "gm farcaster",
+    "Anyone building frames for music NFTs? Would love to collab",
+    "Just shipped a new feature, feeling great",
+    "Where can I learn zero-knowledge proofs from scratch?",
+]
+
+FEEDS = [
+    {"text": "Auditing solidity contracts every day, DMs open", "author": "auditor", "hash": "0x01"},
+    {"text": "New guide: building music NFT frames on Zora", "author": "zora_dev", "hash": "0x02"},
+    {"text": "ZK proofs reading list for beginners", "author": "zk_teacher", "hash": "0x03"},
+]
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Get a percentile from a list of samples"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run(args: argparse.Namespace) -> None:
+    """Run the requested number of workflow executions with bounded concurrency"""
+    set_backend(FakeBackend(
+        latency=parse_latency(args.latency),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=0,
+    ))
+    reply_workflow = ReplyGenerationWorkflow()
+    summary_workflow = UserSummaryWorkflow()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if args.workflow == "reply":
+                    await reply_workflow.process({
+                        "cast_text": f"{CASTS[index % len(CASTS)]} #{index % args.unique}",
+                        "available_feeds": FEEDS,
+                    })
+                else:
+                    await summary_workflow.run({
+                        "user_data": {"username": f"user{index % args.unique}", "bio": CASTS[index % len(CASTS)]}
+                    })
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(index) for index in range(args.requests)])
+    elapsed = time.perf_counter() - start
+
+    print(f"workflow:    {args.workflow}")
+    print(f"requests:    {args.requests} ({errors} errors)")
+    print(f"throughput:  {args.requests / elapsed:.1f} req/s")
+    print(f"latency p50: {percentile(latencies, 0.5) * 1000:.1f} ms")
+    print(f"latency p95: {percentile(latencies, 0.95) * 1000:.1f} ms")
+    print(f"llm stats:   {get_llm_stats()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workflow", choices=["reply", "summary"], default="reply")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--unique", type=int, default=50, help="Distinct inputs to cycle through")
+    parser.add_argument("--latency", default="lognormal:0.5:0.4", help="fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,36 @@
 Main FastAPI application
 """
 
-from typing import Dict
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 
+from app.models.llm import (
+    close_client,
+    get_embeddings,
+    get_generation_model,
+    get_llm_stats,
+    get_reasoning_model,
+    get_text_response,
+)
+from app.config import get_settings
+from app.services.feed_set import SharedFeedSet
+from app.services.feed_store import FeedStore
+from app.services.intent_classifier import IntentPreClassifier
+from app.services.job_queue import JobQueue
+from app.services.metrics import metrics
+from app.services.prompt_builder import load_encodings
+from app.services.rate_limiter import set_priority_lane
+from app.services.spam_filter import SpamFilter
+from app.services.vector_index import VectorIndex
 from app.workflows.embeddings import EmbeddingsWorkflow
 from app.workflows.reply_generation import ReplyGenerationWorkflow
 from app.workflows.user_summary import UserSummaryWorkflow
-from app.prompts import CAST_SUMMARY_PROMPT
+from app.prompts import PROMPTS
 
 app = FastAPI(
     title="AI Reply Service",
@@ -18,14 +40,91 @@ app = FastAPI(
 )
 
 # Workflow Instances
-user_summary_workflow = UserSummaryWorkflow()
-reply_workflow = ReplyGenerationWorkflow()
+settings = get_settings()
+pipeline_config = settings.get_pipeline_config()
+user_index = VectorIndex(
+    settings.user_index_path,
+    nprobe=settings.user_index_nprobe,
+    quantization=settings.user_index_quantization,
+)
+feed_store = FeedStore(settings.feed_store_path, embed=get_embeddings, ttl=settings.feed_store_ttl)
+spam_filter = SpamFilter(
+    settings.spam_rules_path,
+    model_path=settings.spam_model_path,
+    threshold=settings.spam_threshold,
+) if settings.spam_filter_enabled else None
+pre_classifier = IntentPreClassifier(
+    settings.intent_model_path,
+    threshold=settings.intent_pre_threshold,
+    log_path=settings.intent_log_path,
+) if settings.intent_model_path or settings.intent_log_path else None
+user_summary_workflow = UserSummaryWorkflow(index=user_index)
+reply_workflow = ReplyGenerationWorkflow(
+    pipeline_config["reply_generation"],
+    intent_config=pipeline_config["intent_analysis"],
+    discovery_config=pipeline_config["content_discovery"],
+    feed_store=feed_store,
+    spam_filter=spam_filter,
+    pre_classifier=pre_classifier,
+)
 embeddings_workflow = EmbeddingsWorkflow()
+background_tasks: Set[asyncio.Task] = set()
+
+
+async def run_summary_job(payload: Dict) -> Dict:
+    """Run a queued user summary job"""
+    set_priority_lane("summary")
+    return await user_summary_workflow.run({"user_data": payload["user_data"]})
+
+
+summary_jobs = JobQueue(
+    run_summary_job,
+    settings.summary_job_path,
+    concurrency=settings.summary_job_workers,
+    max_attempts=settings.summary_job_max_attempts,
+    ttl=settings.summary_job_ttl,
+    lease=settings.summary_job_lease,
+)
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    """Start the user summary job workers and load the prompt tokenizers"""
+    summary_jobs.start()
+    models = {get_reasoning_model(), get_generation_model()}
+    if pipeline_config["intent_analysis"].cascade_enabled:
+        models.add(pipeline_config["intent_analysis"].cascade_model)
+    await asyncio.to_thread(load_encodings, models)
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    """Release pooled OpenAI connections and the local stores"""
+    await summary_jobs.stop()
+    summary_jobs.close()
+    await close_client()
+    user_index.close()
+    feed_store.close()
+
+
+@app.get("/api/metrics")
+async def get_metrics() -> Dict:
+    """Get counters from the shared LLM services and pipeline stages"""
+    return {
+        **get_llm_stats(),
+        "user_index": user_index.stats(),
+        "feed_store": feed_store.stats(),
+        "spam_filter": spam_filter.stats() if spam_filter is not None else None,
+        "intent_pre_classifier": pre_classifier.stats() if pre_classifier is not None else None,
+        "summary_jobs": summary_jobs.stats(),
+        "pipeline": metrics.snapshot(),
+    }
 
 
 @app.post("/api/user-summary")
 async def generate_user_summary(request: Dict) -> Dict:
     """Generate user summary and embeddings"""
+    set_priority_lane("summary")
     try:
         result = await user_summary_workflow.run({"user_data": request["user_data"]})
         return result
@@ -33,37 +132,197 @@ async def generate_user_summary(request: Dict) -> Dict:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/user-summary/jobs")
+async def submit_user_summary_jobs(request: Dict) -> Dict:
+    """Queue user summaries, returning job ids to poll instead of waiting
+
+    Takes one `user_data` object or a `users` list of them.
+    """
+    if "user_data" in request:
+        users = [request["user_data"]]
+    elif isinstance(request.get("users"), list):
+        users = request["users"]
+    else:
+        raise HTTPException(status_code=422, detail="Provide user_data or a users list")
+
+    job_ids = await asyncio.to_thread(summary_jobs.submit, [{"user_data": user} for user in users])
+    if "user_data" in request:
+        return {"job_id": job_ids[0], "status": "queued"}
+    return {"job_ids": job_ids, "status": "queued"}
+
+
+@app.get("/api/user-summary/jobs/{job_id}")
+async def get_user_summary_job(job_id: str) -> Dict:
+    """Get a user summary job's status, and its result once done"""
+    job = await asyncio.to_thread(summary_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.post("/api/user-summary/jobs/results")
+async def get_user_summary_job_results(request: Dict) -> Dict:
+    """Get many user summary jobs at once, with the ids that are unknown or expired"""
+    if not isinstance(request.get("job_ids"), list):
+        raise HTTPException(status_code=422, detail="job_ids must be a list")
+    jobs, missing = await asyncio.to_thread(summary_jobs.get_many, request["job_ids"])
+    return {"jobs": jobs, "missing": missing}
+
+
+@app.post("/api/similar-users")
+async def similar_users(request: Dict) -> Dict:
+    """Find the users whose embeddings are nearest a user id or a vector"""
+    k = positive_int(request, "k", 10, settings.similar_users_max_k)
+    exclude = None
+    if request.get("user_id") is not None:
+        exclude = str(request["user_id"])
+        vector = await asyncio.to_thread(user_index.get, exclude)
+        if vector is None:
+            raise HTTPException(status_code=404, detail=f"Unknown user_id {exclude}")
+    elif request.get("vector") is not None:
+        vector = request["vector"]
+    else:
+        raise HTTPException(status_code=400, detail="Provide a user_id or a vector")
+
+    try:
+        results = await asyncio.to_thread(user_index.search, vector, k, exclude=exclude)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": [{"user_id": user_id, "score": score} for user_id, score in results]}
+
+
+@app.post("/api/feeds")
+async def ingest_feeds(request: Dict) -> Dict:
+    """Store feed items by cast hash and embed new or changed ones in the background"""
+    if not isinstance(request.get("feeds"), list):
+        raise HTTPException(status_code=422, detail="feeds must be a list")
+
+    set_priority_lane("embedding")
+    counts = await asyncio.to_thread(feed_store.upsert, request["feeds"])
+    if counts["pending"]:
+        task = asyncio.create_task(feed_store.embed_pending())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    return counts
+
+
+@app.delete("/api/feeds")
+async def delete_feeds(request: Dict) -> Dict:
+    """Remove stored feed items by cast hash"""
+    deleted = await asyncio.to_thread(feed_store.delete, request.get("ids", []))
+    return {"deleted": deleted}
+
+
 @app.post("/api/generate-reply")
 async def generate_reply(request: Dict) -> Dict:
     """Generate a reply for a cast"""
+    set_priority_lane("reply")
     try:
-        # First generate a summary of the cast
-        cast_summary = await generate_cast_summary(request["cast"]["text"])
-        
-        # Combine similar and trending feeds into available_feeds
-        available_feeds = []
-        if "similarUserFeeds" in request:
-            available_feeds.extend(request["similarUserFeeds"])
-        if "trendingFeeds" in request:
-            available_feeds.extend(request["trendingFeeds"])
-
-        result = await reply_workflow.process(
-            {
-                "cast_text": request["cast"]["text"],
-                "cast_summary": cast_summary,
-                "available_feeds": available_feeds
-            }
-        )
-        return result
+        return await reply_for_cast(request["cast"]["text"], collect_available_feeds(request))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/generate-reply/batch")
+async def generate_reply_batch(request: Dict) -> StreamingResponse:
+    """Generate replies for many casts sharing one feed set, streamed as NDJSON
+
+    The feeds are normalized, spam-filtered and embedded once, then casts
+    run through the reply workflow at most `concurrency` at a time. Each
+    line holds one cast's result or error, in the order they finish, and a
+    final summary line follows.
+    """
+    casts = request.get("casts")
+    if not isinstance(casts, list) or not all(isinstance(cast, dict) and "text" in cast for cast in casts):
+        raise HTTPException(status_code=422, detail="casts must be a list of objects with text")
+    concurrency = positive_int(request, "concurrency", settings.batch_concurrency, settings.batch_concurrency)
+
+    async def lines() -> AsyncIterator[str]:
+        set_priority_lane("reply")
+        start = time.perf_counter()
+        feed_set = await asyncio.to_thread(
+            SharedFeedSet.prepare, collect_available_feeds(request), spam_filter
+        )
+        if len(feed_set.feeds) > pipeline_config["content_discovery"].prefilter_top_k:
+            await feed_set.embed(get_embeddings)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(index: int, cast: Dict) -> Dict:
+            async with semaphore:
+                line = {"index": index, "cast_id": cast.get("hash") or cast.get("id")}
+                try:
+                    result = await reply_for_cast(cast["text"], feed_set=feed_set)
+                    result.pop("available_feeds", None)
+                    line["result"] = result
+                except Exception as e:
+                    line["error"] = str(e)
+                return line
+
+        # Created here so that the casts still running when the client
+        # disconnects can be cancelled
+        tasks = [asyncio.create_task(one(i, cast)) for i, cast in enumerate(casts)]
+        errors = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                errors += "error" in line
+                yield json.dumps(line) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield json.dumps({
+            "done": True,
+            "casts": len(casts),
+            "errors": errors,
+            "feed_set": feed_set.stats(),
+            "elapsed": time.perf_counter() - start,
+        }) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/api/generate-reply/stream")
+async def generate_reply_stream(request: Dict) -> StreamingResponse:
+    """Generate a reply for a cast, streaming each step as server-sent events"""
+    if "cast" not in request or "text" not in request["cast"]:
+        raise HTTPException(status_code=422, detail="cast.text is required")
+
+    async def events() -> AsyncIterator[str]:
+        set_priority_lane("reply")
+        try:
+            cast_summary = None
+            probability = score_cast(request["cast"]["text"])
+            if needs_cast_summary(request["cast"]["text"], probability):
+                cast_summary = await generate_cast_summary(request["cast"]["text"])
+                yield format_sse("cast_summary", {"cast_summary": cast_summary})
+
+            async for event, data in reply_workflow.stream(
+                {
+                    "cast_text": request["cast"]["text"],
+                    "cast_summary": cast_summary,
+                    "available_feeds": collect_available_feeds(request),
+                    "reply_probability": probability,
+                }
+            ):
+                yield format_sse(event, data)
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+        yield format_sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/generate-embedding")
 async def generate_embedding(request: Dict) -> Dict:
     """Generate embeddings for input text"""
+    set_priority_lane("embedding")
     try:
-        result = await embeddings_workflow.process(
+        result = await embeddings_workflow.run(
             {"input_data": request["input_data"]}
         )
         return result
@@ -71,12 +330,76 @@ async def generate_embedding(request: Dict) -> Dict:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def collect_available_feeds(request: Dict) -> list:
+    """Combine stored, similar and trending feeds into available_feeds
+
+    Ids in feedIds are looked up in the feed store; unknown ids are skipped
+    and counted as lookup misses.
+    """
+    available_feeds = []
+    if "feedIds" in request:
+        available_feeds.extend(feed_store.get_many(request["feedIds"])[0])
+    if "similarUserFeeds" in request:
+        available_feeds.extend(request["similarUserFeeds"])
+    if "trendingFeeds" in request:
+        available_feeds.extend(request["trendingFeeds"])
+    return available_feeds
+
+
+def positive_int(request: Dict, name: str, default: int, limit: int) -> int:
+    """Read an optional positive integer field, capped at limit, or reject the request with a 422"""
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise HTTPException(status_code=422, detail=f"{name} must be a positive integer")
+    return min(value, limit)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def reply_for_cast(
+    cast_text: str,
+    available_feeds: Optional[list] = None,
+    feed_set: Optional[SharedFeedSet] = None
+) -> Dict:
+    """Summarize a cast if needed and run it through the reply workflow"""
+    # First generate a summary of the cast, unless the intent check does
+    probability = score_cast(cast_text)
+    cast_summary = await generate_cast_summary(cast_text) if needs_cast_summary(cast_text, probability) else None
+    return await reply_workflow.process({
+        "cast_text": cast_text,
+        "cast_summary": cast_summary,
+        "available_feeds": available_feeds or [],
+        "feed_set": feed_set,
+        "reply_probability": probability,
+    })
+
+
+def score_cast(cast_text: str) -> Optional[float]:
+    """Score a cast with the pre-classifier once, for needs_cast_summary and the workflow"""
+    return pre_classifier.probability(cast_text) if pre_classifier is not None else None
+
+
+def needs_cast_summary(cast_text: str, probability: Optional[float] = None) -> bool:
+    """Whether to summarize a cast before the reply workflow
+
+    The fused intent check summarizes the cast itself, and casts the
+    pre-classifier rejects never reach a model, so neither needs it.
+    """
+    if reply_workflow.fused_summary:
+        return False
+    return pre_classifier is None or not pre_classifier.is_clear_negative(cast_text, probability)
+
+
 async def generate_cast_summary(cast_text: str) -> str:
     """Generate a summary of the cast text using the base model"""
     try:
         # Call the base model to generate a summary using the prompt
-        response = await base_model.generate(
-            CAST_SUMMARY_PROMPT.format(cast_text=cast_text)
+        response = await get_text_response(
+            model=get_generation_model(),
+            messages=PROMPTS["cast_summary"].render(cast_text=cast_text),
         )
         return response.strip()
     except Exception as e:
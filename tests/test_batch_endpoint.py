@@ -0,0 +1,70 @@
+"""
+Tests for the batch reply endpoint
+"""
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+import main
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_response_cache, set_backend
+
+class TestBatchEndpoint(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.previous_backend = set_backend(FakeBackend(dimensions=64))
+        get_response_cache().clear()
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def post(self, body):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/generate-reply/batch", json=body)
+
+    async def test_invalid_concurrency_is_rejected(self):
+        for concurrency in ("fast", 0, -2, 1.5, True, None):
+            with self.subTest(concurrency=concurrency):
+                response = await self.post({"casts": [{"text": "gm"}], "concurrency": concurrency})
+                self.assertEqual(response.status_code, 422)
+
+    async def test_concurrency_above_the_limit_is_capped(self):
+        response = await self.post({
+            "casts": [{"text": "gm farcaster", "hash": "0x1"}, {"text": "Looking for a solidity auditor", "hash": "0x2"}],
+            "trendingFeeds": [{"text": "Solidity auditor available", "author": "auditor", "hash": "0xa"}],
+            "concurrency": 1000,
+        })
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(line["cast_id"] for line in lines[:-1]), ["0x1", "0x2"])
+        self.assertEqual((lines[-1]["casts"], lines[-1]["errors"]), (2, 0))
+
+    async def test_disconnect_cancels_unfinished_casts(self):
+        cancelled = []
+
+        async def reply_for_cast(cast_text, feed_set=None):
+            if cast_text != "fast":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(cast_text)
+                    raise
+            return {"reply": None}
+
+        casts = [{"text": "fast"}, {"text": "slow 1"}, {"text": "slow 2"}]
+        with patch("main.reply_for_cast", reply_for_cast):
+            response = await main.generate_reply_batch({"casts": casts, "concurrency": 3})
+            first = await response.body_iterator.__anext__()
+            # What the server does when the client goes away
+            await response.body_iterator.aclose()
+            await asyncio.sleep(0)
+
+        self.assertEqual(json.loads(first)["index"], 0)
+        self.assertEqual(sorted(cancelled), ["slow 1", "slow 2"])
+
+if __name__ == '__main__':
+    unittest.main()
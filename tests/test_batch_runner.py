@@ -0,0 +1,147 @@
+"""
+Tests for the resumable batch runner
+"""
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.services.batch_runner import BatchRunner, Checkpoint
+
+class TestBatchRunner(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.directory.name, "in.jsonl")
+        self.output = os.path.join(self.directory.name, "out.jsonl")
+        self.handled = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_input(self, requests):
+        with open(self.input, "w") as f:
+            for request in requests:
+                f.write((json.dumps(request) if request else "") + "\n")
+
+    def read_output(self):
+        with open(self.output) as f:
+            return [json.loads(line) for line in f]
+
+    async def echo(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001 * (request["id"] % 3))
+        self.in_flight -= 1
+        if request.get("fail"):
+            raise RuntimeError("handler failed")
+        self.handled.append(request["id"])
+        return {"vector": np.arange(2, dtype=np.float32), "id": request["id"]}
+
+    def runner(self, **kwargs):
+        return BatchRunner({"echo": self.echo}, **kwargs)
+
+    async def test_results_and_errors_are_written(self):
+        self.write_input([
+            {"id": 1, "type": "echo"},
+            {"id": 2, "type": "echo", "fail": True},
+            None,
+            {"id": 4, "type": "unknown"},
+        ])
+
+        stats = await self.runner().run(self.input, self.output)
+
+        records = {record["line"]: record for record in self.read_output()}
+        self.assertEqual(records[1]["result"], {"vector": [0.0, 1.0], "id": 1})
+        self.assertEqual(records[2]["error"], "handler failed")
+        self.assertIn("Unknown request type", records[4]["error"])
+        self.assertNotIn(3, records)
+        self.assertEqual((stats.processed, stats.errors), (3, 2))
+        self.assertEqual(stats.errors_by_type, {"echo": 1, "unknown": 1})
+
+    async def test_concurrency_is_bounded(self):
+        self.write_input([{"id": i, "type": "echo"} for i in range(40)])
+
+        stats = await self.runner(concurrency=4).run(self.input, self.output)
+
+        self.assertEqual(stats.processed, 40)
+        self.assertEqual(self.max_in_flight, 4)
+        self.assertEqual(sorted(record["id"] for record in self.read_output()), list(range(40)))
+
+    async def test_resume_skips_finished_lines(self):
+        self.write_input([{"id": i, "type": "echo"} for i in range(10)])
+        await self.runner(checkpoint_every=3).run(self.input, self.output)
+        # Simulate a crash: the checkpoint only covers the first lines and
+        # the last output line was cut short
+        checkpoint = Checkpoint(f"{self.output}.checkpoint")
+        with open(self.output) as f:
+            lines = f.readlines()
+        with open(self.output, "w") as f:
+            f.writelines(lines[:6])
+            f.write(lines[6][:10])
+        checkpoint.watermark = 0
+        checkpoint.done = {json.loads(line)["line"] for line in lines[:3]}
+        checkpoint.save(len("".join(lines[:3])))
+        self.handled.clear()
+
+        stats = await self.runner().run(self.input, self.output)
+
+        finished = {json.loads(line)["id"] for line in lines[:6]}
+        self.assertEqual(sorted(self.handled), sorted(set(range(10)) - finished))
+        self.assertEqual(stats.skipped, 6)
+        self.assertEqual(sorted(record["id"] for record in self.read_output()), list(range(10)))
+
+    async def test_resume_without_checkpoint_scans_output(self):
+        self.write_input([{"id": i, "type": "echo"} for i in range(5)])
+        await self.runner().run(self.input, self.output)
+        os.remove(f"{self.output}.checkpoint")
+        self.handled.clear()
+
+        stats = await self.runner().run(self.input, self.output)
+
+        self.assertEqual(self.handled, [])
+        self.assertEqual(stats.skipped, 5)
+        self.assertEqual(len(self.read_output()), 5)
+
+    async def test_checkpoint_ahead_of_output_is_discarded(self):
+        self.write_input([{"id": i, "type": "echo"} for i in range(6)])
+        await self.runner().run(self.input, self.output)
+        with open(self.output) as f:
+            lines = f.readlines()
+        with open(self.output, "w") as f:
+            f.writelines(lines[:2])
+        self.handled.clear()
+
+        stats = await self.runner().run(self.input, self.output)
+
+        finished = {json.loads(line)["id"] for line in lines[:2]}
+        self.assertEqual(sorted(self.handled), sorted(set(range(6)) - finished))
+        self.assertEqual(stats.skipped, 2)
+        self.assertEqual(sorted(record["id"] for record in self.read_output()), list(range(6)))
+
+        os.remove(self.output)
+        self.handled.clear()
+
+        stats = await self.runner().run(self.input, self.output)
+
+        self.assertEqual(sorted(self.handled), list(range(6)))
+        self.assertEqual(stats.skipped, 0)
+
+    def test_checkpoint_watermark_advances_over_contiguous_lines(self):
+        checkpoint = Checkpoint(os.path.join(self.directory.name, "checkpoint"))
+        for line in (2, 3, 1, 5):
+            checkpoint.mark(line)
+        checkpoint.save(42)
+
+        loaded = Checkpoint(checkpoint.path)
+        self.assertTrue(loaded.load())
+        self.assertEqual((loaded.watermark, loaded.done, loaded.offset), (3, {5}, 42))
+        self.assertTrue(loaded.is_done(5))
+        self.assertFalse(loaded.is_done(4))
+
+if __name__ == '__main__':
+    unittest.main()
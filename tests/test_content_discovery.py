@@ -0,0 +1,132 @@
+"""
+Tests for the Content Discovery workflow
+"""
+import unittest
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_response_cache, set_backend
+from app.models import CastInput
+from app.pipeline import ReplyPipeline
+from app.services.spam_filter import SpamFilter
+from app.workflows.content_discovery import ContentDiscoveryConfig, ContentDiscoveryWorkflow
+
+FEEDS = [
+    {"text": "Solidity auditor available for lending protocol reviews", "author": "auditor", "hash": "0xa"},
+    {"text": "Our lending protocol needs a solidity audit", "author": "builder", "hash": "0xb", "channel": "defi"},
+    {"text": "Weekend photos from the beach", "author": "tourist", "hash": "0xc"},
+    {"text": "Sourdough starter tips", "author": "baker", "hash": "0xd"},
+]
+
+class TestContentDiscoveryWorkflow(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeBackend(dimensions=256)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_candidates_are_ranked_and_filtered(self):
+        workflow = ContentDiscoveryWorkflow(ContentDiscoveryConfig(min_relevance_score=0.3))
+
+        result = await workflow.process({
+            "cast_text": "Looking for a solidity auditor for our lending protocol",
+            "available_feeds": FEEDS
+        })
+
+        self.assertEqual([c["cast_id"] for c in result["candidates"]], ["0xa", "0xb"])
+        self.assertEqual(result["candidates"][0]["user_id"], "auditor")
+        self.assertEqual(result["candidates"][1]["channel_name"], "defi")
+        self.assertGreaterEqual(result["candidates"][0]["relevance_score"], result["candidates"][1]["relevance_score"])
+        # Only a batched embeddings call, no chat completion
+        self.assertEqual(self.backend.calls, 1)
+
+    async def test_config_limits_are_applied(self):
+        workflow = ContentDiscoveryWorkflow(ContentDiscoveryConfig(
+            max_candidates=1, min_relevance_score=0.0, similarity_threshold=0.0
+        ))
+
+        result = await workflow.process({"cast_text": "solidity audit", "available_feeds": FEEDS})
+
+        self.assertEqual(len(result["candidates"]), 1)
+        self.assertEqual(result["total_candidates_found"], 4)
+
+        strict = ContentDiscoveryWorkflow(ContentDiscoveryConfig(
+            min_relevance_score=0.0, similarity_threshold=0.99
+        ))
+        self.assertEqual((await strict.process({"cast_text": "solidity audit", "available_feeds": FEEDS}))["candidates"], [])
+
+    async def test_lexical_only_ranking_makes_no_calls(self):
+        workflow = ContentDiscoveryWorkflow(ContentDiscoveryConfig(bm25_weight=1.0))
+
+        result = await workflow.process({"cast_text": "beach photos", "available_feeds": FEEDS})
+
+        self.assertEqual(result["candidates"][0]["cast_id"], "0xc")
+        self.assertEqual(self.backend.calls, 0)
+
+    async def test_near_duplicates_are_collapsed(self):
+        repost = {"text": "RT: Solidity auditor available for lending protocol reviews!", "author": "reposter", "hash": "0xe"}
+        feeds = FEEDS + [repost]
+
+        result = await ContentDiscoveryWorkflow().process({
+            "cast_text": "Looking for a solidity auditor for our lending protocol",
+            "available_feeds": feeds
+        })
+        kept_all = await ContentDiscoveryWorkflow(ContentDiscoveryConfig(dedup_threshold=0)).process({
+            "cast_text": "Looking for a solidity auditor for our lending protocol",
+            "available_feeds": feeds
+        })
+
+        self.assertEqual([c["cast_id"] for c in result["candidates"]], ["0xa", "0xb"])
+        self.assertEqual(result["duplicates_dropped"], 1)
+        self.assertIn("0xe", [c["cast_id"] for c in kept_all["candidates"]])
+        self.assertEqual(kept_all["duplicates_dropped"], 0)
+
+    async def test_spam_is_dropped_before_ranking(self):
+        spam = {"text": "Solidity auditor airdrop for lending protocol users, claim your tokens", "author": "spammer", "hash": "0xf"}
+        spam_filter = SpamFilter()
+
+        result = await ContentDiscoveryWorkflow(spam_filter=spam_filter).process({
+            "cast_text": "Looking for a solidity auditor for our lending protocol",
+            "available_feeds": [spam] + FEEDS
+        })
+
+        self.assertNotIn("0xf", [c["cast_id"] for c in result["candidates"]])
+        self.assertEqual(result["spam_dropped"], 1)
+        self.assertEqual(spam_filter.stats()["hits"], {"airdrop": 1})
+
+class TestReplyPipeline(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeBackend(dimensions=256)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+        self.pipeline = ReplyPipeline(spam_filter=SpamFilter())
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_pipeline_discovers_content_locally(self):
+        response = await self.pipeline.process(CastInput(
+            cast_text="Looking for a solidity auditor for our lending protocol",
+            user_id="1", cast_id="0x1", available_feeds=FEEDS + [{"text": "Airdrop for solidity auditors", "hash": "0xf"}]
+        ))
+
+        self.assertTrue(response.intent_analysis.should_reply)
+        self.assertEqual(response.recommended_replies[0].cast_id, "0xa")
+        self.assertEqual(response.spam_dropped, 1)
+        self.assertIn("auditor", response.selected_reply.text)
+        # Intent check and one embeddings call; the reply is rendered locally
+        self.assertEqual(self.backend.calls, 2)
+
+    async def test_pipeline_stops_without_intent(self):
+        response = await self.pipeline.process(CastInput(
+            cast_text="gm farcaster", user_id="1", cast_id="0x1", available_feeds=FEEDS
+        ))
+
+        self.assertFalse(response.intent_analysis.should_reply)
+        self.assertIsNone(response.recommended_replies)
+        self.assertIsNone(response.selected_reply)
+        self.assertEqual(self.backend.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests for near-duplicate detection
+"""
+import random
+import string
+import unittest
+
+from app.services.dedup import MinHasher, NearDuplicateFilter, collapse_near_duplicates, shingles
+
+POST = "Just shipped the new frames SDK, check it out https://example.com/a"
+
+class TestDedup(unittest.TestCase):
+    def test_shingles_ignore_case_links_and_punctuation(self):
+        self.assertEqual(shingles("Hi, THERE! https://x.y/z", size=4), shingles("hi there", size=4))
+        self.assertEqual(shingles("gm", size=4), ["gm"])
+        self.assertEqual(shingles(" ... "), [])
+
+    def test_signatures_estimate_jaccard_similarity(self):
+        hasher = MinHasher()
+
+        def similarity(a, b):
+            return (hasher.signature(a) == hasher.signature(b)).mean()
+
+        self.assertEqual(similarity(POST, "just shipped the new frames sdk!! check it out"), 1.0)
+        self.assertGreater(similarity(POST, POST.replace("check it out", "check it out now")), 0.7)
+        self.assertLess(similarity(POST, "gm everyone, coffee time"), 0.2)
+
+    def test_collapse_keeps_the_first_of_each_group(self):
+        items = [
+            {"text": POST, "rank": 1},
+            {"text": "gm everyone", "rank": 2},
+            {"text": "RT " + POST.replace("/a", "/b"), "rank": 3},
+            {"text": "GM everyone!", "rank": 4},
+        ]
+
+        kept, dropped = collapse_near_duplicates(items, 0.8, key=lambda item: item["text"])
+
+        self.assertEqual([item["rank"] for item in kept], [1, 2])
+        self.assertEqual(dropped, 2)
+
+    def test_threshold_of_zero_keeps_everything(self):
+        self.assertEqual(collapse_near_duplicates([POST, POST], 0, key=str), ([POST, POST], 0))
+
+    def test_filter_grows_past_its_initial_capacity(self):
+        rng = random.Random(0)
+        texts = ["".join(rng.choices(string.ascii_lowercase + " ", k=60)) for _ in range(40)]
+        seen = NearDuplicateFilter(0.8)
+
+        self.assertEqual(sum(seen.is_duplicate(text) for text in texts), 0)
+        self.assertTrue(seen.is_duplicate(texts[0].upper()))
+
+if __name__ == '__main__':
+    unittest.main()
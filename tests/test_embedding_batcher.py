@@ -0,0 +1,56 @@
+"""
+Tests for the embeddings micro-batching service
+"""
+import asyncio
+import unittest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+class TestEmbeddingBatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.calls = []
+
+    async def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0)
+        return [[float(len(text))] for text in texts]
+
+    async def test_concurrent_requests_are_coalesced(self):
+        batcher = EmbeddingBatcher(self.embed_batch, window_ms=10, max_batch_size=100)
+
+        vectors = await asyncio.gather(*[batcher.embed("a" * i) for i in range(1, 21)])
+
+        self.assertEqual(vectors, [[float(i)] for i in range(1, 21)])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(batcher.stats()["batches"], 1)
+        self.assertEqual(batcher.stats()["requests"], 20)
+
+    async def test_max_batch_size_splits_batches(self):
+        batcher = EmbeddingBatcher(self.embed_batch, window_ms=50, max_batch_size=4)
+
+        await asyncio.gather(*[batcher.embed(str(i)) for i in range(10)])
+
+        self.assertEqual([len(call) for call in self.calls], [4, 4, 2])
+
+    async def test_duplicate_texts_share_an_input(self):
+        batcher = EmbeddingBatcher(self.embed_batch, window_ms=10)
+
+        vectors = await asyncio.gather(*[batcher.embed("same") for _ in range(5)])
+
+        self.assertEqual(vectors, [[4.0]] * 5)
+        self.assertEqual(self.calls, [["same"]])
+
+    async def test_errors_reach_every_caller(self):
+        async def failing(texts):
+            raise RuntimeError("boom")
+
+        batcher = EmbeddingBatcher(failing, window_ms=10)
+        results = await asyncio.gather(
+            batcher.embed("a"), batcher.embed("b"), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(batcher.stats()["failed_batches"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
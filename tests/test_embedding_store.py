@@ -0,0 +1,73 @@
+"""
+Tests for the persistent embedding store
+"""
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore
+
+class TestEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = EmbeddingStore(self.tmpdir.name, model="text-embedding-3-small")
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        self.assertIsNone(self.store.get("hello"))
+
+        self.store.put("hello", [0.5, 0.25, 0.125])
+        vector = self.store.get("hello")
+
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertEqual(vector.tolist(), [0.5, 0.25, 0.125])
+        self.assertEqual(self.store.stats(), {"hits": 1, "misses": 1, "writes": 1, "vectors": 1})
+
+    def test_duplicate_puts_are_ignored(self):
+        self.store.put("hello", [1.0, 2.0])
+        self.store.put("hello", [3.0, 4.0])
+
+        self.assertEqual(self.store.get("hello").tolist(), [1.0, 2.0])
+        self.assertEqual(self.store.stats()["vectors"], 1)
+
+    def test_dimension_mismatch_is_rejected(self):
+        self.store.put("a", [1.0, 2.0])
+
+        with self.assertRaises(ValueError):
+            self.store.put("b", [1.0, 2.0, 3.0])
+
+    def test_vectors_are_shared_between_instances(self):
+        other = EmbeddingStore(self.tmpdir.name, model="text-embedding-3-small")
+        self.store.put("a", [1.0, 2.0])
+        other.put("b", [3.0, 4.0])
+
+        self.assertEqual(other.get("a").tolist(), [1.0, 2.0])
+        self.assertEqual(self.store.get("b").tolist(), [3.0, 4.0])
+        other.close()
+
+    def test_partial_row_from_a_crashed_append_is_dropped(self):
+        self.store.put("a", [1.0, 2.0])
+        # A writer that died after writing only part of a row
+        with open(self.store.vectors_path, "ab") as f:
+            f.write(b"\x00\x01\x02")
+
+        self.store.put("b", [3.0, 4.0])
+        self.store.put("c", [5.0, 6.0])
+
+        self.assertEqual(self.store.get("b").tolist(), [3.0, 4.0])
+        self.assertEqual(self.store.get("c").tolist(), [5.0, 6.0])
+        self.assertEqual(self.store.stats()["vectors"], 3)
+
+    def test_keys_include_the_model(self):
+        other = EmbeddingStore(self.tmpdir.name, model="another-model")
+        self.store.put("a", [1.0, 2.0])
+
+        self.assertIsNone(other.get("a"))
+        other.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Tests for the fake LLM backend
+"""
+import json
+import random
+import time
+import unittest
+
+from openai import APIStatusError, RateLimitError
+
+from app.models.fake_backend import FakeBackend, LatencyModel
+from app.models.llm import parse_latency
+from app.prompts import CONTENT_DISCOVERY_PROMPT, INTENT_CHECK_PROMPT, USER_SUMMARY_PROMPT
+
+class TestFakeBackend(unittest.IsolatedAsyncioTestCase):
+    async def test_answers_are_schema_valid(self):
+        backend = FakeBackend()
+
+        summary = json.loads((await backend.chat("o4-mini", [
+            {"role": "system", "content": USER_SUMMARY_PROMPT},
+            {"role": "user", "content": json.dumps({"bio": "frame builder"})},
+        ], json_mode=True)).content)
+        self.assertEqual(set(summary), {"keywords", "raw_summary"})
+
+        intent = json.loads((await backend.chat("o4-mini", [
+            {"role": "system", "content": INTENT_CHECK_PROMPT},
+            {"role": "user", "content": "Looking for a solidity auditor?"},
+        ], json_mode=True)).content)
+        self.assertTrue(intent["should_reply"])
+        self.assertTrue(0 <= intent["confidence"] <= 1)
+
+        discovery = json.loads((await backend.chat("o4-mini", [
+            {"role": "system", "content": CONTENT_DISCOVERY_PROMPT},
+            {"role": "user", "content": json.dumps({
+                "cast_text": "solidity auditor",
+                "feeds": [{"text": "gm"}, {"text": "I audit solidity contracts", "author": "auditor"}],
+            })},
+        ], json_mode=True)).content)
+        self.assertEqual(discovery["selected_content"]["author_username"], "auditor")
+
+    async def test_embeddings_are_deterministic_unit_vectors(self):
+        backend = FakeBackend(dimensions=16)
+        result = await backend.embed("text-embedding-3-small", ["a", "b", "a"])
+
+        self.assertEqual(result.vectors[0], result.vectors[2])
+        self.assertNotEqual(result.vectors[0], result.vectors[1])
+        self.assertAlmostEqual(sum(value * value for value in result.vectors[0]), 1.0)
+
+    async def test_failure_injection(self):
+        with self.assertRaises(RateLimitError):
+            await FakeBackend(rate_limit_rate=1.0).embed("text-embedding-3-small", ["a"])
+        with self.assertRaises(APIStatusError):
+            await FakeBackend(error_rate=1.0).embed("text-embedding-3-small", ["a"])
+
+    async def test_latency(self):
+        backend = FakeBackend(latency=LatencyModel("fixed", mean=0.05))
+        start = time.perf_counter()
+        await backend.embed("text-embedding-3-small", ["a"])
+
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_parse_latency(self):
+        rng = random.Random(0)
+        self.assertEqual(parse_latency("fixed:0.5").sample(rng), 0.5)
+        self.assertTrue(0.2 <= parse_latency("uniform:0.2:0.4").sample(rng) <= 0.4)
+        self.assertGreater(parse_latency("lognormal:0.8:0.3").sample(rng), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Tests for the shared feed set
+"""
+import unittest
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_embeddings, get_response_cache, set_backend
+from app.services.feed_set import SharedFeedSet
+from app.services.spam_filter import SpamFilter
+from app.workflows.content_discovery import ContentDiscoveryConfig
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+
+class TestSharedFeedSet(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeBackend(dimensions=256)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+        self.feeds = [
+            {"text": f"Weekend photo dump number {i} from the beach", "author": f"user{i}", "hash": f"0x{i}"}
+            for i in range(12)
+        ]
+        self.feeds += [
+            {"text": "Solidity auditor available for lending protocol reviews", "author": {"username": "auditor"}, "hash": "0xa"},
+            {"text": "Solidity auditor available for lending protocol reviews", "author": "copycat", "hash": "0xc"},
+            {"text": "Claim your free airdrop tokens today", "author": "spammer", "hash": "0xs"},
+            {"content": "", "author": "empty"},
+        ]
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    def test_prepare_normalizes_and_filters_once(self):
+        feed_set = SharedFeedSet.prepare(self.feeds, SpamFilter())
+
+        self.assertEqual(len(feed_set.feeds), 13)
+        self.assertEqual(feed_set.spam_dropped, 1)
+        self.assertEqual(feed_set.feeds[12], {
+            "text": "Solidity auditor available for lending protocol reviews",
+            "author_username": "auditor",
+            "cast_hash": "0xa",
+        })
+
+    async def test_casts_reuse_the_shared_embeddings(self):
+        feed_set = SharedFeedSet.prepare(self.feeds, SpamFilter())
+        self.assertEqual(await feed_set.embed(get_embeddings), 13)
+        self.assertEqual(await feed_set.embed(get_embeddings), 0)
+        calls_after_embedding = self.backend.calls
+
+        workflow = ReplyGenerationWorkflow(
+            discovery_config=ContentDiscoveryConfig(prefilter_top_k=2, similarity_threshold=0.2)
+        )
+        casts = [
+            "Looking for a solidity auditor for our lending protocol",
+            "Anyone know a solidity auditor for a lending protocol?",
+        ]
+        results = [await workflow.process({"cast_text": cast, "feed_set": feed_set}) for cast in casts]
+
+        for result in results:
+            self.assertEqual(result["reply"]["link"], "https://farcaster.xyz/auditor/0xa")
+            self.assertEqual(result["spam_dropped"], 1)
+            self.assertNotIn("feed_set", result)
+        # Per cast: intent check, the cast's embedding and discovery; no feed is embedded again
+        self.assertEqual(self.backend.calls - calls_after_embedding, 6)
+
+if __name__ == '__main__':
+    unittest.main()
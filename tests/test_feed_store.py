@@ -0,0 +1,117 @@
+"""
+Tests for the ingested feed store
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services.feed_store import FeedStore
+
+class TestFeedStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "feeds.sqlite")
+        self.embedded = []
+        self.failing = set()
+        self.store = FeedStore(self.path, embed=self.embed)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    async def embed(self, text):
+        if text in self.failing:
+            raise RuntimeError("embedding failed")
+        self.embedded.append(text)
+        return [float(len(text)), 0.0]
+
+    async def test_items_are_normalised_and_keyed_by_hash(self):
+        counts = self.store.upsert([
+            {"text": " gm ", "author": {"username": "alice"}, "hash": "0x1", "extra": "dropped"},
+            {"text": "no hash"},
+            {"hash": "0x2"},
+        ])
+
+        self.assertEqual(counts, {"accepted": 1, "rejected": 2, "pending": 1})
+        found, missing = self.store.get_many(["0x1", "0x9"])
+        self.assertEqual(found, [{"text": "gm", "author_username": "alice", "cast_hash": "0x1"}])
+        self.assertEqual(missing, ["0x9"])
+
+    async def test_only_new_or_changed_text_is_embedded(self):
+        self.store.upsert([{"text": "one", "hash": "a"}, {"text": "two", "hash": "b"}])
+        self.assertEqual(await self.store.embed_pending(), 2)
+
+        self.store.upsert([{"text": "one", "hash": "a"}, {"text": "two, edited", "hash": "b"}])
+        self.assertEqual(self.store.pending(), ["b"])
+        await self.store.embed_pending()
+
+        self.assertEqual(self.embedded, ["one", "two", "two, edited"])
+        self.assertEqual(self.store.stats()["unchanged"], 1)
+        np.testing.assert_allclose(self.store.vector_for({"text": "one", "hash": "a"}), [1.0, 0.0])
+
+    async def test_vector_requires_matching_text(self):
+        self.store.upsert([{"text": "one", "hash": "a"}])
+        await self.store.embed_pending()
+
+        self.assertIsNone(self.store.vector_for({"text": "other", "hash": "a"}))
+        self.assertIsNone(self.store.vector_for({"text": "one", "hash": "z"}))
+
+    async def test_failed_embeddings_stay_pending(self):
+        self.failing.add("bad")
+        self.store.upsert([{"text": "good", "hash": "a"}, {"text": "bad", "hash": "b"}])
+
+        self.assertEqual(await self.store.embed_pending(), 1)
+        self.assertEqual(self.store.pending(), ["b"])
+        self.assertEqual(self.store.stats()["embedding_errors"], 1)
+
+        self.failing.clear()
+        self.assertEqual(await self.store.embed_pending(), 1)
+        self.assertEqual(self.store.pending(), [])
+
+    async def test_items_and_vectors_survive_restart(self):
+        self.store.upsert([{"text": "one", "hash": "a"}, {"text": "two", "hash": "b"}])
+        await self.store.embed_pending()
+        self.store.delete(["b"])
+        self.store.close()
+
+        reopened = FeedStore(self.path, embed=self.embed)
+
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(reopened.pending(), [])
+        np.testing.assert_allclose(reopened.vector_for({"text": "one", "hash": "a"}), [1.0, 0.0])
+        reopened.close()
+
+    async def test_stale_items_expire(self):
+        store = FeedStore(ttl=60)
+        with patch("app.services.feed_store.time.time", return_value=1000.0):
+            store.upsert([{"text": "old", "hash": "a"}])
+        with patch("app.services.feed_store.time.time", return_value=1100.0):
+            store.upsert([{"text": "new", "hash": "b"}])
+
+        self.assertNotIn("a", store)
+        self.assertIn("b", store)
+        self.assertEqual(store.stats()["expired"], 1)
+
+    async def test_concurrent_upserts_and_reads(self):
+        store = FeedStore()
+
+        def ingest(worker):
+            for batch in range(20):
+                store.upsert([{"text": f"{worker} {batch} {i}", "hash": f"{worker}-{batch}-{i}"} for i in range(50)])
+
+        def read():
+            for _ in range(200):
+                store.pending()
+                store.stats()
+
+        # Upserts grow the item dict while other threads list pending items
+        await asyncio.gather(*[asyncio.to_thread(ingest, worker) for worker in range(3)], asyncio.to_thread(read))
+
+        self.assertEqual(store.stats()["pending"], 3000)
+
+if __name__ == '__main__':
+    unittest.main()
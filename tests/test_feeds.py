@@ -0,0 +1,43 @@
+"""
+Tests for the feed helpers
+"""
+import unittest
+
+import numpy as np
+
+from app.services.feeds import cosine_scores, feed_field, feed_text, normalize_feed, top_k_similar
+
+class TestFeeds(unittest.TestCase):
+    def test_feed_field_flattens_author_objects(self):
+        feed = {"author": {"username": "alice"}, "content": "hello"}
+
+        self.assertEqual(feed_field(feed, "author_username", "author"), "alice")
+        self.assertEqual(feed_text(feed), "hello")
+        self.assertEqual(feed_field(feed, "missing"), "")
+
+    def test_normalize_feed_keeps_known_fields(self):
+        feed = {"content": " hi ", "username": "bob", "cast_hash": "0x1", "channel": "", "likes": 3}
+
+        self.assertEqual(
+            normalize_feed(feed), {"text": "hi", "author_username": "bob", "cast_hash": "0x1"}
+        )
+
+    def test_cosine_scores_handle_zero_vectors(self):
+        scores = cosine_scores([1.0, 0.0], [[2.0, 0.0], [0.0, 1.0], [0.0, 0.0]])
+
+        np.testing.assert_allclose(scores, [1.0, 0.0, 0.0])
+
+    def test_top_k_similar_ranks_and_applies_threshold(self):
+        vectors = [[0.0, 1.0], [1.0, 0.1], [1.0, 0.0], [1.0, 1.0], [-1.0, 0.0]]
+
+        ranked = top_k_similar([1.0, 0.0], vectors, top_k=3, threshold=0.8)
+
+        self.assertEqual([index for index, _ in ranked], [2, 1])
+        self.assertAlmostEqual(ranked[0][1], 1.0)
+
+    def test_top_k_similar_with_more_k_than_rows(self):
+        self.assertEqual(len(top_k_similar([1.0], [[1.0], [2.0]], top_k=10)), 2)
+        self.assertEqual(top_k_similar([1.0], [], top_k=10), [])
+
+if __name__ == '__main__':
+    unittest.main()
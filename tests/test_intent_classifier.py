@@ -0,0 +1,138 @@
+"""
+Tests for the intent pre-classifier
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_response_cache, set_backend
+from app.services.intent_classifier import IntentPreClassifier, read_intent_log
+from app.services.metrics import metrics
+from app.services.text_features import train_linear_model
+from app.workflows.content_discovery import ContentDiscoveryConfig
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+
+WORDS = "gm frens shipped coffee today weekend frame zora music nft solidity audit builder photo".split()
+ASKS = ["anyone know a good", "looking for", "can you recommend", "need help with", "?"]
+
+def intent_examples(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    examples = []
+    for _ in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))
+        asks = rng.random() < 0.3
+        if asks:
+            text = f"{rng.choice(ASKS)} {text}"
+        examples.append((text, asks))
+    return examples
+
+class TestIntentPreClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        examples = intent_examples(1500)
+        cls.model = train_linear_model(
+            [text for text, _ in examples], [label for _, label in examples], dimensions=1 << 14
+        )
+
+    def test_trained_model_separates_the_classes(self):
+        held_out = intent_examples(300, seed=1)
+        classifier = IntentPreClassifier(model=self.model, threshold=0.05)
+
+        skipped = [label for text, label in held_out if classifier.classify(text) is not None]
+        self.assertGreater(len(skipped), 150)
+        self.assertFalse(any(skipped))
+        self.assertEqual(classifier.stats()["checked"], 300)
+        self.assertEqual(classifier.stats()["skipped"], len(skipped))
+
+    def test_clear_negative_gets_a_negative_intent(self):
+        classifier = IntentPreClassifier(model=self.model)
+
+        intent = classifier.classify("gm frens coffee today")
+        self.assertEqual(intent["should_reply"], False)
+        self.assertEqual(intent["identified_needs"], [])
+        self.assertGreater(intent["confidence"], 0.95)
+        self.assertIsNone(classifier.classify("looking for a solidity audit?"))
+
+    def test_without_a_model_everything_is_forwarded(self):
+        classifier = IntentPreClassifier()
+
+        self.assertIsNone(classifier.classify("gm"))
+        self.assertFalse(classifier.is_clear_negative("gm"))
+        self.assertEqual(classifier.stats()["forwarded"], 1)
+
+    def test_saved_model_is_loaded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "intent.npz")
+            self.model.save(path)
+            classifier = IntentPreClassifier(path)
+
+        self.assertTrue(classifier.stats()["model"])
+        self.assertTrue(classifier.is_clear_negative("gm frens coffee today"))
+        self.assertEqual(classifier.stats()["checked"], 0)
+
+    def test_decisions_are_logged_for_training(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "intent.jsonl")
+            classifier = IntentPreClassifier(log_path=path)
+            asyncio.run(classifier.record("need an auditor?", {"should_reply": True, "confidence": 0.9}))
+            asyncio.run(classifier.record("gm", {"should_reply": False, "confidence": 0.8}))
+            with open(path, "a") as f:
+                f.write("not json\n" + json.dumps({"text": "missing fields"}) + "\n")
+
+            self.assertEqual(list(read_intent_log(path)), [("need an auditor?", True), ("gm", False)])
+            self.assertEqual(classifier.stats()["logged"], 2)
+
+class TestPreClassifiedWorkflow(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.backend = FakeBackend(dimensions=8)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+        examples = intent_examples(1500)
+        model = train_linear_model(
+            [text for text, _ in examples], [label for _, label in examples], dimensions=1 << 14
+        )
+        self.pre_classifier = IntentPreClassifier(model=model)
+        self.workflow = ReplyGenerationWorkflow(pre_classifier=self.pre_classifier)
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_clear_negative_skips_every_model_call(self):
+        result = await self.workflow.process({"cast_text": "gm frens coffee today", "available_feeds": []})
+
+        self.assertFalse(result["intent_analysis"]["should_reply"])
+        self.assertEqual(result["reply"]["reply_text"], "No response needed for this cast.")
+        self.assertEqual(self.backend.calls, 0)
+        self.assertEqual(metrics.snapshot()["counters"]["intent_pre_classifier.skipped"], 1)
+
+    async def test_uncertain_cast_reaches_the_intent_model(self):
+        result = await self.workflow.process({"cast_text": "looking for a solidity audit?", "available_feeds": []})
+
+        self.assertTrue(result["intent_analysis"]["should_reply"])
+        # Intent check and content discovery
+        self.assertEqual(self.backend.calls, 2)
+
+    async def test_cast_is_scored_once(self):
+        workflow = ReplyGenerationWorkflow(
+            discovery_config=ContentDiscoveryConfig(speculative=True), pre_classifier=self.pre_classifier
+        )
+        cast = {"cast_text": "looking for a solidity audit?", "available_feeds": []}
+        with patch.object(self.pre_classifier, "probability", wraps=self.pre_classifier.probability) as score:
+            result = await workflow.process(cast)
+            self.assertEqual(score.call_count, 1)
+
+            probability = self.pre_classifier.probability(cast["cast_text"])
+            again = await workflow.process({**cast, "reply_probability": probability})
+            self.assertEqual(score.call_count, 2)
+
+        self.assertEqual(again["intent_analysis"], result["intent_analysis"])
+        self.assertNotIn("reply_probability", result)
+
+if __name__ == '__main__':
+    unittest.main()
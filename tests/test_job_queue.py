@@ -0,0 +1,236 @@
+"""
+Tests for the job queue
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_response_cache, set_backend
+from app.services.job_queue import JobQueue
+from app.workflows.user_summary import UserSummaryWorkflow
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jobs.db")
+        self.queues = []
+        self.running = 0
+        self.max_running = 0
+        self.failures = {}
+
+    async def asyncTearDown(self):
+        for queue in self.queues:
+            await queue.stop()
+            queue.close()
+        self.directory.cleanup()
+
+    async def double(self, payload):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures.get(payload["n"], 0) > 0:
+                self.failures[payload["n"]] -= 1
+                raise RuntimeError("temporarily unavailable")
+            return {"n": payload["n"] * 2, "vector": np.ones(2, dtype=np.float32)}
+        finally:
+            self.running -= 1
+
+    def queue(self, **kwargs):
+        kwargs.setdefault("poll_interval", 0.01)
+        queue = JobQueue(self.double, self.path, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    async def wait_for(self, queue, job_ids, timeout=5.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            jobs, _ = queue.get_many(job_ids)
+            if all(job["status"] in ("done", "failed") for job in jobs):
+                return jobs
+            await asyncio.sleep(0.01)
+        self.fail("jobs did not finish")
+
+    async def test_jobs_run_with_bounded_workers(self):
+        queue = self.queue(concurrency=3)
+        queue.start()
+        job_ids = queue.submit([{"n": n} for n in range(12)])
+
+        jobs = await self.wait_for(queue, job_ids)
+
+        self.assertEqual([job["result"]["n"] for job in jobs], [n * 2 for n in range(12)])
+        self.assertEqual(jobs[0]["result"]["vector"], [1.0, 1.0])
+        self.assertEqual(self.max_running, 3)
+        stats = queue.stats()
+        self.assertEqual((stats["submitted"], stats["completed"], stats["done"]), (12, 12, 12))
+
+    async def test_failures_are_retried_then_marked_failed(self):
+        self.failures = {1: 1, 2: 5}
+        queue = self.queue(max_attempts=3, retry_delay=0.01)
+        queue.start()
+        job_ids = queue.submit([{"n": 1}, {"n": 2}])
+
+        retried, failed = await self.wait_for(queue, job_ids)
+
+        self.assertEqual((retried["status"], retried["attempts"], retried["result"]), ("done", 2, {"n": 2, "vector": [1.0, 1.0]}))
+        self.assertIsNone(retried["error"])
+        self.assertEqual((failed["status"], failed["attempts"]), ("failed", 3))
+        self.assertEqual(failed["error"], "temporarily unavailable")
+        self.assertEqual(queue.stats()["retried"], 3)
+
+    async def test_jobs_with_lapsed_leases_are_reclaimed(self):
+        first = self.queue(lease=0.05)
+        job_ids = first.submit([{"n": n} for n in range(3)])
+        # A job claimed by a process that then crashed without renewing its lease
+        first._claim()
+        first.close()
+
+        second = self.queue()
+        self.assertEqual(second.get(job_ids[0])["status"], "running")
+        second.start()
+        jobs = await self.wait_for(second, job_ids)
+
+        self.assertTrue(all(job["status"] == "done" for job in jobs))
+        self.assertEqual(jobs[0]["attempts"], 2)
+        self.assertEqual(second.stats()["recovered"], 1)
+
+    async def test_lapsed_jobs_out_of_attempts_are_failed(self):
+        first = self.queue(lease=0.05, max_attempts=1)
+        job_id, = first.submit([{"n": 1}])
+        first._claim()
+        first.close()
+
+        second = self.queue(max_attempts=1)
+        second.start()
+        job, = await self.wait_for(second, [job_id])
+
+        self.assertEqual((job["status"], job["attempts"]), ("failed", 1))
+        self.assertEqual(job["error"], "Lease lapsed on attempt 1")
+        self.assertEqual(self.max_running, 0)
+        self.assertEqual((second.stats()["failed"], second.stats()["recovered"]), (1, 0))
+
+    async def test_workers_survive_database_errors(self):
+        async def slow(payload):
+            await asyncio.sleep(0.3)
+            return payload["n"]
+
+        queue = JobQueue(slow, self.path, concurrency=1, poll_interval=0.01, lease=0.15)
+        self.queues.append(queue)
+        errors = {"_claim": 1, "_extend": 1}
+
+        def flaky(name):
+            method = getattr(queue, name)
+
+            def call(*args):
+                if errors[name]:
+                    errors[name] -= 1
+                    raise sqlite3.OperationalError("database is locked")
+                return method(*args)
+            return call
+
+        queue._claim, queue._extend = flaky("_claim"), flaky("_extend")
+        queue.start()
+        job_ids = queue.submit([{"n": 1}, {"n": 2}])
+
+        jobs = await self.wait_for(queue, job_ids)
+
+        self.assertEqual([job["result"] for job in jobs], [1, 2])
+        # Renewal carried on after the failed one, so the lease never lapsed
+        self.assertEqual([job["attempts"] for job in jobs], [1, 1])
+        self.assertEqual(errors, {"_claim": 0, "_extend": 0})
+        self.assertEqual(queue.stats()["recovered"], 0)
+
+    async def test_running_jobs_with_live_leases_are_left_alone(self):
+        first = self.queue(lease=60)
+        job_id, = first.submit([{"n": 1}])
+        first._claim()
+
+        second = self.queue()
+        second.start()
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(second.get(job_id)["status"], "running")
+        self.assertEqual(second.stats()["recovered"], 0)
+
+    async def test_queues_sharing_a_file_run_each_job_once(self):
+        runs = {}
+
+        async def record(payload):
+            runs[payload["n"]] = runs.get(payload["n"], 0) + 1
+            await asyncio.sleep(0.001)
+            return payload["n"]
+
+        queues = [JobQueue(record, self.path, concurrency=4, poll_interval=0.01) for _ in range(2)]
+        self.queues.extend(queues)
+        job_ids = queues[0].submit([{"n": n} for n in range(40)])
+        for queue in queues:
+            queue.start()
+
+        jobs = await self.wait_for(queues[0], job_ids)
+
+        self.assertTrue(all(job["status"] == "done" for job in jobs))
+        self.assertEqual(runs, {n: 1 for n in range(40)})
+        self.assertEqual(sum(queue.stats()["completed"] for queue in queues), 40)
+
+    async def test_stop_requeues_running_jobs(self):
+        started = asyncio.Event()
+
+        async def hang(payload):
+            started.set()
+            await asyncio.sleep(10)
+
+        queue = JobQueue(hang, self.path, poll_interval=0.01)
+        self.queues.append(queue)
+        queue.start()
+        job_id, = queue.submit([{"n": 1}])
+        await started.wait()
+
+        await queue.stop()
+
+        self.assertEqual(queue.get(job_id)["status"], "queued")
+
+    async def test_finished_jobs_expire(self):
+        queue = self.queue(ttl=0.05)
+        queue.start()
+        job_ids = queue.submit([{"n": 1}])
+        await self.wait_for(queue, job_ids)
+
+        await asyncio.sleep(0.1)
+
+        self.assertIsNone(queue.get(job_ids[0]))
+        self.assertEqual(queue.get_many(job_ids + ["unknown"]), ([], job_ids + ["unknown"]))
+        self.assertEqual(queue.stats()["expired"], 1)
+
+class TestUserSummaryJobs(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.previous_backend = set_backend(FakeBackend(dimensions=16))
+        get_response_cache().clear()
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_summary_job_result_matches_direct_run(self):
+        workflow = UserSummaryWorkflow()
+        queue = JobQueue(lambda payload: workflow.run({"user_data": payload["user_data"]}), poll_interval=0.01)
+        queue.start()
+        user_data = {"username": "alice", "bio": "Building frames for music NFTs"}
+        try:
+            job_id, = queue.submit([{"user_data": user_data}])
+            while queue.get(job_id)["status"] != "done":
+                await asyncio.sleep(0.01)
+            job = queue.get(job_id)
+        finally:
+            await queue.stop()
+            queue.close()
+
+        direct = await workflow.run({"user_data": user_data})
+        self.assertEqual(job["result"]["user_summary"], direct["user_summary"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+Tests for the shared LLM client layer
+"""
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.models import llm
+from app.services.embedding_store import EmbeddingStore
+
+class FakeCompletions:
+    def __init__(self, content, delay=0.0):
+        self.content = content
+        self.delay = delay
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delay)
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[float(len(text)), 0.2, 0.3])
+            for i, text in enumerate(kwargs["input"])
+        ])
+
+def fake_client(content="{}", delay=0.0):
+    return SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeCompletions(content, delay)),
+        embeddings=FakeEmbeddings(),
+    )
+
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        llm.get_response_cache().clear()
+
+    async def test_structured_response_is_parsed(self):
+        client = fake_client(json.dumps({"should_reply": True}))
+        with patch.object(llm, "get_client", return_value=client):
+            result = await llm.get_structured_response(
+                model=llm.get_reasoning_model(),
+                messages=[{"role": "user", "content": "hi"}],
+                response_format={"type": "object"},
+                timeout=5.0
+            )
+
+        self.assertEqual(result, {"should_reply": True})
+        self.assertEqual(client.chat.completions.calls[0]["timeout"], 5.0)
+
+    async def test_concurrent_calls_overlap(self):
+        client = fake_client(json.dumps({"ok": True}), delay=0.1)
+        with patch.object(llm, "get_client", return_value=client):
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                llm.get_structured_response(
+                    model=llm.get_reasoning_model(),
+                    messages=[{"role": "user", "content": str(i)}],
+                    response_format={"type": "object"}
+                )
+                for i in range(5)
+            ])
+            elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.3)
+
+    async def test_identical_requests_are_cached(self):
+        client = fake_client(json.dumps({"keywords": ["ai"]}))
+        request = {
+            "model": llm.get_reasoning_model(),
+            "messages": [{"role": "user", "content": "same"}],
+            "response_format": {"type": "object"},
+        }
+        with patch.object(llm, "get_client", return_value=client):
+            first = await llm.get_structured_response(**request, node="process_user_data")
+            second = await llm.get_structured_response(**request, node="process_user_data")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(client.chat.completions.calls), 1)
+
+    async def test_excluded_nodes_skip_the_cache(self):
+        client = fake_client(json.dumps({"reply_text": "hi", "link": ""}))
+        request = {
+            "model": llm.get_generation_model(),
+            "messages": [{"role": "user", "content": "same"}],
+            "response_format": {"type": "object"},
+        }
+        with patch.object(llm, "get_client", return_value=client), \
+                patch.object(llm.get_response_cache(), "exclude_nodes", {"generate_reply"}):
+            await llm.get_structured_response(**request, node="generate_reply")
+            await llm.get_structured_response(**request, node="generate_reply")
+
+        self.assertEqual(len(client.chat.completions.calls), 2)
+
+    async def test_concurrent_identical_requests_share_one_call(self):
+        client = fake_client(json.dumps({"should_reply": False}), delay=0.05)
+        request = {
+            "model": llm.get_reasoning_model(),
+            "messages": [{"role": "user", "content": "popular cast"}],
+            "response_format": {"type": "object"},
+        }
+        before = llm.get_llm_stats()["single_flight"]["collapsed"]
+        with patch.object(llm, "get_client", return_value=client), \
+                patch.object(llm.get_response_cache(), "enabled", False):
+            results = await asyncio.gather(*[
+                llm.get_structured_response(**request, node="check_reply_intent")
+                for _ in range(5)
+            ])
+
+        self.assertEqual(results, [{"should_reply": False}] * 5)
+        self.assertEqual(len(client.chat.completions.calls), 1)
+        self.assertEqual(llm.get_llm_stats()["single_flight"]["collapsed"] - before, 4)
+        results[0]["should_reply"] = True
+        self.assertFalse(results[1]["should_reply"])
+
+    async def test_embeddings(self):
+        client = fake_client()
+        with patch.object(llm, "get_client", return_value=client):
+            vector = await llm.get_embeddings("hello")
+
+        self.assertEqual(vector, [5.0, 0.2, 0.3])
+        self.assertEqual(client.embeddings.calls[0]["input"], ["hello"])
+
+    async def test_concurrent_embeddings_share_one_call(self):
+        client = fake_client()
+        with patch.object(llm, "get_client", return_value=client):
+            vectors = await asyncio.gather(
+                *[llm.get_embeddings("x" * i) for i in range(1, 11)]
+            )
+
+        self.assertEqual([vector[0] for vector in vectors], [float(i) for i in range(1, 11)])
+        self.assertEqual(len(client.embeddings.calls), 1)
+
+    async def test_stored_embeddings_skip_the_api(self):
+        client = fake_client()
+        with tempfile.TemporaryDirectory() as path:
+            store = EmbeddingStore(path, model=llm.get_embeddings_model())
+            with patch.object(llm, "get_client", return_value=client), \
+                    patch.object(llm, "_embedding_store", store):
+                first = await llm.get_embeddings("stored")
+                second = await llm.get_embeddings("stored")
+            store.close()
+
+        self.assertEqual(len(first), len(second))
+        for expected, stored in zip(first, second):
+            self.assertAlmostEqual(expected, stored, places=6)
+        self.assertEqual(len(client.embeddings.calls), 1)
+
+    @patch.object(llm, "OPENAI_API_KEY", "test-key")
+    async def test_client_is_shared(self):
+        try:
+            self.assertIs(llm.get_client(), llm.get_client())
+        finally:
+            await llm.close_client()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Tests for the token-budgeted prompt builder
+"""
+import json
+import time
+import unittest
+from unittest.mock import patch
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_response_cache, set_backend
+from app.nodes import process_user_data
+from app.prompts import PROMPTS
+from app.services import prompt_builder
+from app.services.metrics import metrics
+from app.services.prompt_builder import build_messages, compact_json, count_message_tokens, count_tokens
+
+class TestPromptBuilder(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        # Count with the local estimate, whether or not tiktoken is available
+        self.tiktoken = patch.object(prompt_builder, "tiktoken", None)
+        self.tiktoken.start()
+
+    def tearDown(self):
+        self.tiktoken.stop()
+
+    def test_registered_prompts_render_the_payload(self):
+        payload = {"cast_text": "hi", "feeds": []}
+        messages, _ = build_messages(PROMPTS["content_discovery"], payload, "o4-mini")
+
+        self.assertEqual(messages, PROMPTS["content_discovery"].render(payload=compact_json(payload)))
+
+    def test_compact_json_has_no_padding(self):
+        self.assertEqual(compact_json({"a": [1, 2], "b": "é"}), '{"a":[1,2],"b":"é"}')
+
+    def test_estimated_token_counts(self):
+        self.assertEqual(count_tokens("gm, farcaster!", "o4-mini"), 5)
+        self.assertEqual(count_tokens("internationalization", "o4-mini"), 3)
+        messages = [{"role": "system", "content": "gm"}, {"role": "user", "content": "gm"}]
+        self.assertEqual(count_message_tokens(messages, "o4-mini"), 3 + 2 * (3 + 1))
+
+    def test_lowest_priority_items_are_trimmed_to_budget(self):
+        feeds = [{"text": f"feed number {i} " + "word " * 20} for i in range(50)]
+        untrimmed, full_tokens = build_messages("system", {"cast_text": "hi", "feeds": feeds}, "o4-mini")
+
+        messages, tokens = build_messages(
+            "system", {"cast_text": "hi", "feeds": feeds}, "o4-mini",
+            budget=full_tokens // 2, trim=["feeds"], node="discovery"
+        )
+
+        payload = json.loads(messages[1]["content"])
+        self.assertLessEqual(tokens, full_tokens // 2)
+        self.assertEqual(tokens, count_message_tokens(messages, "o4-mini"))
+        self.assertEqual(payload["feeds"], feeds[:len(payload["feeds"])])
+        self.assertGreater(len(payload["feeds"]), 15)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["prompt_trimmed_items.discovery"], 50 - len(payload["feeds"]))
+        self.assertEqual(snapshot["ratios"]["prompt_tokens_per_call.discovery"], tokens)
+        self.assertNotIn("\n", untrimmed[1]["content"])
+
+    def test_trims_fields_in_order_and_reports_over_budget(self):
+        payload = {"cast_text": "word " * 100, "first": ["a " * 10] * 5, "second": ["b " * 10] * 5}
+
+        messages, tokens = build_messages("system", payload, "o4-mini", budget=50, trim=["first", "second"])
+
+        trimmed = json.loads(messages[1]["content"])
+        self.assertEqual((trimmed["first"], trimmed["second"]), ([], []))
+        self.assertGreater(tokens, 50)
+        self.assertEqual(metrics.snapshot()["counters"]["prompt.over_budget"], 1)
+
+    def test_no_budget_keeps_everything(self):
+        payload = {"items": list(range(100))}
+
+        messages, _ = build_messages("system", payload, "o4-mini", trim=["items"])
+
+        self.assertEqual(json.loads(messages[1]["content"]), payload)
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+class TestEncodingLoading(unittest.TestCase):
+    def setUp(self):
+        self.downloads = 0
+        self.available = False
+        fake_tiktoken = type("tiktoken", (), {"encoding_for_model": staticmethod(self.download)})
+        for patcher in (
+            patch.object(prompt_builder, "tiktoken", fake_tiktoken),
+            patch.dict(prompt_builder._encodings, clear=True),
+            patch.dict(prompt_builder._failed_at, clear=True),
+            patch.object(prompt_builder, "_loading", set()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def download(self, model):
+        self.downloads += 1
+        if not self.available:
+            raise ConnectionError("offline")
+        return FakeEncoding()
+
+    def wait_for_download(self, count):
+        deadline = time.monotonic() + 5
+        while self.downloads < count or prompt_builder._loading:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_counting_never_downloads_on_the_calling_thread(self):
+        self.assertEqual(count_tokens("gm, farcaster!", "o4-mini"), 5)
+        self.wait_for_download(1)
+
+        # A failure is not retried until the retry interval has passed
+        self.available = True
+        self.assertEqual(count_tokens("gm, farcaster!", "o4-mini"), 5)
+        self.assertEqual(self.downloads, 1)
+
+        prompt_builder._failed_at["o4-mini"] -= prompt_builder.ENCODING_RETRY_INTERVAL
+        count_tokens("gm, farcaster!", "o4-mini")
+        self.wait_for_download(2)
+        self.assertEqual(count_tokens("gm, farcaster!", "o4-mini"), 2)
+
+    def test_encodings_load_at_startup(self):
+        self.available = True
+        prompt_builder.load_encodings(["o4-mini"])
+
+        self.assertEqual(count_tokens("gm, farcaster!", "o4-mini"), 2)
+        self.assertEqual(self.downloads, 1)
+
+class TestUserDataPrompt(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.previous_backend = set_backend(FakeBackend(dimensions=8))
+        get_response_cache().clear()
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_oldest_casts_are_trimmed_first(self):
+        casts = [
+            {"text": f"cast {day} " + "filler " * 30, "timestamp": f"2025-01-{day:02d}"}
+            for day in range(1, 29)
+        ]
+        state = {"user_data": {"username": "alice", "recent_casts": casts}}
+
+        with patch.dict("app.nodes.PROMPT_TOKEN_BUDGETS", {"process_user_data": 400}):
+            with patch("app.nodes.get_structured_response") as mock_response:
+                mock_response.return_value = {"keywords": [], "raw_summary": ""}
+                state = await process_user_data(state)
+
+        payload = json.loads(mock_response.call_args.kwargs["messages"][1]["content"])
+        days = [cast["timestamp"] for cast in payload["recent_casts"]]
+        self.assertTrue(days)
+        self.assertEqual(days, [f"2025-01-{day:02d}" for day in range(28, 28 - len(days), -1)])
+        self.assertLessEqual(state["prompt_tokens"]["process_user_data"], 400)
+        self.assertEqual(mock_response.call_args.kwargs["messages"][0]["content"], PROMPTS["user_summary"].system)
+
+if __name__ == '__main__':
+    unittest.main()
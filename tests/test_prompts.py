@@ -0,0 +1,66 @@
+"""
+Tests for the prompt registry and prompt cache accounting
+"""
+import re
+import unittest
+
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_text_response, set_backend
+from app.prompts import PROMPTS, PromptTemplate
+from app.services.metrics import metrics
+
+class TestPromptTemplate(unittest.TestCase):
+    def test_system_prompts_have_no_placeholders(self):
+        for name, prompt in PROMPTS.items():
+            with self.subTest(name):
+                self.assertIsNone(re.search(r"\{[a-z_]+\}", prompt.system))
+
+    def test_variables_only_change_the_user_message(self):
+        prompt = PROMPTS["intent_keywords"]
+        first = prompt.render(cast_text="gm frens")
+        second = prompt.render(cast_text="launching a {frame}")
+
+        self.assertEqual(prompt.variables, ("cast_text",))
+        self.assertEqual([m["role"] for m in first], ["system", "user"])
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[1]["content"], "<cast_text>\ngm frens\n</cast_text>")
+        self.assertIn("launching a {frame}", second[1]["content"])
+
+    def test_missing_variable_raises(self):
+        prompt = PromptTemplate("Say {nothing}.", "{a} and {b}")
+
+        with self.assertRaises(KeyError):
+            prompt.render(a=1)
+        self.assertEqual(prompt.render(a=1, b=2)[0]["content"], "Say {nothing}.")
+
+class TestCachedPromptTokens(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.previous = set_backend(FakeBackend())
+        metrics.reset()
+
+    def tearDown(self):
+        set_backend(self.previous)
+        metrics.reset()
+
+    async def test_repeated_prefix_is_reported_as_cached(self):
+        system = "Follow these instructions carefully. " * 200
+        for cast in ("first cast", "second cast"):
+            await get_text_response(
+                "gpt-4.1-mini", PromptTemplate(system, "{cast_text}").render(cast_text=cast)
+            )
+
+        snapshot = metrics.snapshot()
+        cached = snapshot["counters"]["llm.cached_prompt_tokens"]
+        self.assertGreater(cached, 0)
+        self.assertEqual(cached % FakeBackend.PROMPT_CACHE_INCREMENT, 0)
+        self.assertEqual(snapshot["counters"]["llm.gpt-4.1-mini.cached_prompt_tokens"], cached)
+        self.assertGreater(snapshot["ratios"]["llm.prompt_cache_hit_rate"], 0.4)
+
+    async def test_short_prompts_are_not_cached(self):
+        for cast in ("first cast", "second cast"):
+            await get_text_response("gpt-4.1-mini", PROMPTS["cast_summary"].render(cast_text=cast))
+
+        self.assertEqual(metrics.snapshot()["counters"]["llm.cached_prompt_tokens"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests for the compact vector representations
+"""
+import unittest
+
+import numpy as np
+
+from app.services.quantization import (
+    VectorBlock,
+    binarize,
+    dequantize_int8,
+    hamming_distances,
+    quantize_int8,
+)
+
+def unit_vectors(count, dimensions=64, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def clustered_unit_vectors(count, dimensions=64, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions))
+    vectors = (centers[rng.integers(0, clusters, count)]
+               + 0.5 * rng.standard_normal((count, dimensions))).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class TestQuantization(unittest.TestCase):
+    def test_int8_round_trip_is_close(self):
+        vectors = unit_vectors(10)
+
+        codes, scales = quantize_int8(vectors)
+
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(np.abs(codes).max(), 127)
+        np.testing.assert_allclose(dequantize_int8(codes, scales), vectors, atol=0.01)
+
+    def test_int8_handles_zero_vectors(self):
+        codes, scales = quantize_int8(np.zeros((1, 4)))
+
+        np.testing.assert_array_equal(dequantize_int8(codes, scales), np.zeros((1, 4)))
+
+    def test_hamming_distances_count_sign_flips(self):
+        codes = binarize([[1.0] * 10, [-1.0] * 10, [1.0] * 7 + [-1.0] * 3])
+
+        distances = hamming_distances(codes, binarize([1.0] * 10)[0])
+
+        self.assertEqual(codes.shape, (3, 2))
+        self.assertEqual(distances.tolist(), [0, 10, 3])
+        odd_width = binarize([[1.0] * 20, [-1.0] * 20])
+        self.assertEqual(hamming_distances(odd_width, binarize([1.0] * 20)[0]).tolist(), [0, 20])
+
+class TestVectorBlock(unittest.TestCase):
+    def test_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            VectorBlock(4, "float16")
+
+    def test_grow_and_swap_remove(self):
+        vectors = unit_vectors(40)
+        for mode in ("none", "int8", "binary"):
+            block = VectorBlock(64, mode, capacity=4)
+            block.extend(vectors[:30])
+            block.append(vectors[30])
+            block.remove(0)
+
+            self.assertEqual(len(block), 30)
+            np.testing.assert_allclose(block.vectors([0])[0], vectors[30], atol=0.01)
+
+    def test_memory_per_vector(self):
+        sizes = {}
+        for mode in ("none", "int8", "binary"):
+            block = VectorBlock(1536, mode)
+            block.extend(unit_vectors(10, 1536))
+            sizes[mode] = block.nbytes / 10
+
+        self.assertEqual(sizes["none"], 1536 * 4)
+        self.assertEqual(sizes["int8"], 1536 + 4)
+        self.assertEqual(sizes["binary"], 1536 + 4 + 1536 // 8)
+
+    def test_quantized_search_matches_exact(self):
+        vectors = clustered_unit_vectors(2000)
+        queries = vectors[::100]
+        exact = VectorBlock(64)
+        exact.extend(vectors)
+        for mode, expected_recall in (("int8", 0.9), ("binary", 0.9)):
+            block = VectorBlock(64, mode)
+            block.extend(vectors)
+
+            recall = 0.0
+            for query in queries:
+                found, scores = block.search(query, 10)
+                np.testing.assert_allclose(scores, vectors[found] @ query, atol=0.02)
+                recall += len(set(found) & set(exact.search(query, 10)[0])) / 10
+            self.assertGreater(recall / len(queries), expected_recall, mode)
+
+    def test_search_with_more_rows_asked_for_than_stored(self):
+        block = VectorBlock(64, "binary")
+        block.extend(unit_vectors(3))
+
+        self.assertEqual(len(block.search(unit_vectors(1)[0], 10)[0]), 3)
+        self.assertEqual(len(VectorBlock(64).search(unit_vectors(1)[0], 10)[0]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
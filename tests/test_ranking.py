@@ -0,0 +1,54 @@
+"""
+Tests for the local ranking engine
+"""
+import unittest
+
+from app.services.ranking import BM25Index, hybrid_rank, tokenize
+
+class TestRanking(unittest.TestCase):
+    def setUp(self):
+        self.documents = [
+            "Solidity auditor available for lending protocol reviews",
+            "Weekend photos from the beach",
+            "Lending rates are up again this week",
+            "solidity solidity solidity tips",
+        ]
+
+    def test_tokenize_drops_stopwords_and_case(self):
+        self.assertEqual(tokenize("Looking for a Solidity auditor!"), ["looking", "solidity", "auditor"])
+
+    def test_bm25_prefers_rarer_and_more_terms(self):
+        index = BM25Index(self.documents)
+
+        scores = index.scores("solidity auditor for lending")
+
+        self.assertEqual(int(scores.argmax()), 0)
+        self.assertEqual(float(scores[1]), 0.0)
+        self.assertGreater(index.idf("auditor"), index.idf("solidity"))
+
+    def test_normalized_scores_are_bounded(self):
+        scores = BM25Index(self.documents).normalized_scores("solidity")
+
+        self.assertLessEqual(float(scores.max()), 1.0)
+        self.assertGreater(float(scores[3]), float(scores[0]))
+        self.assertEqual(BM25Index(self.documents).normalized_scores("the a").tolist(), [0.0] * 4)
+
+    def test_hybrid_rank_blends_signals(self):
+        vectors = [[0.0, 1.0], [1.0, 0.0], [0.0, 1.0], [0.0, 1.0]]
+
+        lexical = hybrid_rank("beach", self.documents)
+        semantic = hybrid_rank("beach", self.documents, [0.0, 1.0], vectors, bm25_weight=0.0)
+        blended = hybrid_rank("beach", self.documents, [1.0, 0.0], vectors, bm25_weight=0.5)
+
+        self.assertEqual(lexical[0].index, 1)
+        self.assertIsNone(lexical[0].semantic)
+        self.assertNotEqual(semantic[0].index, 1)
+        self.assertEqual(semantic[-1].index, 1)
+        self.assertEqual(blended[0].index, 1)
+        self.assertAlmostEqual(blended[0].score, 0.5 * blended[0].lexical + 0.5)
+
+    def test_empty_documents(self):
+        self.assertEqual(hybrid_rank("anything", []), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests for the LLM rate limiter and priority scheduler
+"""
+import asyncio
+import time
+import unittest
+
+from app.services.rate_limiter import LLMScheduler, TokenBucket, estimate_tokens, set_priority_lane
+
+class TestTokenBucket(unittest.TestCase):
+    def test_wait_time(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(bucket.wait_time(1), 0)
+
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.wait_time(1), 1.0, places=1)
+
+    def test_oversized_requests_wait_for_a_full_bucket(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(bucket.wait_time(1000), 0)
+
+class TestLLMScheduler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.scheduler = LLMScheduler(
+            limits={"o4-mini": {"rpm": 600, "tpm": 100000}},
+            lanes={"reply": 0, "default": 1, "summary": 2},
+        )
+
+    async def test_unlimited_models_pass_through(self):
+        await self.scheduler.acquire("unknown-model", 10 ** 9)
+        self.assertEqual(self.scheduler.stats(), {})
+
+    async def test_calls_wait_for_request_budget(self):
+        for _ in range(600):
+            await self.scheduler.acquire("o4-mini", 1)
+
+        start = time.monotonic()
+        await self.scheduler.acquire("o4-mini", 1)
+        self.assertGreater(time.monotonic() - start, 0.05)
+        self.assertEqual(self.scheduler.stats()["o4-mini"]["queued"], 1)
+
+    async def test_priority_lanes_are_served_first(self):
+        for _ in range(600):
+            await self.scheduler.acquire("o4-mini", 1)
+
+        order = []
+
+        async def call(lane):
+            set_priority_lane(lane)
+            await self.scheduler.acquire("o4-mini", 1)
+            order.append(lane)
+
+        tasks = [asyncio.ensure_future(call("summary")) for _ in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(call("reply")))
+        await asyncio.sleep(0)
+
+        depth = self.scheduler.stats()["o4-mini"]["queue_depth_by_lane"]
+        self.assertEqual(depth, {"summary": 2, "reply": 1})
+
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["reply", "summary", "summary"])
+
+    async def test_token_budget_and_settle(self):
+        await self.scheduler.acquire("o4-mini", 100000)
+        self.scheduler.settle("o4-mini", estimated=100000, actual=1000)
+
+        self.assertGreaterEqual(self.scheduler.stats()["o4-mini"]["tokens_available"], 98999)
+
+    async def test_penalize_pauses_dispatch(self):
+        await self.scheduler.acquire("o4-mini", 1)
+        self.scheduler.penalize("o4-mini", 0.1)
+
+        start = time.monotonic()
+        await self.scheduler.acquire("o4-mini", 1)
+        self.assertGreater(time.monotonic() - start, 0.08)
+        self.assertEqual(self.scheduler.stats()["o4-mini"]["rate_limited"], 1)
+
+    def test_estimate_tokens(self):
+        messages = [{"role": "user", "content": "x" * 400}]
+        self.assertEqual(estimate_tokens(messages, completion_tokens=50), 154)
+
+if __name__ == '__main__':
+    unittest.main()
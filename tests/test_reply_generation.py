@@ -5,48 +5,35 @@ import unittest
 from unittest.mock import patch, AsyncMock
 import json
 
-from app.workflows.reply_generation import ReplyGenerationWorkflow
+from app.models.fake_backend import FakeBackend
+from app.models.llm import get_embeddings, get_response_cache, set_backend
+from app.services.feed_store import FeedStore
+from app.services.metrics import metrics
+from app.workflows.content_discovery import ContentDiscoveryConfig
+from app.workflows.intent_analysis import IntentAnalysisConfig
+from app.workflows.reply_generation import ReplyGenerationConfig, ReplyGenerationWorkflow
 
-class TestReplyGenerationWorkflow(unittest.TestCase):
+class TestReplyGenerationWorkflow(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
+        self.backend = FakeBackend(dimensions=8)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
         self.workflow = ReplyGenerationWorkflow()
         self.test_cast = "What's the best way to learn AI?"
         self.test_feeds = [
             {
                 "text": "A comprehensive guide to learning AI",
                 "url": "https://example.com/ai-guide",
-                "author": "AI Expert",
+                "author": "ai_expert",
+                "hash": "0xabc123",
                 "timestamp": "2024-03-20T10:00:00Z"
             }
         ]
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
         
-    @patch('app.nodes.REASONING_MODEL.ainvoke')
-    @patch('app.nodes.GENERATION_MODEL.ainvoke')
-    async def test_reply_generation_workflow_positive(self, mock_gen, mock_reason):
-        # Mock the AI responses
-        mock_reason.side_effect = [
-            # Intent check response
-            AsyncMock(content=json.dumps({
-                "should_reply": True,
-                "identified_needs": ["learning_resources", "guidance"],
-                "confidence": 0.9
-            })),
-            # Content discovery response
-            AsyncMock(content=json.dumps({
-                "selected_content": {
-                    "title": "AI Learning Guide",
-                    "url": "https://example.com/ai-guide",
-                    "relevance_score": 0.85,
-                    "key_points": ["Start with basics", "Practice coding"]
-                }
-            }))
-        ]
-        
-        mock_gen.return_value = AsyncMock(content=json.dumps({
-            "reply_text": "Here's a great guide for learning AI!",
-            "link": "https://example.com/ai-guide"
-        }))
-        
+    async def test_reply_generation_workflow_positive(self):
         # Run the workflow
         result = await self.workflow.process({
             "cast_text": self.test_cast,
@@ -57,25 +44,34 @@ class TestReplyGenerationWorkflow(unittest.TestCase):
         self.assertIn("intent_analysis", result)
         self.assertTrue(result["intent_analysis"]["should_reply"])
         self.assertIn("reply", result)
-        self.assertIn("reply_text", result["reply"])
-        self.assertIn("link", result["reply"])
+        self.assertEqual(
+            result["reply"]["reply_text"],
+            "You should connect with ai_expert, who said: 'A comprehensive guide to learning AI'"
+        )
+        self.assertEqual(result["reply"]["link"], "https://farcaster.xyz/ai_expert/0xabc123")
         
-        # Verify the mocks were called
-        self.assertEqual(mock_reason.call_count, 2)
-        mock_gen.assert_called_once()
-        
-    @patch('app.nodes.REASONING_MODEL.ainvoke')
-    async def test_reply_generation_workflow_negative(self, mock_reason):
-        # Mock the AI response for negative case
-        mock_reason.return_value = AsyncMock(content=json.dumps({
-            "should_reply": False,
-            "identified_needs": [],
-            "confidence": 0.95
-        }))
+        # Intent check and content discovery; the reply is rendered locally
+        self.assertEqual(self.backend.calls, 2)
+
+    async def test_llm_reply_is_opt_in(self):
+        workflow = ReplyGenerationWorkflow(ReplyGenerationConfig(use_llm=True))
+        result = await workflow.process({
+            "cast_text": self.test_cast,
+            "available_feeds": self.test_feeds
+        })
+        # Intent check, content discovery and reply generation
+        self.assertEqual(self.backend.calls, 3)
+
+        rendered = await self.workflow.process({
+            "cast_text": self.test_cast,
+            "available_feeds": self.test_feeds
+        })
+        self.assertEqual(result["reply"], rendered["reply"])
         
+    async def test_reply_generation_workflow_negative(self):
         # Run the workflow
         result = await self.workflow.process({
-            "cast_text": self.test_cast,
+            "cast_text": "gm farcaster",
             "available_feeds": self.test_feeds
         })
         
@@ -86,7 +82,239 @@ class TestReplyGenerationWorkflow(unittest.TestCase):
         self.assertEqual(result["reply"]["reply_text"], "No response needed for this cast.")
         
         # Verify only intent check was called
-        mock_reason.assert_called_once()
+        self.assertEqual(self.backend.calls, 1)
+
+class TestFusedCastAnalysis(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeBackend(dimensions=8)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+        self.workflow = ReplyGenerationWorkflow(
+            intent_config=IntentAnalysisConfig(fused_summary=True)
+        )
+        self.feeds = [{"text": "A comprehensive guide to learning AI", "author": "ai_expert", "hash": "0xabc123"}]
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_summary_comes_from_the_intent_call(self):
+        result = await self.workflow.process({
+            "cast_text": "What's the best way to learn AI?",
+            "available_feeds": self.feeds
+        })
+
+        self.assertTrue(result["intent_analysis"]["should_reply"])
+        self.assertIn("learn", result["cast_summary"])
+        self.assertEqual(
+            result["reply"]["reply_text"],
+            "You should connect with ai_expert, who said: 'A comprehensive guide to learning AI'"
+        )
+        # Fused intent check and content discovery
+        self.assertEqual(self.backend.calls, 2)
+
+    async def test_stream_emits_the_summary_first(self):
+        events = [event async for event in self.workflow.stream({"cast_text": "gm farcaster"})]
+
+        self.assertEqual(
+            [name for name, _ in events],
+            ["cast_summary", "intent_analysis", "discovered_content", "reply"]
+        )
+        self.assertFalse(events[1][1]["should_reply"])
+        self.assertEqual(self.backend.calls, 1)
+
+class TestReplyGenerationStream(unittest.IsolatedAsyncioTestCase):
+    async def test_stream_emits_each_step(self):
+        workflow = ReplyGenerationWorkflow(ReplyGenerationConfig(use_llm=True))
+        reply = {"reply_text": "You should connect with ai_expert, who said: 'hi'", "link": ""}
+
+        async def fake_stream(**kwargs):
+            text = json.dumps(reply)
+            for i in range(0, len(text), 10):
+                yield text[i:i + 10]
+
+        responses = [
+            {"should_reply": True, "identified_needs": ["guidance"], "confidence": 0.9},
+            {
+                "selected_content": {"title": "AI Guide", "url": "", "relevance_score": 0.9, "key_points": []},
+                "relevance_score": 0.9,
+                "key_points": ["Start with basics"]
+            },
+        ]
+        with patch('app.nodes.get_structured_response', AsyncMock(side_effect=responses)), \
+                patch('app.nodes.stream_response', fake_stream):
+            events = [
+                event async for event in workflow.stream({
+                    "cast_text": "What's the best way to learn AI?",
+                    "available_feeds": []
+                })
+            ]
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[:2], ["intent_analysis", "discovered_content"])
+        self.assertEqual(names[-1], "reply")
+        self.assertTrue(all(name == "reply_delta" for name in names[2:-1]))
+        self.assertEqual("".join(data["text"] for name, data in events[2:-1]), json.dumps(reply))
+        self.assertEqual(events[-1][1], reply)
+
+    async def test_stream_stops_early_without_intent(self):
+        workflow = ReplyGenerationWorkflow()
+        intent = {"should_reply": False, "identified_needs": [], "confidence": 0.95}
+
+        with patch('app.nodes.get_structured_response', AsyncMock(return_value=intent)) as mock_response:
+            events = [event async for event in workflow.stream({"cast_text": "gm"})]
+
+        self.assertEqual([name for name, _ in events], ["intent_analysis", "discovered_content", "reply"])
+        self.assertEqual(events[-1][1]["reply_text"], "No response needed for this cast.")
+        mock_response.assert_called_once()
+
+class TestIntentCascade(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.workflow = ReplyGenerationWorkflow(
+            intent_config=IntentAnalysisConfig(
+                cascade_enabled=True, cascade_model="gpt-4.1-nano", confidence_threshold=0.7
+            )
+        )
+
+    async def test_confident_fast_tier_is_not_escalated(self):
+        fast = {"should_reply": False, "identified_needs": [], "confidence": 0.95}
+        with patch('app.nodes.get_structured_response', AsyncMock(return_value=fast)) as mock_response:
+            result = await self.workflow.process({"cast_text": "gm"})
+
+        self.assertFalse(result["intent_analysis"]["should_reply"])
+        mock_response.assert_called_once()
+        self.assertEqual(mock_response.call_args.kwargs["model"], "gpt-4.1-nano")
+        self.assertEqual(metrics.snapshot()["ratios"]["intent_cascade.escalation_rate"], 0.0)
+
+    async def test_uncertain_fast_tier_is_escalated(self):
+        responses = [
+            {"should_reply": True, "identified_needs": ["help"], "confidence": 0.4},
+            {"should_reply": False, "identified_needs": [], "confidence": 0.9},
+        ]
+        with patch('app.nodes.get_structured_response', AsyncMock(side_effect=responses)) as mock_response:
+            result = await self.workflow.process({"cast_text": "anyone around?"})
+
+        self.assertFalse(result["intent_analysis"]["should_reply"])
+        self.assertEqual(
+            [call.kwargs["model"] for call in mock_response.call_args_list],
+            ["gpt-4.1-nano", "o4-mini"]
+        )
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["ratios"]["intent_cascade.escalation_rate"], 1.0)
+        self.assertEqual(snapshot["latencies"]["intent_cascade.fast_tier"]["count"], 1)
+        self.assertEqual(snapshot["latencies"]["intent_cascade.reasoning_tier"]["count"], 1)
+
+    async def test_malformed_fast_tier_is_escalated(self):
+        reasoning = {"should_reply": False, "identified_needs": [], "confidence": 0.9}
+        for fast in (
+            ValueError("Failed to parse response: Expecting value"),
+            {"should_reply": False, "identified_needs": []},
+            {"should_reply": False, "identified_needs": [], "confidence": "high"},
+        ):
+            metrics.reset()
+            with patch('app.nodes.get_structured_response', AsyncMock(side_effect=[fast, reasoning])) as mock_response:
+                result = await self.workflow.process({"cast_text": "who can audit our contracts?"})
+
+            self.assertEqual(result["intent_analysis"], reasoning)
+            self.assertEqual(
+                [call.kwargs["model"] for call in mock_response.call_args_list],
+                ["gpt-4.1-nano", "o4-mini"]
+            )
+            snapshot = metrics.snapshot()
+            self.assertEqual(snapshot["counters"]["intent_cascade.fast_tier_errors"], 1)
+            self.assertEqual(snapshot["ratios"]["intent_cascade.escalation_rate"], 1.0)
+
+class TestFeedPrefilter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.backend = FakeBackend(dimensions=256)
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+        self.workflow = ReplyGenerationWorkflow(
+            discovery_config=ContentDiscoveryConfig(prefilter_top_k=2, similarity_threshold=0.2)
+        )
+        self.feeds = [
+            {"text": f"Weekend photo dump number {i} from the beach", "author": f"user{i}", "hash": f"0x{i}"}
+            for i in range(20)
+        ]
+        self.feeds.insert(7, {"text": "Solidity auditor available for lending protocol reviews", "author": "auditor", "hash": "0xa"})
+        self.feeds.insert(15, {"text": "Our lending protocol needs a solidity audit", "author": "builder", "hash": "0xb"})
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_only_similar_feeds_reach_the_model(self):
+        intent = {"should_reply": True, "identified_needs": ["audit"], "confidence": 0.9}
+        discovery = {
+            "selected_content": {"title": "", "url": "", "relevance_score": 0.9, "key_points": []},
+            "relevance_score": 0.9,
+            "key_points": []
+        }
+        with patch('app.nodes.get_structured_response', AsyncMock(side_effect=[intent, discovery])) as mock_response:
+            state = await self.workflow.check_intent({
+                "cast_text": "Looking for a solidity auditor for our lending protocol",
+                "available_feeds": self.feeds
+            })
+            await self.workflow.discover_content(state)
+
+        payload = json.loads(mock_response.call_args_list[1].kwargs["messages"][1]["content"])
+        self.assertEqual([feed["author"] for feed in payload["feeds"]], ["auditor", "builder"])
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["feed_prefilter.feeds_in"], 22)
+        self.assertEqual(counters["feed_prefilter.feeds_out"], 2)
+
+    async def test_near_duplicates_do_not_take_prefilter_slots(self):
+        repost = {"text": "Solidity auditor available for lending protocol reviews!!", "author": "reposter", "hash": "0xc"}
+        intent = {"should_reply": True, "identified_needs": ["audit"], "confidence": 0.9}
+        discovery = {
+            "selected_content": {"title": "", "url": "", "relevance_score": 0.9, "key_points": []},
+            "relevance_score": 0.9,
+            "key_points": []
+        }
+        with patch('app.nodes.get_structured_response', AsyncMock(side_effect=[intent, discovery])) as mock_response:
+            state = await self.workflow.check_intent({
+                "cast_text": "Looking for a solidity auditor for our lending protocol",
+                "available_feeds": [repost] + self.feeds
+            })
+            state = await self.workflow.discover_content(state)
+
+        payload = json.loads(mock_response.call_args_list[1].kwargs["messages"][1]["content"])
+        self.assertEqual(len(payload["feeds"]), 2)
+        self.assertIn("builder", [feed["author"] for feed in payload["feeds"]])
+        self.assertGreaterEqual(state["duplicates_dropped"], 1)
+        self.assertEqual(metrics.snapshot()["counters"]["feed_dedup.dropped"], state["duplicates_dropped"])
+
+    async def test_stored_feed_vectors_are_reused(self):
+        store = FeedStore(embed=get_embeddings)
+        store.upsert(self.feeds)
+        await store.embed_pending()
+        calls_after_ingest = self.backend.calls
+        workflow = ReplyGenerationWorkflow(
+            discovery_config=ContentDiscoveryConfig(prefilter_top_k=2, similarity_threshold=0.2),
+            feed_store=store
+        )
+        feeds, _ = store.get_many([feed["hash"] for feed in self.feeds])
+
+        result = await workflow.process({
+            "cast_text": "Looking for a solidity auditor for our lending protocol",
+            "available_feeds": feeds
+        })
+
+        self.assertEqual(result["reply"]["link"], "https://farcaster.xyz/auditor/0xa")
+        # Intent check, the cast's embedding and discovery
+        self.assertEqual(self.backend.calls - calls_after_ingest, 3)
+        self.assertEqual(metrics.snapshot()["counters"]["feed_embeddings.precomputed"], 22)
+
+    async def test_no_similar_feeds_skips_discovery(self):
+        result = await self.workflow.process({
+            "cast_text": "Anyone know a good sourdough recipe?",
+            "available_feeds": self.feeds
+        })
+
+        self.assertTrue(result["intent_analysis"]["should_reply"])
+        self.assertIsNone(result["discovered_content"])
+        # Intent check and one batched embeddings call
+        self.assertEqual(self.backend.calls, 2)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+Tests for the local reply renderer
+"""
+import unittest
+
+from app.services.reply_template import NO_CONTENT_REPLY, render_reply
+
+class TestRenderReply(unittest.TestCase):
+    def test_renders_the_prompt_format(self):
+        reply = render_reply({
+            "title": "Solidity auditor available",
+            "key_points": ["Solidity auditor available for lending protocol reviews"],
+            "author_username": "auditor",
+            "cast_hash": "0xa",
+            "channel_name": "security",
+        })
+
+        self.assertEqual(
+            reply["reply_text"],
+            "You should connect with auditor, who said: 'Solidity auditor available for lending protocol reviews'"
+            " Join the conversation in the /security channel."
+        )
+        self.assertEqual(reply["link"], "https://farcaster.xyz/auditor/0xa")
+
+    def test_falls_back_to_title_without_key_points(self):
+        reply = render_reply({"title": "gm builders", "key_points": [], "author_username": "dwr"})
+
+        self.assertEqual(reply, {"reply_text": "You should connect with dwr, who said: 'gm builders'", "link": ""})
+
+    def test_empty_selection(self):
+        self.assertEqual(render_reply(None), {"reply_text": NO_CONTENT_REPLY, "link": ""})
+        self.assertEqual(render_reply({"title": "", "author_username": "dwr"})["reply_text"], NO_CONTENT_REPLY)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests for the tiered response cache
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.services.response_cache import DiskTier, MemoryTier, ResponseCache, make_cache_key
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_is_order_independent(self):
+        messages = [{"role": "user", "content": "hi"}]
+        first = make_cache_key("o4-mini", messages, {"a": 1, "b": 2}, 1.0)
+        second = make_cache_key("o4-mini", messages, {"b": 2, "a": 1}, 1.0)
+        other = make_cache_key("o4-mini", messages, {"a": 1, "b": 2}, 0.5)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        tier = MemoryTier(max_entries=2)
+        tier.set("a", {"v": 1})
+        tier.set("b", {"v": 2})
+        tier.get("a")
+        evicted = tier.set("c", {"v": 3})
+
+        self.assertEqual(evicted, 1)
+        self.assertIsNone(tier.get("b"))
+        self.assertEqual(tier.get("a"), {"v": 1})
+
+    def test_memory_tier_expires_entries(self):
+        tier = MemoryTier(ttl=10)
+        tier.set("a", {"v": 1}, created_at=time.time() - 11)
+
+        self.assertIsNone(tier.get("a"))
+
+    async def test_disk_tier_survives_restart(self):
+        cache = ResponseCache(MemoryTier(), DiskTier(self.db_path))
+        await cache.set("key", {"should_reply": True})
+        cache.disk.close()
+
+        restarted = ResponseCache(MemoryTier(), DiskTier(self.db_path))
+        value = await restarted.get("key")
+
+        self.assertEqual(value, {"should_reply": True})
+        self.assertEqual(restarted.stats()["disk_hits"], 1)
+        self.assertEqual(restarted.stats()["memory_entries"], 1)
+        restarted.disk.close()
+
+    async def test_disk_tier_is_size_bounded(self):
+        disk = DiskTier(self.db_path, max_entries=3)
+        now = time.time()
+        with patch("app.services.response_cache.time.time", side_effect=[now + i for i in range(5)]):
+            for i in range(5):
+                disk.set(str(i), {"v": i})
+
+        self.assertIsNone(disk.get("0"))
+        self.assertIsNone(disk.get("1"))
+        self.assertEqual(disk.get("4")[1], {"v": 4})
+        disk.close()
+
+    async def test_counters(self):
+        cache = ResponseCache(MemoryTier())
+        await cache.get("missing")
+        await cache.set("key", {"v": 1})
+        await cache.get("key")
+
+        stats = cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_node_opt_in_and_out(self):
+        cache = ResponseCache(MemoryTier(), nodes=["check_reply_intent"], exclude_nodes=["generate_reply"])
+
+        self.assertTrue(cache.enabled_for("check_reply_intent"))
+        self.assertFalse(cache.enabled_for("process_user_data"))
+
+        cache = ResponseCache(MemoryTier(), exclude_nodes=["generate_reply"])
+        self.assertTrue(cache.enabled_for("process_user_data"))
+        self.assertFalse(cache.enabled_for("generate_reply"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+"""
+Tests for the similar users endpoint
+"""
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+import main
+
+class TestSimilarUsersEndpoint(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main.user_index.add("alice", [1.0, 0.0])
+        main.user_index.add("bob", [0.9, 0.1])
+
+    async def post(self, body):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/similar-users", json=body)
+
+    async def test_invalid_k_is_rejected(self):
+        for k in ("abc", 0, -3, 2.5, True, None):
+            with self.subTest(k=k):
+                response = await self.post({"user_id": "alice", "k": k})
+                self.assertEqual(response.status_code, 422)
+
+    async def test_large_k_is_capped(self):
+        with patch.object(main.user_index, "search", wraps=main.user_index.search) as search:
+            response = await self.post({"vector": [1.0, 0.0], "k": 10 ** 9})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(search.call_args.args[1], main.settings.similar_users_max_k)
+        self.assertEqual([result["user_id"] for result in response.json()["results"]][:2], ["alice", "bob"])
+
+if __name__ == '__main__':
+    unittest.main()
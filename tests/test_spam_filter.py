@@ -0,0 +1,129 @@
+"""
+Tests for the local spam filter
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.services.spam_filter import CLASSIFIER_RULE, SpamFilter
+from app.services.text_features import LinearModel, hashed_ngrams, ngrams
+
+class TestTextFeatures(unittest.TestCase):
+    def test_ngrams_and_hashed_features(self):
+        self.assertEqual(ngrams("Free $DEGEN now", n=2), ["free", "$degen", "now", "free $degen", "$degen now"])
+
+        features = hashed_ngrams("gm gm gm", dimensions=1024)
+
+        self.assertEqual(features.tolist(), sorted(set(features.tolist())))
+        self.assertEqual(len(features), 2)
+
+    def test_linear_model_round_trip(self):
+        weights = np.zeros(1024, dtype=np.float32)
+        weights[hashed_ngrams("moon", 1024, n=1)] = 5.0
+        model = LinearModel(weights, bias=-2.0, n=1)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "model.npz")
+            model.save(path)
+            loaded = LinearModel.load(path)
+
+        self.assertGreater(loaded.probability("to the moon"), 0.9)
+        self.assertLess(loaded.probability("sourdough tips"), 0.2)
+
+class TestSpamFilter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.rules_path = os.path.join(self.tmpdir.name, "rules.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_rules(self, rules, mtime):
+        with open(self.rules_path, "w") as f:
+            f.write(rules if isinstance(rules, str) else json.dumps(rules))
+        os.utime(self.rules_path, (mtime, mtime))
+
+    def test_default_rules_count_hits(self):
+        spam_filter = SpamFilter()
+        feeds = [
+            {"text": "Huge AIRDROP live now"},
+            {"text": "Claim your free tokens before midnight"},
+            {"text": "Our lending protocol needs a solidity audit"},
+            {"text": "Giveaway: connect your wallet to enter"},
+        ]
+
+        kept, dropped = spam_filter.filter(feeds)
+
+        self.assertEqual(kept, [feeds[2]])
+        self.assertEqual(dropped, 3)
+        stats = spam_filter.stats()
+        self.assertEqual(stats["checked"], 4)
+        self.assertEqual(stats["hits"], {"airdrop": 1, "claim_rewards": 1, "giveaway": 1})
+
+    def test_default_rules_need_crypto_context(self):
+        spam_filter = SpamFilter()
+        benign = [
+            {"text": "Send me the draft and I'll get back to you tonight"},
+            {"text": "Send feedback on the beta and receive early access"},
+            {"text": "Don't forget to claim your rewards at the hackathon booth after the talk"},
+            {"text": "I'd claim the best rewards program is still the airline one"},
+            {"text": "I'll give away my old keyboard to anyone who wants it"},
+            {"text": "Book giveaway at the library this weekend"},
+        ]
+        spam = [
+            {"text": "Send 0.1 ETH to this wallet and receive double back"},
+            {"text": "Claim your $DEGEN rewards before they expire"},
+            {"text": "claim rewards now by sending to 0xdeadbeef01"},
+            {"text": "Huge NFT giveaway, follow and retweet"},
+        ]
+
+        kept, dropped = spam_filter.filter(benign + spam)
+
+        self.assertEqual(kept, benign)
+        self.assertEqual(dropped, 4)
+        self.assertEqual(
+            spam_filter.stats()["hits"], {"send_to_receive": 1, "claim_rewards": 2, "giveaway": 1}
+        )
+
+    def test_rules_are_hot_reloaded(self):
+        self.write_rules({"raffle": r"\braffle\b"}, mtime=1000)
+        spam_filter = SpamFilter(self.rules_path, reload_interval=0)
+
+        self.assertEqual(spam_filter.match("Join the raffle"), "raffle")
+        self.assertIsNone(spam_filter.match("Huge airdrop"))
+
+        self.write_rules({"airdrop": "airdrop"}, mtime=2000)
+        self.assertEqual(spam_filter.match("Huge airdrop"), "airdrop")
+        self.assertIsNone(spam_filter.match("Join the raffle"))
+
+        self.write_rules("{not json", mtime=3000)
+        self.assertEqual(spam_filter.match("Huge airdrop"), "airdrop")
+        self.assertEqual(spam_filter.stats()["reloads"], 2)
+        self.assertEqual(spam_filter.stats()["reload_errors"], 1)
+
+    def test_reload_interval_limits_file_checks(self):
+        self.write_rules({"raffle": "raffle"}, mtime=1000)
+        spam_filter = SpamFilter(self.rules_path, reload_interval=3600)
+
+        self.write_rules({"airdrop": "airdrop"}, mtime=2000)
+
+        self.assertIsNone(spam_filter.match("airdrop"))
+        spam_filter.reload()
+        self.assertEqual(spam_filter.match("airdrop"), "airdrop")
+
+    def test_classifier_catches_what_rules_miss(self):
+        weights = np.zeros(1 << 10, dtype=np.float32)
+        weights[hashed_ngrams("dm me for alpha", 1 << 10)] = 2.0
+        model_path = os.path.join(self.tmpdir.name, "spam.npz")
+        LinearModel(weights, bias=-3.0).save(model_path)
+        spam_filter = SpamFilter(model_path=model_path, threshold=0.9)
+
+        self.assertEqual(spam_filter.match("DM me for alpha"), CLASSIFIER_RULE)
+        self.assertIsNone(spam_filter.match("alpha release of the SDK"))
+        self.assertEqual(spam_filter.match("massive airdrop"), "airdrop")
+        self.assertTrue(spam_filter.stats()["classifier"])
+
+if __name__ == '__main__':
+    unittest.main()
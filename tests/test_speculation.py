@@ -0,0 +1,157 @@
+"""
+Tests for speculative execution
+"""
+import asyncio
+import unittest
+
+from app.models import CastInput
+from app.models.fake_backend import FakeBackend, LatencyModel
+from app.models.llm import get_response_cache, set_backend
+from app.pipeline import PipelineConfig, ReplyPipeline
+from app.services.metrics import metrics
+from app.services.speculation import speculate
+from app.workflows.content_discovery import ContentDiscoveryConfig
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+
+FEEDS = [
+    {"text": "Solidity auditor available for lending protocol reviews", "author": "auditor", "hash": "0xa"},
+    {"text": "Weekend photo dump from the beach", "author": "photographer", "hash": "0xb"},
+]
+
+class TestSpeculate(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    async def test_accepted_speculation_is_kept(self):
+        async def decide():
+            await asyncio.sleep(0.01)
+            return True
+
+        result, speculated = await speculate("test", decide(), lambda: asyncio.sleep(0, "found"), bool)
+
+        self.assertTrue(result)
+        self.assertEqual(speculated, "found")
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["speculation.test.hits"], 1)
+        self.assertEqual(snapshot["ratios"]["speculation.test.hit_rate"], 1.0)
+
+    async def test_rejected_speculation_is_cancelled(self):
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def slow():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def decide():
+            await started.wait()
+            return False
+
+        result, speculated = await speculate("test", decide(), slow, bool)
+        await asyncio.sleep(0)
+
+        self.assertFalse(result)
+        self.assertIsNone(speculated)
+        self.assertTrue(cancelled.is_set())
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["speculation.test.wasted"], 1)
+        self.assertEqual(counters["speculation.test.cancelled"], 1)
+        self.assertEqual(metrics.snapshot()["ratios"]["speculation.test.hit_rate"], 0.0)
+
+    async def test_failed_decision_cancels_and_raises(self):
+        async def decide():
+            await asyncio.sleep(0)
+            raise ValueError("intent failed")
+
+        with self.assertRaises(ValueError):
+            await speculate("test", decide(), lambda: asyncio.sleep(10), bool)
+
+    async def test_discarded_failure_is_ignored(self):
+        async def fail():
+            raise RuntimeError("discovery failed")
+
+        async def decide():
+            await asyncio.sleep(0.01)
+            return False
+
+        result, speculated = await speculate("test", decide(), fail, bool)
+        self.assertEqual((result, speculated), (False, None))
+
+class TestSpeculativeWorkflows(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.backend = FakeBackend(dimensions=64, latency=LatencyModel(mean=0.05))
+        self.previous_backend = set_backend(self.backend)
+        get_response_cache().clear()
+
+    def tearDown(self):
+        set_backend(self.previous_backend)
+
+    async def test_discovery_overlaps_the_intent_check(self):
+        workflow = ReplyGenerationWorkflow(discovery_config=ContentDiscoveryConfig(speculative=True))
+
+        result = await workflow.process({
+            "cast_text": "Looking for a solidity auditor for our lending protocol",
+            "available_feeds": FEEDS,
+        })
+
+        self.assertTrue(result["intent_analysis"]["should_reply"])
+        self.assertEqual(result["reply"]["link"], "https://farcaster.xyz/auditor/0xa")
+        self.assertNotIn("speculative_discovery", result)
+        self.assertIn("discover_relevant_content", result["prompt_tokens"])
+        # The intent and discovery calls were in flight at the same time
+        self.assertEqual(self.backend.peak_in_flight, 2)
+        self.assertEqual(metrics.snapshot()["counters"]["speculation.discover_content.hits"], 1)
+
+    async def test_speculative_result_matches_sequential(self):
+        cast = {"cast_text": "Looking for a solidity auditor for our lending protocol", "available_feeds": FEEDS}
+        sequential = await ReplyGenerationWorkflow().process(dict(cast))
+        self.assertEqual(self.backend.peak_in_flight, 1)
+        get_response_cache().clear()
+
+        speculative = await ReplyGenerationWorkflow(
+            discovery_config=ContentDiscoveryConfig(speculative=True)
+        ).process(dict(cast))
+
+        self.assertEqual(speculative["intent_analysis"], sequential["intent_analysis"])
+        self.assertEqual(speculative["discovered_content"], sequential["discovered_content"])
+        self.assertEqual(speculative["reply"], sequential["reply"])
+        # Only the identified needs are missing from the speculative prompt
+        self.assertLess(
+            speculative["prompt_tokens"]["discover_relevant_content"],
+            sequential["prompt_tokens"]["discover_relevant_content"],
+        )
+
+    async def test_discovery_is_discarded_without_intent(self):
+        workflow = ReplyGenerationWorkflow(discovery_config=ContentDiscoveryConfig(speculative=True))
+
+        result = await workflow.process({"cast_text": "gm farcaster", "available_feeds": FEEDS})
+
+        self.assertFalse(result["intent_analysis"]["should_reply"])
+        self.assertIsNone(result["discovered_content"])
+        self.assertEqual(result["reply"]["reply_text"], "No response needed for this cast.")
+        self.assertEqual(metrics.snapshot()["counters"]["speculation.discover_content.wasted"], 1)
+
+    async def test_pipeline_keeps_speculative_candidates(self):
+        pipeline = ReplyPipeline(PipelineConfig(content_discovery=ContentDiscoveryConfig(speculative=True)))
+
+        response = await pipeline.process(CastInput(
+            cast_text="Looking for a solidity auditor for our lending protocol",
+            user_id="1", cast_id="0x1", available_feeds=FEEDS
+        ))
+        negative = await pipeline.process(CastInput(
+            cast_text="gm farcaster", user_id="1", cast_id="0x2", available_feeds=FEEDS
+        ))
+
+        self.assertEqual(response.recommended_replies[0].cast_id, "0xa")
+        self.assertIsNone(negative.recommended_replies)
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["speculation.discover_content.launched"], 2)
+        self.assertEqual(counters["speculation.discover_content.hits"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
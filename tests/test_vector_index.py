@@ -0,0 +1,139 @@
+"""
+Tests for the approximate nearest-neighbour index
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+
+def clustered_vectors(count, dimensions=16, clusters=20, seed=0, noise=0.1):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions))
+    return (centers[rng.integers(0, clusters, count)]
+            + noise * rng.standard_normal((count, dimensions))).astype(np.float32)
+
+def exact_neighbours(vectors, query, k):
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [str(i) for i in np.argsort(-(normed @ (query / np.linalg.norm(query))))[:k]]
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "users.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_untrained_search_is_exact(self):
+        index = VectorIndex()
+        index.add("a", [1.0, 0.0])
+        index.add("b", [0.6, 0.8])
+        index.add("c", [-1.0, 0.0])
+
+        results = index.search([1.0, 0.1], k=2)
+
+        self.assertEqual([user_id for user_id, _ in results], ["a", "b"])
+        self.assertAlmostEqual(results[0][1], 0.995, places=3)
+
+    def test_exclude_replace_and_delete(self):
+        index = VectorIndex()
+        index.add("a", [1.0, 0.0])
+        index.add("b", [0.9, 0.1])
+
+        self.assertEqual(index.search([1.0, 0.0], k=1, exclude="a")[0][0], "b")
+
+        index.add("b", [0.0, 1.0])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search([0.0, 1.0], k=1)[0][0], "b")
+
+        self.assertTrue(index.delete("a"))
+        self.assertFalse(index.delete("a"))
+        self.assertEqual([user_id for user_id, _ in index.search([1.0, 0.0], k=5)], ["b"])
+
+    def test_dimension_mismatch_is_rejected(self):
+        index = VectorIndex()
+        index.add("a", [1.0, 0.0])
+
+        with self.assertRaises(ValueError):
+            index.add("b", [1.0, 0.0, 0.0])
+        with self.assertRaises(ValueError):
+            index.search([1.0, 0.0, 0.0])
+
+    def test_trains_once_large_enough_and_keeps_recall(self):
+        vectors = clustered_vectors(2000)
+        index = VectorIndex(min_train_size=1000, background_training=False, nprobe=4)
+        for i, vector in enumerate(vectors):
+            index.add(str(i), vector)
+
+        stats = index.stats()
+        self.assertTrue(stats["trained"])
+        self.assertEqual(stats["trainings"], 1)
+        self.assertGreater(stats["buckets"], 1)
+
+        recall = 0.0
+        for i in range(0, 2000, 100):
+            found = {user_id for user_id, _ in index.search(vectors[i], k=10)}
+            recall += len(found & set(exact_neighbours(vectors, vectors[i], 10))) / 10
+        self.assertGreater(recall / 20, 0.9)
+
+    def test_persists_adds_deletes_and_training(self):
+        vectors = clustered_vectors(300)
+        index = VectorIndex(self.path)
+        for i, vector in enumerate(vectors):
+            index.add(str(i), vector)
+        index.train(nlist=8)
+        index.delete("0")
+        index.add("extra", vectors[1])
+        expected = index.search(vectors[5], k=5)
+        index.close()
+
+        reopened = VectorIndex(self.path)
+
+        self.assertEqual(len(reopened), 300)
+        self.assertNotIn("0", reopened)
+        self.assertEqual(reopened.stats()["buckets"], 8)
+        self.assertTrue(reopened.stats()["trained"])
+        self.assertEqual(reopened.search(vectors[5], k=5), expected)
+        np.testing.assert_allclose(reopened.get("extra"), reopened.get("1"))
+        reopened.close()
+
+    def test_quantized_index_keeps_recall_in_less_memory(self):
+        vectors = clustered_vectors(2000, dimensions=64, noise=0.5)
+        exact = VectorIndex(min_train_size=1000, background_training=False)
+        for i, vector in enumerate(vectors):
+            exact.add(str(i), vector)
+        for quantization in ("int8", "binary"):
+            index = VectorIndex(
+                min_train_size=1000, background_training=False, quantization=quantization
+            )
+            for i, vector in enumerate(vectors):
+                index.add(str(i), vector)
+
+            self.assertLess(index.stats()["memory_bytes"], exact.stats()["memory_bytes"] / 3)
+            recall = 0.0
+            for i in range(0, 2000, 100):
+                found = {user_id for user_id, _ in index.search(vectors[i], k=10)}
+                recall += len(found & set(exact_neighbours(vectors, vectors[i], 10))) / 10
+            self.assertGreater(recall / 20, 0.9, quantization)
+
+    def test_quantization_can_change_between_runs(self):
+        vectors = clustered_vectors(50)
+        index = VectorIndex(self.path)
+        for i, vector in enumerate(vectors):
+            index.add(str(i), vector)
+        expected = [user_id for user_id, _ in index.search(vectors[3], k=3)]
+        index.close()
+
+        reopened = VectorIndex(self.path, quantization="int8")
+
+        self.assertEqual([user_id for user_id, _ in reopened.search(vectors[3], k=3)], expected)
+        self.assertEqual(reopened.stats()["quantization"], "int8")
+        reopened.close()
+        with self.assertRaises(ValueError):
+            VectorIndex(quantization="float16")
+
+if __name__ == '__main__':
+    unittest.main()
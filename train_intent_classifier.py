@@ -0,0 +1,84 @@
+"""
+Train and evaluate the local intent pre-classifier from logged intent results
+"""
+import argparse
+import time
+import zlib
+from typing import List, Sequence, Tuple
+
+from app.services.intent_classifier import read_intent_log
+from app.services.text_features import DEFAULT_DIMENSIONS, LinearModel, train_linear_model
+
+def split(examples: Sequence[Tuple[str, bool]], eval_fraction: float) -> Tuple[list, list]:
+    """Split examples into train and eval sets by a stable hash of the text"""
+    train, held_out = [], []
+    for text, label in examples:
+        bucket = zlib.crc32(text.encode()) % 1000 / 1000
+        (held_out if bucket < eval_fraction else train).append((text, label))
+    return train, held_out
+
+def evaluate(model: LinearModel, examples: Sequence[Tuple[str, bool]], threshold: float) -> dict:
+    """Measure what skipping casts below threshold would save and miss"""
+    start = time.perf_counter()
+    probabilities = [model.probability(text) for text, _ in examples]
+    elapsed = time.perf_counter() - start
+
+    skipped = [label for (_, label), p in zip(examples, probabilities) if p < threshold]
+    positives = sum(label for _, label in examples)
+    return {
+        "examples": len(examples),
+        "skip_rate": len(skipped) / len(examples) if examples else 0.0,
+        "skip_precision": (len(skipped) - sum(skipped)) / len(skipped) if skipped else 1.0,
+        "missed_replies": sum(skipped),
+        "missed_reply_rate": sum(skipped) / positives if positives else 0.0,
+        "us_per_cast": elapsed / len(examples) * 1e6 if examples else 0.0,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("log", help="JSONL of cast_text and should_reply, as written to INTENT_LOG_PATH")
+    parser.add_argument("--output", help="Where to save the model (.npz); not saved when omitted")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Reply probability below which casts are skipped")
+    parser.add_argument("--eval-fraction", type=float, default=0.2)
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument("--ngrams", type=int, default=2)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    examples: List[Tuple[str, bool]] = list(read_intent_log(args.log))
+    train, held_out = split(examples, args.eval_fraction)
+    positives = sum(label for _, label in train)
+    print(f"{len(train)} training casts ({positives} should_reply), {len(held_out)} eval casts")
+    if not train:
+        raise SystemExit("No training examples")
+
+    start = time.perf_counter()
+    model = train_linear_model(
+        [text for text, _ in train],
+        [label for _, label in train],
+        dimensions=args.dimensions,
+        n=args.ngrams,
+        epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        l2=args.l2,
+    )
+    print(f"Trained in {time.perf_counter() - start:.1f}s")
+
+    for name, subset in (("train", train), ("eval", held_out)):
+        if subset:
+            report = evaluate(model, subset, args.threshold)
+            print(
+                f"{name}: {report['examples']} casts, skip rate {report['skip_rate']:.1%}, "
+                f"skip precision {report['skip_precision']:.1%}, "
+                f"missed replies {report['missed_replies']} ({report['missed_reply_rate']:.1%}), "
+                f"{report['us_per_cast']:.0f}us per cast"
+            )
+
+    if args.output:
+        model.save(args.output)
+        print(f"Saved {args.output}")
+
+if __name__ == "__main__":
+    main()